@@ -2,6 +2,9 @@
 
 import logging
 import logging.config
+import time
+
+_import_start = time.perf_counter_ns()
 
 # This needs to live here, before bnk imports
 logging.config.fileConfig('logging.conf')
@@ -12,6 +15,9 @@ from bnk import parse                          # noqa: E402
 from bnk.parse import read_bnk_data            # noqa: E402
 from bnk.views import AsciiView, NativeView    # noqa: E402
 
+# (start, duration) of importing bnk, in perf_counter_ns, see --profile
+_import_span = (_import_start, time.perf_counter_ns() - _import_start)
+
 __all__ = [parse, read_bnk_data, AsciiView, NativeView]
 
 _bnklog = logging.getLogger('bnk')
@@ -1,9 +1,22 @@
 """bnk: (simple) financial analysis with incomplete information."""
 
+import argparse
+import contextlib
+import copy
+import importlib
+import io
 import logging
+import os
+import sys
+import time
 import datetime as dt
+from collections import OrderedDict
 from bnk import read_bnk_data
 from bnk import fiscalyear as fy
+from bnk import metrics
+from bnk import trace
+from bnk.parse import carry_last, diff_ledgers
+from bnk.reporting import PerformanceCube
 
 _log = logging.getLogger('bnk.main')
 
@@ -11,32 +24,78 @@ _log = logging.getLogger('bnk.main')
 def parse_args(arglist=None):
     """Parse arguments (typically from the commandline)."""
 
-    import argparse
-
     parser = argparse.ArgumentParser(description="bnk: account analysis")
     parser.add_argument('file', help="records file to load")
-    parser.add_argument('--date',
-                        help="date for report YYYYMMDD (deafult=last quarter)")
+    parser.add_argument('--date', action='append',
+                        help="date for report YYYYMMDD (deafult=last quarter);"
+                        " may be repeated to run each report at several dates")
     parser.add_argument('--carry-forward', type=int, default=0,
                         help="Carry balances forward N days from previous"
                         " marks if necessary")
     parser.add_argument('--carry-last', action='store_true',
                         help="Carry last account balances to current report"
                         " date if need be.")
-    parser.add_argument('--report')
+    parser.add_argument('--report', action='append',
+                        help="report module to run; may be repeated, the"
+                        " records file is read once for all reports")
+    parser.add_argument('--cents', action='store_true',
+                        help="Hold amounts as integer cents, so sums and"
+                        " zero-sum checks are exact")
+    parser.add_argument('--jobs', type=int, default=0,
+                        help="Evaluate accounts in N worker processes"
+                        " (default: evaluate in this process); with several"
+                        " reports/dates, run the reports themselves in N"
+                        " worker processes (reports running at once don't"
+                        " share results; each date's results are merged"
+                        " afterwards, e.g., for --watch)")
+    parser.add_argument('--timing', action='store_true',
+                        help="Print a per-report timing summary to stderr")
+    parser.add_argument('--profile', nargs='?', const='', metavar='TRACE',
+                        help="Print a stage-by-stage time breakdown to stderr"
+                        " and, given TRACE, write Chrome trace-event JSON"
+                        " there")
+    parser.add_argument('--memprofile', nargs='?', const='', metavar='PATH',
+                        help="Print a breakdown of peak and retained memory"
+                        " by stage and by type (record text, tokens,"
+                        " Records, Transactions/Values, metas, Tables) to"
+                        " stderr and, given PATH, write it there as JSON")
+    parser.add_argument('--metrics', nargs='?', const='', metavar='PATH',
+                        help="At exit, dump counters/histograms (e.g., IRR"
+                        " iterations, empty cells) as JSON to PATH (default:"
+                        " stderr)")
+    parser.add_argument('--watch', action='store_true',
+                        help="Watch the records file, rerun the reports"
+                        " (recomputing only what changed) on each change")
+    parser.add_argument('--view', action='append', metavar='FORMAT[:PATH]',
+                        help="Render reports as FORMAT (ascii, native, csv,"
+                        " jsonl or html) to PATH (default: stdout); may be"
+                        " repeated, each report is computed once.  A PATH"
+                        " takes a single --report and --date")
 
     args = parser.parse_args(arglist)
     if not args.date:
         args.date = fy.end_of_completed_quarter(dt.date.today())
+    elif len(args.date) == 1:
+        args.date = _parse_date(args.date[0])
     else:
-        args.date = dt.date(int(args.date[:4]),
-                            int(args.date[4:6]),
-                            int(args.date[6:8]))
+        args.date = [_parse_date(d) for d in args.date]
 
     _log.info("ARGS: %s" % (str(args)))
     return args
 
 
+def _parse_date(s):
+    """Parse a YYYYMMDD date string."""
+    return dt.date(int(s[:4]), int(s[4:6]), int(s[6:8]))
+
+
+def _as_list(value):
+    """Return value as a list (a single value becomes a 1 item list)."""
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
 def main(args):
     """The bnk main method, without option parsing.
 
@@ -44,15 +103,91 @@ def main(args):
 
     args.carryvalues  (int) - the number of days that a value can be
                                 carried forward
-    args.report       (str) - a string representing an importable module
+    args.report  (str/list) - a string representing an importable module,
+                                or a list of them
     args.carry_last  (bool) - True iff the last value in each open account
                                 should be carried to report date
-    args.date        (date) - A datetime.date instance representing when the
-                                report should be run
+    args.date   (date/list) - A datetime.date instance representing when the
+                                report should be run, or a list of them
+    args.cents       (bool) - True iff amounts should be held as integer
+                                cents (see read_bnk_data)
+    args.jobs         (int) - the number of worker processes reports may use
+                                to evaluate accounts (0 for none)
+    args.view        (list) - None, or 'format[:path]' strings naming the
+                                views reports should render to (a path only
+                                with a single report and date)
+    args.timing      (bool) - True iff a timing summary should be printed
+                                to stderr
+
+    args.watch       (bool) - True iff, after reporting, the records file
+                                should be watched and reports rerun when
+                                it changes
+    args.profile      (str) - None, or '' to print a breakdown of time
+                                spent by stage, or a path to also write a
+                                Chrome trace to
+    args.memprofile   (str) - None, or '' to print a breakdown of memory by
+                                stage and type (see bnk.memprofile), or a
+                                path to also write it to as JSON
+    args.metrics      (str) - None, or '' to dump metrics (see bnk.metrics)
+                                to stderr at exit, or a path to dump them to
+
+    The records are read once.  Each report is then run at each date: the
+    report receives a copy of args with a single report and date, and the
+    data for that date.  With several runs and args.jobs > 0, the runs are
+    spread over worker processes and their output is printed in order.
+    Otherwise, reports receive args.executor: None, or an Executor to pass
+    on to the report classes, and args.cube: a reporting.PerformanceCube
+    shared by the reports at that date.
     """
+    if getattr(args, 'metrics', None) is not None:
+        metrics.dump_at_exit(args.metrics)
+    with _profiling(getattr(args, 'profile', None)):
+        with _memprofiling(getattr(args, 'memprofile', None)):
+            _main(args)
+
+
+@contextlib.contextmanager
+def _profiling(profile):
+    """Trace the enclosed stages if profile isn't None (see --profile)."""
+    if profile is None:
+        yield
+        return
+
+    import bnk
+    tracer = trace.enable(origin=bnk._import_span[0])
+    tracer.add('import bnk', *bnk._import_span)
+    try:
+        with trace.span('main'):
+            yield
+    finally:
+        trace.disable()
+        print(tracer.summary(), file=sys.stderr)
+        if profile:
+            tracer.write_chrome(profile)
+
+
+@contextlib.contextmanager
+def _memprofiling(memprofile):
+    """Profile memory if memprofile isn't None (see --memprofile)."""
+    if memprofile is None:
+        yield
+        return
+
+    from bnk.memprofile import MemoryProfiler
+    profiler = MemoryProfiler()
+    try:
+        with profiler:
+            with trace.span('main'):
+                yield
+    finally:
+        print(profiler.summary(), file=sys.stderr)
+        if memprofile:
+            profiler.write(memprofile)
+
+
+def _main(args):
     if args.report:
-        import importlib
-        report = importlib.import_module(args.report)
+        reports = [importlib.import_module(r) for r in _as_list(args.report)]
 
         if args.file:
             with open(args.file, 'r') as fin:
@@ -62,18 +197,183 @@ def main(args):
         else:
             raise ValueError("Must specify a file or pass data to read")
 
-        accounts = read_bnk_data(data, carry_last=args.carry_last,
-                                 to_date=args.date)
+        timings = []
+        start = time.perf_counter()
+        accounts = read_bnk_data(data, cents=getattr(args, 'cents', False))
+        timings.append(("read records", None, time.perf_counter() - start))
+
+        dated = _dated_data(args, accounts, timings)
+        cubes = {date: PerformanceCube() for date in dated}
+        _run_reports(args, reports, dated, cubes, timings)
+
+        if getattr(args, 'timing', False):
+            _print_timings(timings)
+
+        if getattr(args, 'watch', False):
+            _watch(args, reports, accounts, dated, cubes)
+
+
+def _dated_data(args, accounts, timings):
+    """Return an OrderedDict of report date -> the data for that date."""
+    dated = OrderedDict()
+    carrydays = dt.timedelta(days=args.carry_forward)
+    for date in _as_list(args.date):
+        start = time.perf_counter()
+        if args.carry_last:
+            dated[date] = carry_last(accounts, date)
+            timings.append(("carry last", date, time.perf_counter() - start))
+        else:
+            dated[date] = accounts
 
-        for acts in [accounts['Account'], accounts['Meta']]:
+        for acts in [dated[date]['Account'], dated[date]['Meta']]:
             for actname in acts:
-                carrydays = dt.timedelta(days=args.carry_forward)
                 acts[actname].carryvalues = carrydays
+    return dated
 
-        report.report(args, accounts)
+
+def _run_reports(args, reports, dated, cubes, timings):
+    """Run each report at each date, appending timings."""
+    specs = getattr(args, 'view', None) or []
+    paths = [spec.partition(':')[2] for spec in specs]
+    if len(dated) * len(reports) > 1 and any(p not in ('', '-')
+                                             for p in paths):
+        # each run would rewrite (or, under --jobs, race for) the file
+        raise ValueError("--view FORMAT:PATH needs a single --report and"
+                         " --date; use one invocation per file")
+    runs = []
+    for date, bnkdata in dated.items():
+        for report in reports:
+            runargs = copy.copy(args)
+            runargs.report = report.__name__
+            runargs.date = date
+            runargs.cube = cubes[date]
+            runs.append((report, runargs, bnkdata))
+
+    jobs = getattr(args, 'jobs', 0)
+    if jobs > 0 and len(runs) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(_run_captured, runargs, bnkdata)
+                       for report, runargs, bnkdata in runs]
+            for (report, runargs, bnkdata), future in zip(runs, futures):
+                output, seconds, results = future.result()
+                sys.stdout.write(output)
+                runargs.cube.merge(results, bnkdata)
+                timings.append((runargs.report, runargs.date, seconds))
+    elif jobs > 0:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            for report, runargs, bnkdata in runs:
+                runargs.executor = executor
+                timings.append(_run(report, runargs, bnkdata))
+    else:
+        for report, runargs, bnkdata in runs:
+            runargs.executor = None
+            timings.append(_run(report, runargs, bnkdata))
+
+
+def _stat(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _watch(args, reports, accounts, dated, cubes, poll=1.0, rounds=None):
+    """Rerun the reports whenever the records file changes.
+
+    The new records are compared with the previous read; each date's cube
+    keeps the results of the accounts (and metas) that didn't change, so
+    only the rows that depend on changed records are recomputed.  Runs
+    until interrupted (or for the given number of rerun rounds).
+    """
+    if not args.file:
+        raise ValueError("--watch needs a records file")
+    signature = _stat(args.file)
+    try:
+        while rounds is None or rounds > 0:
+            time.sleep(poll)
+            try:
+                latest = _stat(args.file)
+            except OSError:
+                continue
+            if latest == signature:
+                continue
+            signature = latest
+            try:
+                with open(args.file, 'r') as fin:
+                    newaccounts = read_bnk_data(
+                        fin.read(), cents=getattr(args, 'cents', False))
+            except Exception as E:
+                _log.error("Failed to reread %s: %s", args.file, E)
+                print("bnk: can't reread %s: %s (waiting for changes)" %
+                      (args.file, E), file=sys.stderr)
+                continue
+
+            timings = []
+            changed = diff_ledgers(accounts, newaccounts)
+            newdated = _dated_data(args, newaccounts, timings)
+            reused = 0
+            for date in newdated:
+                cubes[date] = cubes[date].rebase(dated[date], newdated[date],
+                                                 changed)
+                reused += len(cubes[date]._perf)
+
+            if sys.stdout.isatty():
+                sys.stdout.write("\x1b[2J\x1b[H")
+            print("bnk: %s changed (%s), reusing %d cached cells" %
+                  (args.file, ", ".join(sorted(changed)) or "nothing",
+                   reused), file=sys.stderr)
+            _run_reports(args, reports, newdated, cubes, timings)
+            if getattr(args, 'timing', False):
+                _print_timings(timings)
+            accounts, dated = newaccounts, newdated
+            if rounds is not None:
+                rounds -= 1
+    except KeyboardInterrupt:
+        pass
+
+
+def _run(report, args, bnkdata):
+    """Run a report, return a (name, date, seconds) timing."""
+    start = time.perf_counter()
+    report.report(args, bnkdata)
+    return (args.report, args.date, time.perf_counter() - start)
+
+
+def _run_captured(args, bnkdata):
+    """Run a report (in a worker), return (stdout output, seconds, cube).
+
+    The cube is exported (see PerformanceCube.export), to be merged into
+    the parent's cube for the date.
+    """
+    report = importlib.import_module(args.report)
+    args.executor = None
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        seconds = _run(report, args, bnkdata)[2]
+    return stdout.getvalue(), seconds, args.cube.export()
+
+
+def _print_timings(timings, stream=None):
+    """Print a timing summary (name, date, seconds) to stream (stderr)."""
+    stream = stream or sys.stderr
+    print("%-40s %-10s %9s" % ("step", "date", "seconds"), file=stream)
+    for name, date, seconds in timings:
+        print("%-40s %-10s %9.3f" % (name, date or "", seconds), file=stream)
+    print("%-40s %-10s %9.3f" % ("total", "",
+                                 sum(t[2] for t in timings)), file=stream)
 
 
 if __name__ == "__main__":
 
+    if sys.argv[1:2] in (['serve'], ['query']):
+        from bnk import server
+        sys.exit(server.main(sys.argv[1:]))
+    if sys.argv[1:2] == ['bench']:
+        from bnk import bench
+        sys.exit(bench.main(sys.argv[2:]))
+    if sys.argv[1:2] == ['series']:
+        from bnk import timeseries
+        sys.exit(timeseries.main(sys.argv[2:]))
+
     ARGS = parse_args()
     main(ARGS)
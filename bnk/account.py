@@ -1,16 +1,27 @@
 """Account, Transaction and Value classes."""
 
 import logging
+import math
 import operator
 import datetime as dt
 import bisect
+import calendar
 import logging
 import collections
 import csv
+from array import array
 from decimal import Decimal
+from bnk import metrics
 
 _log = logging.getLogger(__name__)
 
+_GET_VALUE_CALLS = metrics.counter('account.get_value')
+_IRR_SOLVES = metrics.counter('irr.solves')
+_IRR_ITERATIONS = metrics.histogram('irr.iterations')
+_IRR_UNSOLVED = metrics.counter('irr.unsolved')
+_IRR_UNSEEDED = metrics.counter('irr.unseeded')
+_IRR_FAST_PATHS = metrics.counter('irr.fast_paths')
+
 
 class Account(object):
     """An Account is a black box with transactions and point values.
@@ -52,10 +63,15 @@ class Account(object):
        a given period
     """
 
-    def __init__(self, name, topen):
-        """Create a new account with the specified opening date."""
+    def __init__(self, name, topen, cents=False):
+        """Create a new account with the specified opening date.
+
+        If cents, amounts and balances are held as integer cents (so sums
+        are exact); they're still reported in dollars.
+        """
 
         self.name = name
+        self.cents = cents
 
         if topen <= dt.date.min:
             raise ValueError((
@@ -66,13 +82,43 @@ class Account(object):
         self._tclose = None
 
         self._transactions = []
-        self._values = [Value(topen, 0.0)]
+        self._values = [Value(topen, self._zero())]
 
         # allow balances from a previously marked date
         # to be carried forward into the future (specified in days)
         self.carryvalues = None
         self._cl = False
 
+        # built on demand, discarded whenever transactions/values change
+        self._coverage = None
+
+    def __getstate__(self):
+        """Return a compact state for pickling (e.g., to a worker process).
+
+        Transactions and values are reduced to plain tuples, and cached
+        indexes are dropped (they're rebuilt on demand).
+        """
+        state = dict(self.__dict__)
+        state['_transactions'] = [tuple(t) for t in self._transactions]
+        state['_values'] = [tuple(v) for v in self._values]
+        state['_coverage'] = None
+        return state
+
+    def __setstate__(self, state):
+        """Restore the state produced by __getstate__."""
+        self.__dict__.update(state)
+        self._transactions = [Transaction(*t) for t in self._transactions]
+        self._values = [Value(*v) for v in self._values]
+
+    def fingerprint(self):
+        """Return a hashable summary of the account's records.
+
+        Two accounts have equal fingerprints iff they were opened, closed,
+        marked and transacted identically (names aren't considered).
+        """
+        return (self._topen, self._tclose, tuple(self._transactions),
+                tuple(self._values))
+
     def to_csv(self, stream):
         """Export to csv."""
 
@@ -98,23 +144,25 @@ class Account(object):
 
         tfmt = "{0:%m/%d/%Y}"
         for (n, i) in enumerate(items):
+            dollars = self._dollars
             if isinstance(i, Value):
-                r = [tfmt.format(i.t), tfmt.format(i.t), i.value, None]
+                r = [tfmt.format(i.t), tfmt.format(i.t), dollars(i.value),
+                     None]
             elif isinstance(i, Transaction):
                 r = [tfmt.format(i.tstart), tfmt.format(i.tend), None,
-                     i.amount]
+                     dollars(i.amount)]
             else:
                 raise ValueError("Unexpected thing!")
             lmi = longmoney[n]
             if isinstance(lmi, Value):
-                r.extend([tfmt.format(lmi.t), lmi.value, 0])
+                r.extend([tfmt.format(lmi.t), dollars(lmi.value), 0])
             else:
-                r.extend([tfmt.format(lmi[0]), None, lmi[1]])
+                r.extend([tfmt.format(lmi[0]), None, dollars(lmi[1])])
             smi = shortmoney[n]
             if isinstance(smi, Value):
-                r.extend([tfmt.format(smi.t), smi.value, 0])
+                r.extend([tfmt.format(smi.t), dollars(smi.value), 0])
             else:
-                r.extend([tfmt.format(smi[0]), None, smi[1]])
+                r.extend([tfmt.format(smi[0]), None, dollars(smi[1])])
 
             csvw.writerow(r)
 
@@ -165,6 +213,7 @@ class Account(object):
                 raise ValueError("Transaction overlaps known Value")
 
         self._transactions.append(trans)
+        self._coverage = None
 
     def mark_value(self, value):
         """Mark the account's value at a specific moment in time."""
@@ -211,6 +260,7 @@ class Account(object):
                                                      val.value))
 
         self._values.insert(insertion_pt, value)
+        self._coverage = None
 
     def set_closing(self, t):
         """Set the account's closing date.
@@ -248,13 +298,14 @@ class Account(object):
                 # 0.0 is already marked, just set the close time
                 self._tclose = t
         else:
-            self._values.append(Value(t, 0.0))
+            self._values.append(Value(t, self._zero()))
             self._tclose = t
+        self._coverage = None
 
     def carrylast(self, todate):
         """Create a 'false' value mark at the specified date if necessary."""
 
-        v = self.get_value(todate)
+        v = self._get_value(todate)
         if v[1] == 'No Data' or v[1] == 'Carried':
             lastvalue = self._values[-1]
             if todate < lastvalue.t:
@@ -262,9 +313,18 @@ class Account(object):
                     "Can't carry to specified date, it occurs "
                     "before the last mark"))
             self._values.append(Value(todate, lastvalue.value))
+            self._coverage = None
             self.name = self.name + " [cl%d]" % (todate - lastvalue.t).days
             self._cl = (todate - lastvalue.t).days
 
+    def _zero(self):
+        """Return an amount of 0."""
+        return 0 if self.cents else 0.0
+
+    def _dollars(self, amount):
+        """Return an amount (as held by the account) in dollars."""
+        return amount / 100.0 if self.cents else amount
+
     def get_value(self, t):
         """Determine the account value at time t.
 
@@ -272,22 +332,128 @@ class Account(object):
         - v is a numeric value
         - info is a informative string
         """
+        value = self._get_value(t)
+        if self.cents:
+            return (value[0] / 100.0,) + value[1:]
+        return value
+
+    def _get_value(self, t):
+        """Determine the account value at time t, as held by the account."""
+        _GET_VALUE_CALLS.value += 1
         if t < self._topen:
-            return (0.0, "Not Open")
+            return (self._zero(), "Not Open")
         if self._tclose and t > self._tclose:
-            return (0.0, "Closed")
+            return (self._zero(), "Closed")
 
-        for r in self._values:
-            if r.t == t:
-                return (r.value, "Marked")
+        index = self._coverage_index()
+        i = index.mark_index(t)     # there's always a mark at _topen
+        if index.dates[i - 1] == t:
+            return (index.values[i - 1], "Marked")
 
         if self.carryvalues:
-            for r in reversed(self._values):
-                if r.t <= t and t - r.t < self.carryvalues:
-                    return (r.value, 'Carried', t - r.t)
+            last = index.dates[i - 1]
+            if t - last < self.carryvalues:
+                return (index.values[i - 1], 'Carried', t - last)
 
         return (float('nan'), "No Data")
 
+    def balances_at(self, dates):
+        """Determine the account balance on each of a sorted list of dates.
+
+        This is equivilant to calling get_value for each date, but
+        is done in a single (merge) pass over the account's value marks.
+        Unlike get_value, a balance is not carried to a date that falls
+        within a transaction window (the balance is in flux there), such
+        dates have 'No Data'.
+
+        Return a list with a tuple (v, info, carry) for each date such that:
+        - v is a numeric value
+        - info is an informative string (see get_value)
+        - carry is the number of days the value was carried (0 unless
+          info is 'Carried')
+        """
+        balances = []
+        values = self._values
+        nvalues = len(values)
+        i = 0   # index of the first mark after the current date
+        previous = None
+        for t in dates:
+            if previous is not None and t < previous:
+                raise ValueError("Dates must be sorted")
+            previous = t
+
+            if t < self._topen:
+                balances.append((0.0, "Not Open", 0))
+                continue
+            if self._tclose and t > self._tclose:
+                balances.append((0.0, "Closed", 0))
+                continue
+
+            while i < nvalues and values[i].t <= t:
+                i += 1
+            last = values[i - 1]    # there's always a mark at _topen
+
+            if last.t == t:
+                balances.append((last.value, "Marked", 0))
+            elif (self.carryvalues and t - last.t < self.carryvalues and
+                  not self._coverage_index().spans(t)):
+                balances.append((last.value, "Carried", (t - last.t).days))
+            else:
+                balances.append((float('nan'), "No Data", 0))
+
+        if self.cents:
+            return [(v / 100.0, info, carry) for (v, info, carry) in balances]
+        return balances
+
+    def _coverage_index(self):
+        """Return the (cached) _Coverage index for the account."""
+        if self._coverage is None:
+            self._coverage = _Coverage(self._values, self._transactions,
+                                       self.cents)
+        return self._coverage
+
+    def coverage(self, start, end):
+        """Determine whether performance can be computed over a period.
+
+        This is a cheap check (nothing is computed) that mirrors the
+        validation done by get_performance/get_irr: the period can't end
+        before it starts, both ends of the period must be Marked or Carried,
+        a Carried end must not fall within a transaction window, and there
+        must be some money in the account (a starting balance or
+        transactions) for the IRR to be defined.
+
+        Return None if the period is answerable, otherwise a string
+        describing why it isn't.
+        """
+        if start is None:
+            start = self._topen
+        if end is None:
+            end = self._values[-1].t
+
+        if end < start:
+            return "End %s precedes start %s" % (end, start)
+
+        index = self._coverage_index()
+        for (which, t) in [('start', start), ('end', end)]:
+            if t < self._topen:
+                return "Not Open at %s %s" % (which, t)
+            if self._tclose and t > self._tclose:
+                return "Closed at %s %s" % (which, t)
+
+            last = index.last_mark(t)
+            if last == t:
+                continue
+            if not self.carryvalues or t - last >= self.carryvalues:
+                return "No Data at %s %s" % (which, t)
+            if index.spans(t):
+                return "Transaction spans %s %s (carry?)" % (which, t)
+
+        if (index.last_value(start) == 0.0 and
+                not index.has_flows(start, end)):
+            return "No money in the account from %s to %s" % (start, end)
+
+        return None
+
     def get_performance(self, start, end, keys):
         """Get various performance measures over a specified period.
 
@@ -306,8 +472,8 @@ class Account(object):
         if end is None:
             end = self._values[-1].t
 
-        startvalue = self.get_value(start)
-        endvalue = self.get_value(end)
+        startvalue = self._get_value(start)
+        endvalue = self._get_value(end)
 
         if startvalue[1] != 'Marked' and startvalue[1] != 'Carried':
             raise ValueError("? startval", startvalue)
@@ -328,12 +494,13 @@ class Account(object):
         # time, we also know that no transactions cross
         # those boundaries.  Thus, this check should be redundant
         # (except if carrys happen)
-        for trn in self._transactions:
-            if trn.tstart <= start and trn.tend > start:
-                raise ValueError('Transaction spans start date (carry?)')
-            # strictly > here since transactions are computed before values
-            if trn.tend > end and trn.tstart <= end:
-                raise ValueError('Transaction spans end date (carry?)')
+        index = self._coverage_index()
+        if index.spans(start):
+            raise ValueError('Transaction spans start date (carry?)')
+        # a window ending at end doesn't span it (transactions are
+        # computed before values)
+        if index.spans(end):
+            raise ValueError('Transaction spans end date (carry?)')
 
         keys['start balance'] = startvalue[0]
         keys['end balance'] = endvalue[0]
@@ -341,17 +508,21 @@ class Account(object):
         keys['additions'] = 0
         keys['subtractions'] = 0
 
-        # walk the transactions:
-        for t in self._transactions:
-            if t.tstart > start and t.tend <= end:
-                if t.amount > 0.0:
-                    keys['additions'] += t.amount
-                else:
-                    keys['subtractions'] -= t.amount
+        # walk the transactions starting in the period (none span its end)
+        lo, hi = index.flows(start, end)
+        for amount in index.amounts[lo:hi]:
+            if amount > 0.0:
+                keys['additions'] += amount
+            else:
+                keys['subtractions'] -= amount
 
         keys['net additions'] = keys['additions'] - keys['subtractions']
         keys['gain'] = (endvalue[0] - startvalue[0] -
                         keys['additions'] + keys['subtractions'])
+        if self.cents:
+            for key in ('start balance', 'end balance', 'additions',
+                        'subtractions', 'net additions', 'gain'):
+                keys[key] = keys[key] / 100.0
 
         keys['irr'] = self.get_irr(start, end)
         return True
@@ -380,15 +551,219 @@ class Account(object):
         Return an envelope of possible interest earnings (loss) that account
         for the range of possible transaction timings given each transaction's
         window.
+
+        Common cash flow shapes are answered without solving: a zero-length
+        period has no return, a single flow (e.g., just the starting
+        balance) grows at (end / flow) ** (1 / days), and when the timings
+        are identical (every transaction's window is a single day) only one
+        is solved.
         """
 
+        startvalue, endvalue, days, timings = self._timings(start, end)
+        endvalue = endvalue[0]
+
+        if days == 0:
+            _IRR_FAST_PATHS.value += 1
+            return Range(0.0, 0.0)
+
+        if timings[0] == timings[1]:
+            timings = timings[:1]
+
+        rates = []
+        guesses = None
+        for (i, timing) in enumerate(timings):
+            rate = _single_flow_rate(timing, endvalue)
+            if rate is not None:
+                _IRR_FAST_PATHS.value += 1
+            else:
+                if guesses is None:
+                    try:
+                        guesses = self._dietz_rates(timings, endvalue, days)
+                    except ValueError:
+                        guesses = [None] * len(timings)
+                rate = _solve_daily_rate(timing, endvalue, guesses[i])
+            rates.append(rate)
+
+        rates = [_annualize(r) for r in rates]
+        return Range(min(rates), max(rates))
+
+    def rolling_irr(self, window=12, step=3, end=None):
+        """Calculate the IRR envelope over a window sliding through time.
+
+        Windows end at end (default: the last value mark) and every step
+        months before it, as long as the window (of window months) starts
+        on or after the account opened; e.g., window=36 and step=3 gives
+        the rolling 3 year IRR at each quarter end.
+
+        Adjacent windows share most of their transactions, so rather than
+        calling get_irr for each, the transactions are sorted once and the
+        window's slice of them is advanced (transactions entering at the
+        end, leaving at the start), and each solve starts from a tight
+        bracket around the previous window's rate.
+
+        Returns a list of (Period, Range) tuples, oldest first; the Range
+        is None if the IRR can't be determined for that window (see
+        coverage).
+        """
+        if end is None:
+            end = self._values[-1].t
+
+        ends = []
+        while _months_before(end, window) >= self._topen:
+            ends.append(end)
+            end = _months_before(end, step)
+        ends.reverse()
+
+        index = self._coverage_index()
+        tstarts = index.tstarts
+        lo = hi = 0
+        guesses = [None, None]
+        results = []
+        for end in ends:
+            start = _months_before(end, window)
+            period = Period(start, end, "{:%Y-%m-%d}".format(end))
+            first, last = start.toordinal(), end.toordinal()
+            while hi < len(tstarts) and tstarts[hi] <= last:
+                hi += 1
+            while lo < hi and tstarts[lo] <= first:
+                lo += 1
+
+            why = self.coverage(start, end)
+            if why is not None:
+                _log.debug("No rolling IRR %s %s: %s", self.name, period, why)
+                results.append((period, None))
+                continue
+
+            endvalue = self._get_value(end)[0]
+            timings = _flow_timings(first, last, self._get_value(start)[0],
+                                    index, lo, hi)
+            if timings[0] == timings[1]:
+                timings = timings[:1]
+            rates = []
+            try:
+                for (i, timing) in enumerate(timings):
+                    # until a timing has a rate of its own, start from
+                    # the other's (e.g., this window's long money rate)
+                    guess = guesses[i]
+                    if guess is None:
+                        guess = guesses[1 - i]
+                    rate = _single_flow_rate(timing, endvalue)
+                    if rate is not None:
+                        _IRR_FAST_PATHS.value += 1
+                    elif guess is not None:
+                        rate = _newton_daily_rate(timing, endvalue, guess)
+                    if rate is None:
+                        rate = _solve_daily_rate(timing, endvalue, guess)
+                    # each timing warm starts from its own last rate
+                    guesses[i] = rate / 100.0
+                    rates.append(_annualize(rate))
+                if len(timings) == 1:
+                    guesses[1] = guesses[0]
+            except Exception as E:
+                _log.warning("Failed to compute rolling IRR: %s %s -> %s",
+                             self.name, period, E)
+                results.append((period, None))
+                continue
+            results.append((period, Range(min(rates), max(rates))))
+        return results
+
+    def irr_distribution(self, start, end, samples=10000, seed=None,
+                         quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+        """Estimate the distribution of the IRR given uncertain timings.
+
+        get_irr bounds the IRR by the extreme (long and short money)
+        timings.  Here each transaction is instead taken to occur on a day
+        drawn uniformly from its window, samples times, and the IRR of each
+        draw is found; all draws are solved at once (a vectorized, bracketed
+        Newton's method).  This needs numpy.
+
+        Arguments:
+          start, end - the period (as for get_irr)
+          samples    - the number of draws
+          seed       - seeds the draws (for reproducible results)
+          quantiles  - the quantiles (fractions) to return
+
+        Returns:
+          an OrderedDict mapping each quantile to an annualized IRR (percent)
+        """
+        np = _numpy()
+        startvalue, endvalue, days, timings = self._timings(start, end)
+        endvalue = endvalue[0]
+
+        if days == 0 or timings[0] == timings[1]:
+            # nothing is uncertain
+            rate = self.get_irr(start, end)[0]
+            return collections.OrderedDict((q, rate) for q in quantiles)
+
         if start is None:
             start = self._topen
         if end is None:
             end = self._values[-1].t
+        index = self._coverage_index()
+        first, last = index.flows(start, end)
+        ordinal = end.toordinal()
+        lo = ordinal - np.array(index.tends[first:last], dtype=float)
+        hi = ordinal - np.array(index.tstarts[first:last], dtype=float)
+        amounts = np.array(index.amounts[first:last], dtype=float)
+
+        # days before end of each flow (the first is the starting balance)
+        rng = np.random.default_rng(seed)
+        drawn = rng.integers(lo, hi, endpoint=True,
+                             size=(samples, len(amounts)))
+        exponents = np.empty((samples, len(amounts) + 1))
+        exponents[:, 0] = days
+        exponents[:, 1:] = drawn
+        amounts = np.concatenate(([startvalue[0]], amounts))
+
+        try:
+            guess = sum(self._dietz_rates(timings, endvalue, days)) / 2.0
+        except ValueError:
+            guess = 0.0
+        logrates = _solve_log_rates(np, exponents, amounts, endvalue,
+                                    math.log1p(guess))
+        rates = 100.0 * np.expm1(365.0 * logrates)
+        values = np.nanquantile(rates, quantiles)
+        return collections.OrderedDict(
+            (q, float(v)) for (q, v) in zip(quantiles, values))
+
+    def get_dietz(self, start, end):
+        """Approximate the interest earnings (loss) over a period.
+
+        This is the Modified Dietz return: the gain over the period divided
+        by the starting balance plus each transaction weighted by the
+        fraction of the period it was in the account.  As with get_irr,
+        the long and short money timings give an envelope, and the returns
+        are annualized (percent per year).
+
+        It takes a single pass over the transactions (no solving), so it's
+        much cheaper than get_irr; it's close to the IRR unless flows are
+        large relative to the balance.
+
+        Raises ValueError if the return isn't defined (e.g., a zero-length
+        period, or no money in the account).
+        """
+        startvalue, endvalue, days, timings = self._timings(start, end)
+        rates = [100.0 * ((1.0 + r) ** 365 - 1.0)
+                 for r in self._dietz_rates(timings, endvalue[0], days)]
+        return Range(min(rates), max(rates))
 
-        startvalue = self.get_value(start)
-        endvalue = self.get_value(end)
+    def _timings(self, start, end):
+        """Validate a period and determine its cash flows.
+
+        Return (startvalue, endvalue, days, (longmoney, shortmoney)), where
+        startvalue and endvalue are as from get_value (but as held by the
+        account, e.g., in cents), and each timing is a list of (days in the
+        account before end, amount) flows, the first being the starting
+        balance.  The IRR doesn't depend on the units, so integer cents go
+        to the solvers as they are.
+        """
+        if start is None:
+            start = self._topen
+        if end is None:
+            end = self._values[-1].t
+
+        startvalue = self._get_value(start)
+        endvalue = self._get_value(end)
 
         if startvalue[1] != 'Marked' and startvalue[1] != 'Carried':
             raise ValueError("? startval", startvalue)
@@ -397,63 +772,316 @@ class Account(object):
 
         days = (end - start).days
 
-        longmoney_timing = [(days, startvalue[0])]
-        shortmoney_timing = [(days, startvalue[0])]
+        timings = _flow_timings(start.toordinal(), end.toordinal(),
+                                startvalue[0], self._coverage_index())
+        return (startvalue, endvalue, days, timings)
 
-        for t in self._transactions:
+    @staticmethod
+    def _dietz_rates(timings, endvalue, days):
+        """Return the daily Modified Dietz rate (a fraction) of each timing.
 
-            if t.tstart > start and t.tstart <= end:
-                assert t.tend <= end, \
-                    "A transaction appears to cross a value mark"
+        Raises ValueError if a rate isn't defined.
+        """
+        if days <= 0:
+            raise ValueError("A zero-length period has no return")
+        rates = []
+        for timing in timings:
+            flows = 0.0
+            weighted = 0.0
+            for (d, amount) in timing:
+                flows += amount
+                weighted += amount * d
+            weighted /= days
+            if weighted <= 0:
+                raise ValueError("No money in the account")
+            growth = 1.0 + (endvalue - flows) / weighted
+            if growth <= 0:
+                raise ValueError("The account lost everything")
+            rates.append(growth ** (1.0 / days) - 1.0)
+        return rates
+
+
+def _months_before(date, months):
+    """Return the date months before date (a month end stays a month end)."""
+    year, month = divmod(date.year * 12 + date.month - 1 - months, 12)
+    month += 1
+    last = calendar.monthrange(year, month)[1]
+    if date.day == calendar.monthrange(date.year, date.month)[1]:
+        return dt.date(year, month, last)
+    return dt.date(year, month, min(date.day, last))
+
+
+def _flow_timings(start, end, startvalue, index, lo=None, hi=None):
+    """Return the (longmoney, shortmoney) timings of flows over a period.
+
+    Each timing is a list of (days in the account before end, amount)
+    flows: the starting balance, then each transaction starting in the
+    period (those lo to hi in index, a _Coverage; found if not given).
+    start and end are ordinals.
+    """
+    if lo is None:
+        lo = bisect.bisect_right(index.tstarts, start)
+        hi = bisect.bisect_right(index.tstarts, end)
+    days = end - start
+    longmoney_timing = [(days, startvalue)]
+    shortmoney_timing = [(days, startvalue)]
+
+    tstarts, tends, amounts = index.tstarts, index.tends, index.amounts
+    for i in range(lo, hi):
+        tstart, tend, amount = tstarts[i], tends[i], amounts[i]
+        assert tend <= end, \
+            "A transaction appears to cross a value mark"
+
+        # longmoney: deposits at start of window, withdrawls at end
+        # shortmoney: deposits at end of window, withdrawls at start
+        if amount > 0:
+            longmoney_timing.append((end - tstart, amount))
+            shortmoney_timing.append((end - tend, amount))
+        else:
+            longmoney_timing.append((end - tend, amount))
+            shortmoney_timing.append((end - tstart, amount))
 
-                # longmoney: deposits at start of window, withdrawls at end
-                # shortmoney: deposits at end of window, withdrawls at start
-                if t.is_deposit():
-                    longmoney_timing.append(
-                        ((end - t.tstart).days, t.amount))
-                    shortmoney_timing.append(
-                        ((end - t.tend).days, t.amount))
-                else:
-                    longmoney_timing.append(
-                        ((end - t.tend).days, t.amount))
-                    shortmoney_timing.append(
-                        ((end - t.tstart).days, t.amount))
+    return (longmoney_timing, shortmoney_timing)
 
-        rates = []
-        for (_, timing) in [('Long', longmoney_timing),
-                            ('Short', shortmoney_timing)]:
-            precision = 0.00001  # in dollars
-            # binary search
-            top = 50
-            bot = -50
-            # shortmoney timing achieves the highest positive interest rate
-            assert sum(Decimal(d[1]) *
-                       Decimal(1.0 + top / 100.0) ** Decimal(d[0])
-                       for d in shortmoney_timing)
-
-            while top - bot > 0:
-
-                rate = bot + (top - bot) / 2.0
-                result = 0 + \
-                    sum(Decimal(d[1]) *
-                        Decimal(1.0 + rate / 100.0) ** Decimal(d[0])
-                        for d in timing)
-
-                if abs(result - Decimal(endvalue[0])) < precision:
-                    rates.append(rate)
-                    break
-                elif result < endvalue[0]:
-                    bot = rate
-                else:
-                    top = rate
-            else:
-                raise Exception("This shouldn't happen. bot:%f top:%f" % (bot,
-                                                                          top))
 
-        rates = [float(((Decimal(1.0 + r / 100.0) ** Decimal(365)) -
-                        Decimal(1.0)) * Decimal(100.0))
-                 for r in rates]
-        return Range(min(rates), max(rates))
+def _annualize(rate):
+    """Return a daily rate (in percent) as an annual rate (in percent)."""
+    return float(((Decimal(1.0 + rate / 100.0) ** Decimal(365)) -
+                  Decimal(1.0)) * Decimal(100.0))
+
+
+def _numpy():
+    """Import numpy (needed by irr_distribution, optional otherwise)."""
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("irr_distribution needs numpy")
+    return numpy
+
+
+def _solve_log_rates(np, exponents, amounts, endvalue, guess):
+    """Solve many IRR problems at once, return their daily log rates.
+
+    Row i of exponents holds the days before the period's end of each flow
+    (amounts) in problem i; the log rate x solves
+    sum(amounts * exp(exponents[i] * x)) = endvalue.  Each problem keeps a
+    bracket (as wide as _solve_daily_rate's) and takes Newton steps from
+    guess, bisecting when a step leaves the bracket.  Problems that don't
+    converge are nan.
+    """
+    precision = 0.00001  # in dollars
+    count = exponents.shape[0]
+    x = np.full(count, guess)
+    bot = np.full(count, math.log(0.5))
+    top = np.full(count, math.log(1.5))
+    todo = np.arange(count)
+    for _ in range(100):
+        ex, a = exponents[todo], amounts
+        terms = a * np.exp(ex * x[todo, None])
+        error = terms.sum(axis=1) - endvalue
+        slope = (terms * ex).sum(axis=1)
+
+        done = np.abs(error) < precision
+        todo, error, slope = todo[~done], error[~done], slope[~done]
+        if not len(todo):
+            return x
+        low = error < 0
+        bot[todo[low]] = x[todo[low]]
+        top[todo[~low]] = x[todo[~low]]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = x[todo] - error / slope
+        bisect = ~((step > bot[todo]) & (step < top[todo]))
+        step[bisect] = (bot[todo[bisect]] + top[todo[bisect]]) / 2.0
+        x[todo] = step
+
+    _IRR_UNSOLVED.inc(len(todo))
+    x[todo] = np.nan
+    return x
+
+
+def _single_flow_rate(timing, endvalue):
+    """Return the daily rate (in percent) if timing has a single flow.
+
+    timing is a list of (days, amount) flows; flows of 0 are ignored.
+    Returns None unless there's exactly one flow, a positive amount in the
+    account for at least a day, and a non-negative endvalue.
+    """
+    flows = [(d, amount) for (d, amount) in timing if amount]
+    if len(flows) != 1:
+        return None
+    (d, amount) = flows[0]
+    if d <= 0 or amount <= 0 or endvalue < 0:
+        return None
+    return 100.0 * ((endvalue / amount) ** (1.0 / d) - 1.0)
+
+
+def _newton_daily_rate(timing, endvalue, guess, steps=20):
+    """Solve for the daily rate (in percent) by Newton's method.
+
+    Starting from a close guess (a daily rate as a fraction, e.g., the
+    previous window's), this takes a few steps where bisection takes
+    dozens.  Returns None if it doesn't converge (to the same precision as
+    _solve_daily_rate) within steps steps.
+    """
+    precision = 0.00001  # in dollars
+    growth = 1.0 + guess
+    _IRR_SOLVES.value += 1
+    for iterations in range(1, steps + 1):
+        if not 0.5 < growth < 1.5:
+            break
+        value = slope = 0.0
+        for (d, amount) in timing:
+            term = amount * growth ** d
+            value += term
+            slope += d * term
+        if abs(value - endvalue) < precision:
+            _IRR_ITERATIONS.observe(iterations)
+            return 100.0 * (growth - 1.0)
+        if slope == 0:
+            break
+        growth -= (value - endvalue) * growth / slope
+    return None
+
+
+def _solve_daily_rate(timing, endvalue, guess=None):
+    """Solve for the daily rate (in percent) growing timing to endvalue.
+
+    timing is a list of (days, amount) flows.  The rate is found by
+    bisection; given a guess (a daily rate as a fraction, e.g., the Modified
+    Dietz rate), the search starts from a tight bracket around it, widened
+    until it holds the solution, rather than from +/-50%/day.
+    """
+    precision = 0.00001  # in dollars
+    flows = [(Decimal(d), Decimal(amount)) for (d, amount) in timing]
+    target = Decimal(endvalue)
+
+    def grown(rate):
+        factor = Decimal(1.0 + rate / 100.0)
+        return sum(amount * factor ** d for (d, amount) in flows)
+
+    _IRR_SOLVES.value += 1
+    iterations = 0
+    top = 50
+    bot = -50
+    if guess is not None and -0.5 < guess < 0.5:
+        # widen a bracket around the guess until it holds the solution
+        guess *= 100.0
+        width = max(abs(guess) * 0.1, 1e-4)
+        bot, top = max(guess - width, -50), min(guess + width, 50)
+        while bot > -50:
+            iterations += 1
+            if grown(bot) <= target:
+                break
+            width *= 4
+            bot = max(guess - width, -50)
+        while top < 50:
+            iterations += 1
+            if grown(top) >= target:
+                break
+            width *= 4
+            top = min(guess + width, 50)
+    else:
+        _IRR_UNSEEDED.value += 1
+        # shortmoney timing achieves the highest positive interest rate
+        assert grown(top)
+
+    while top - bot > 0:
+
+        iterations += 1
+        rate = bot + (top - bot) / 2.0
+        result = grown(rate)
+
+        if abs(result - target) < precision:
+            _IRR_ITERATIONS.observe(iterations)
+            return rate
+        elif result < target:
+            bot = rate
+        else:
+            top = rate
+
+    _IRR_UNSOLVED.value += 1
+    raise Exception("This shouldn't happen. bot:%f top:%f" % (bot, top))
+
+
+class _Coverage(object):
+    """An index of an Account's value marks and transactions.
+
+    Used to answer 'is there a mark at or before t?', 'is t within a
+    transaction window?' and 'are there transactions in a period?' with a
+    bisection rather than a scan, and to find the transactions in a period.
+
+    Dates are held as proleptic ordinals (ints), so date arithmetic on them
+    is int arithmetic; the methods take and return dates.
+    """
+
+    def __init__(self, values, transactions, cents=False):
+        """Index the (sorted) values and (unsorted) transactions.
+
+        If cents, values are integer cents and are packed in an array.
+        """
+        self.dates = [v.t for v in values]
+        self.marks = array('l', [t.toordinal() for t in self.dates])
+        if cents:
+            self.values = array('q', [v.value for v in values])
+        else:
+            self.values = [v.value for v in values]
+
+        # transactions by start: the ordinals of their window and amounts
+        flows = sorted(transactions, key=operator.attrgetter('tstart'))
+        self.tstarts = array('l', [trn.tstart.toordinal() for trn in flows])
+        self.tends = array('l', [trn.tend.toordinal() for trn in flows])
+        self.amounts = [trn.amount for trn in flows]
+
+        # merge the [tstart, tend) transaction windows, windows with
+        # tstart == tend can't contain anything
+        self.starts = array('l')
+        self.ends = array('l')
+        for (tstart, tend) in zip(self.tstarts, self.tends):
+            if tstart == tend:
+                continue
+            if self.ends and tstart <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], tend)
+            else:
+                self.starts.append(tstart)
+                self.ends.append(tend)
+
+    def mark_index(self, t):
+        """Return the number of marks at or before t."""
+        return bisect.bisect_right(self.marks, t.toordinal())
+
+    def last_mark(self, t):
+        """Return the date of the last mark at or before t (or None)."""
+        i = self.mark_index(t)
+        if i == 0:
+            return None
+        return self.dates[i - 1]
+
+    def last_value(self, t):
+        """Return the value of the last mark at or before t (or None)."""
+        i = self.mark_index(t)
+        if i == 0:
+            return None
+        return self.values[i - 1]
+
+    def flows(self, start, end):
+        """Return (lo, hi): transactions lo to hi start after start, by end.
+
+        (Indexes are into tstarts, tends and amounts.)
+        """
+        return (bisect.bisect_right(self.tstarts, start.toordinal()),
+                bisect.bisect_right(self.tstarts, end.toordinal()))
+
+    def has_flows(self, start, end):
+        """Return True iff a non-zero transaction starts in (start, end]."""
+        lo, hi = self.flows(start, end)
+        return any(self.amounts[lo:hi])
+
+    def spans(self, t):
+        """Return True iff t falls within (but not at the end of) a window."""
+        t = t.toordinal()
+        i = bisect.bisect_right(self.starts, t)
+        return i > 0 and t < self.ends[i - 1]
 
 
 class Value(collections.namedtuple('_V', "t value")):
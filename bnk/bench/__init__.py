@@ -0,0 +1,12 @@
+"""bnk.bench -- benchmarks on synthetic records.
+
+  python -m bnk bench run [--accounts N] [--years Y] [--output FILE]
+  python -m bnk bench compare [--history DIR] [--baseline FILE] [...]
+  python -m bnk bench generate FILE [--accounts N] [--years Y] [--seed S]
+
+See bnk.bench.generator (the records), bnk.bench.runner (the benchmarks
+and their JSON results) and bnk.bench.compare (the history of results and
+the comparison of a run with a baseline).
+"""
+
+from bnk.bench.runner import main    # noqa: F401
@@ -0,0 +1,167 @@
+"""Compare benchmark results against a baseline, keeping a local history.
+
+Results (see bnk.bench.runner) are saved in a history directory, one JSON
+file per run.  A new run is compared with a baseline (by default the most
+recent earlier run with the same workload) benchmark by benchmark: the
+samples are compared with a one-sided Mann-Whitney U test, and a benchmark
+is a slowdown if the test is significant (p < alpha) and its median grew
+by more than a threshold.
+
+Everything is pure python and local; no network, no extra packages.
+"""
+
+import json
+import math
+import os
+import statistics
+
+DEFAULT_HISTORY = '.bnk-bench'
+
+
+def _u_distribution(n1, n2):
+    """Return counts[u], the number of orderings giving U = u (no ties)."""
+    # counts for (i, j) built up from (i - 1, j) and (i, j - 1):
+    # f(i, j, u) = f(i - 1, j, u - j) + f(i, j - 1, u)
+    prev = [[1] for _ in range(n2 + 1)]    # i = 0: U is always 0
+    for i in range(1, n1 + 1):
+        row = [[1]]                         # j = 0: U is always 0
+        for j in range(1, n2 + 1):
+            size = i * j + 1
+            counts = [0] * size
+            for u, c in enumerate(prev[j]):
+                counts[u + j] += c
+            for u, c in enumerate(row[j - 1]):
+                counts[u] += c
+            row.append(counts)
+        prev = row
+    return prev[n2]
+
+
+def mann_whitney_u(x, y):
+    """Test whether the values in y tend to be greater than those in x.
+
+    Returns (U, p): U counts the (x, y) pairs with y > x (ties count 1/2),
+    p is the one-sided p-value.  The exact distribution is used for small
+    samples without ties, otherwise the normal approximation (with a
+    continuity and tie correction).
+    """
+    n1, n2 = len(x), len(y)
+    if not n1 or not n2:
+        raise ValueError("Both samples need at least one value")
+
+    # rank the pooled values, averaging the ranks of ties
+    pooled = sorted([(v, 0) for v in x] + [(v, 1) for v in y])
+    ranks = [0.0] * len(pooled)
+    ties = []
+    i = 0
+    while i < len(pooled):
+        j = i
+        while j + 1 < len(pooled) and pooled[j + 1][0] == pooled[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2.0 + 1
+        if j > i:
+            ties.append(j - i + 1)
+        i = j + 1
+    ranksum = sum(r for r, (v, which) in zip(ranks, pooled) if which == 1)
+    u = ranksum - n2 * (n2 + 1) / 2.0
+
+    if not ties and n1 * n2 <= 400:
+        counts = _u_distribution(n1, n2)
+        total = sum(counts)
+        p = sum(counts[int(math.ceil(u)):]) / float(total)
+        return (u, p)
+
+    n = n1 + n2
+    mean = n1 * n2 / 2.0
+    tiecorrection = sum(t ** 3 - t for t in ties) / float(n * (n - 1))
+    variance = n1 * n2 / 12.0 * ((n + 1) - tiecorrection)
+    if variance <= 0:
+        return (u, 1.0)
+    z = (u - mean - 0.5) / math.sqrt(variance)
+    return (u, 0.5 * math.erfc(z / math.sqrt(2)))
+
+
+def compare(baseline, results, alpha=0.05, threshold=0.05):
+    """Compare results with baseline, benchmark by benchmark.
+
+    Returns a list of dicts (one per benchmark in both) with the keys
+    'name', 'baseline' and 'new' (medians), 'change' (relative change of
+    the median), 'p' (the one-sided p-value of a slowdown) and 'verdict'
+    ('slower', 'faster' or 'same').
+    """
+    rows = []
+    old, new = baseline['benchmarks'], results['benchmarks']
+    for name in new:
+        if name not in old:
+            continue
+        x, y = old[name]['samples'], new[name]['samples']
+        mx, my = statistics.median(x), statistics.median(y)
+        change = (my - mx) / mx if mx else 0.0
+        _, p_slower = mann_whitney_u(x, y)
+        _, p_faster = mann_whitney_u(y, x)
+        if p_slower < alpha and change > threshold:
+            verdict = 'slower'
+        elif p_faster < alpha and change < -threshold:
+            verdict = 'faster'
+        else:
+            verdict = 'same'
+        rows.append({'name': name, 'baseline': mx, 'new': my,
+                     'change': change, 'p': p_slower, 'verdict': verdict})
+    return rows
+
+
+def format_comparison(rows):
+    """Return the comparison as a table (a string)."""
+    lines = ["%-32s %12s %12s %8s %8s  %s" % ("benchmark", "baseline",
+                                              "new", "change", "p", "")]
+    for row in rows:
+        lines.append("%-32s %12.6f %12.6f %+7.1f%% %8.4f  %s" % (
+            row['name'], row['baseline'], row['new'], 100 * row['change'],
+            row['p'], row['verdict'] if row['verdict'] != 'same' else ''))
+    return "\n".join(lines)
+
+
+def save(results, directory=DEFAULT_HISTORY):
+    """Save results in the history directory, return the file's path."""
+    os.makedirs(directory, exist_ok=True)
+    meta = results['meta']
+    stamp = meta['timestamp'].replace(':', '').replace('-', '')
+    name = "%s-%s" % (stamp, (meta.get('git') or 'nogit')[:10])
+    # the sequence number keeps runs within a second in order
+    n = 1
+    path = os.path.join(directory, "%s-%02d.json" % (name, n))
+    while os.path.exists(path):
+        n += 1
+        path = os.path.join(directory, "%s-%02d.json" % (name, n))
+    with open(path, 'w') as fout:
+        json.dump(results, fout, indent=1)
+    return path
+
+
+def load(path):
+    """Load results from a JSON file."""
+    with open(path) as fin:
+        return json.load(fin)
+
+
+def history(directory=DEFAULT_HISTORY):
+    """Return the paths of the saved results, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name)
+                  for name in os.listdir(directory) if name.endswith('.json'))
+
+
+def latest(directory=DEFAULT_HISTORY, params=None, exclude=()):
+    """Return the most recent saved results (with params, if given).
+
+    Returns a (path, results) tuple, or (None, None) if there aren't any.
+    """
+    for path in reversed(history(directory)):
+        if path in exclude:
+            continue
+        results = load(path)
+        if params is None or results['meta'].get('params') == params:
+            return (path, results)
+    return (None, None)
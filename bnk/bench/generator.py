@@ -0,0 +1,133 @@
+"""Generate reproducible (seeded) synthetic records of any size.
+
+The records hold an 'Assets' account funding a number of investment
+accounts.  Accounts open on month boundaries; each month some of them get
+deposits or withdrawals (transacted over the first 10 days of the month)
+and all open accounts are marked at month end.  Balances grow at a random,
+per-account rate.  Groups and metas over the accounts are added, as are
+the R_* groups used by bnk.reports.asciireport.
+
+The same arguments (including the seed) always produce the same records.
+"""
+
+import datetime as dt
+import io
+import random
+
+
+def _month_ends(start, months):
+    """Generate the last day of each of months months, from start's."""
+    year, month = start.year, start.month
+    for _ in range(months):
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+        yield dt.date(year, month, 1) - dt.timedelta(days=1)
+
+
+class _Account(object):
+    """The state of a synthetic account during generation."""
+
+    __slots__ = ('name', 'opening', 'balance', 'rate', 'activity')
+
+    def __init__(self, name, opening, rng):
+        self.name = name
+        self.opening = opening
+        self.balance = 0.0
+        # monthly growth (mean ~5%/year) and likelihood of a transaction
+        self.rate = rng.gauss(0.004, 0.004)
+        self.activity = rng.uniform(0.2, 0.8)
+
+
+def generate(stream, accounts=50, years=10, start=dt.date(2000, 1, 1),
+             seed=0, groups=10, metas=10, report_accounts=20):
+    """Write synthetic records to stream.
+
+    Arguments:
+      stream - receives the records (text); written once per month
+      accounts - the number of investment accounts
+      years - the number of years of monthly activity
+      start - the month in which records begin
+      seed - the random seed
+      groups - the number of groups (each of ~10% of the accounts)
+      metas - the number of metas (each of ~5% of the accounts)
+      report_accounts - the number of accounts in the R_* report groups
+
+    Returns:
+      the number of records (value marks and transactions) written
+    """
+    rng = random.Random(seed)
+    months = 12 * years
+    first = dt.date(start.year, start.month, 1)
+    ends = list(_month_ends(first, months))
+    width = len(str(accounts))
+
+    acts = []
+    for n in range(accounts):
+        # a third open at the start, the rest in the first half
+        if rng.random() < 1 / 3.0:
+            opening = first
+        else:
+            opening = ends[rng.randrange(months // 2)] + dt.timedelta(days=1)
+        acts.append(_Account("A%0*d" % (width, n), opening, rng))
+
+    names = [act.name for act in acts]
+    out = ["01-01-1900 open Assets\n"]
+    out.extend("%s open %s\n" % (act.opening.strftime("%m-%d-%Y"), act.name)
+               for act in acts)
+    out.append("\n")
+    for g in range(groups):
+        members = rng.sample(names, max(1, accounts // 10))
+        out.append("group G%d -> (%s)\n" % (g, " ".join(members)))
+    for m in range(metas):
+        members = rng.sample(names, max(1, accounts // 20))
+        out.append("meta M%d -> (%s)\n" % (m, " ".join(members)))
+    reported = " ".join(names[:report_accounts])
+    for group in ('R_networth', 'R_performance', 'R_basicstats'):
+        out.append("group %s -> (%s)\n" % (group, reported))
+    out.append("group R_detail -> (%s)\n" % " ".join(names[:3]))
+    stream.write("".join(out))
+
+    count = 0
+    for end in ends:
+        month = dt.date(end.year, end.month, 1)
+        window = (month, month + dt.timedelta(days=9))
+        out = []
+        open_acts = [act for act in acts if act.opening <= month]
+        moves = []
+        for act in open_acts:
+            # no transactions in an account's first month (the window would
+            # start on the opening date)
+            if act.opening < month and rng.random() < act.activity:
+                amount = rng.randrange(1, 50) * 100
+                if act.balance > amount and rng.random() < 0.3:
+                    amount = -amount
+                moves.append((act, amount))
+        if moves:
+            out.append("\nfrom %s until %s\n---\n" %
+                       (window[0].strftime("%m-%d-%Y"),
+                        window[1].strftime("%m-%d-%Y")))
+            for act, amount in moves:
+                if amount > 0:
+                    out.append("Assets -> %s %d\n" % (act.name, amount))
+                else:
+                    out.append("%s -> Assets %d\n" % (act.name, -amount))
+                act.balance += amount
+            count += 2 * len(moves)
+
+        if not open_acts:
+            continue
+        out.append("\n%s balances\n---\n" % end.strftime("%m-%d-%Y"))
+        for act in open_acts:
+            act.balance *= 1 + rng.gauss(act.rate, 0.01)
+            out.append("%s %.2f\n" % (act.name, act.balance))
+        count += len(open_acts)
+        stream.write("".join(out))
+    return count
+
+
+def records(**kwargs):
+    """Return synthetic records as a string (see generate for arguments)."""
+    stream = io.StringIO()
+    generate(stream, **kwargs)
+    return stream.getvalue()
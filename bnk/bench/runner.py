@@ -0,0 +1,363 @@
+"""Benchmarks of each stage of a bnk run, with JSON results.
+
+Each benchmark times one stage (parsing, loading, building metas, solving
+IRRs, building each report, rendering each view) on synthetic records from
+bnk.bench.generator.  A benchmark is run repeat times after a warm up run;
+the samples (seconds) and a summary are kept in the results:
+
+  {"meta": {"params": {...}, "python": ..., "machine": ..., ...},
+   "benchmarks": {"parse": {"samples": [...], "min": ..., "median": ...,
+                            "mean": ...}, ...}}
+"""
+
+import argparse
+import datetime as dt
+import io
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bnk import read_bnk_data
+from bnk import fiscalyear as fy
+from bnk import reporting
+from bnk import views
+from bnk.bench import compare
+from bnk.bench import generator
+from bnk.groups import MetaAccount
+from bnk.parse import parse_records
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+    """Register a benchmark: a function of a _Workload, returning a callable.
+
+    The decorated function does the setup (untimed); the callable it
+    returns is what's timed.
+    """
+    def register(setup):
+        BENCHMARKS.append((name, setup))
+        return setup
+    return register
+
+
+class _Workload(object):
+    """Synthetic records and things derived from them, built on demand."""
+
+    def __init__(self, **params):
+        self.params = params
+        self._text = None
+        self._bnkdata = None
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = generator.records(**self.params)
+        return self._text
+
+    @property
+    def bnkdata(self):
+        if self._bnkdata is None:
+            self._bnkdata = read_bnk_data(self.text)
+        return self._bnkdata
+
+    @property
+    def end(self):
+        """The date of the last value mark."""
+        return max(act._values[-1].t
+                   for act in self.bnkdata['Account'].values())
+
+    @property
+    def periods(self):
+        return fy.standard_periods(self.end)
+
+    @property
+    def reported(self):
+        """The accounts that reports are built for."""
+        return list(self.bnkdata['Group']['R_performance'])
+
+
+@benchmark('generate')
+def _generate(work):
+    fd, path = tempfile.mkstemp(suffix='.r')
+    os.close(fd)
+
+    def run():
+        try:
+            with open(path, 'w') as fout:
+                generator.generate(fout, **work.params)
+        finally:
+            os.unlink(path)
+    return run
+
+
+@benchmark('parse')
+def _parse(work):
+    text = work.text
+    return lambda: parse_records(text)
+
+
+@benchmark('load')
+def _load(work):
+    text = work.text
+    return lambda: read_bnk_data(text)
+
+
+@benchmark('meta')
+def _meta(work):
+    groups = [(name, meta._group)
+              for name, meta in work.bnkdata['Meta'].items()]
+    return lambda: [MetaAccount(name, group) for name, group in groups]
+
+
+@benchmark('get_irr')
+def _get_irr(work):
+    spans = [(act, p.start, p.end) for act in work.reported
+             for p in work.periods if act.coverage(p.start, p.end) is None]
+
+    def run():
+        for (act, start, end) in spans:
+            act.get_irr(start, end)
+    return run
+
+
+@benchmark('get_dietz')
+def _get_dietz(work):
+    spans = [(act, p.start, p.end) for act in work.reported
+             for p in work.periods if act.coverage(p.start, p.end) is None]
+
+    def run():
+        for (act, start, end) in spans:
+            act.get_dietz(start, end)
+    return run
+
+
+@benchmark('rolling_irr')
+def _rolling_irr(work):
+    accounts = work.reported
+    return lambda: [act.rolling_irr(36, 3) for act in accounts]
+
+
+@benchmark('report.PerfOverviewReport')
+def _perf_overview(work):
+    accounts, periods = work.reported, work.periods
+    return lambda: reporting.PerfOverviewReport(accounts, periods)
+
+
+@benchmark('report.NetWorthReport')
+def _net_worth(work):
+    accounts = [work.bnkdata['Group']['R_networth']]
+    dates = [work.end, fy.years_ago(work.end, 1), fy.years_ago(work.end, 2)]
+    return lambda: reporting.NetWorthReport(accounts, dates)
+
+
+@benchmark('report.BasicStatsReport')
+def _basic_stats(work):
+    accounts, periods = work.reported, work.periods
+    return lambda: reporting.BasicStatsReport(accounts, periods, 'gain')
+
+
+@benchmark('report.DetailReport')
+def _detail(work):
+    accounts, periods = work.reported, work.periods
+
+    def run():
+        for act in accounts:
+            reporting.DetailReport(act, periods)
+    return run
+
+
+def _view_benchmark(name, cls):
+    @benchmark('view.' + name)
+    def _view(work):
+        cube = reporting.PerformanceCube()
+        dates = [work.end, fy.years_ago(work.end, 1)]
+        reports = [reporting.NetWorthReport([work.bnkdata['Group']['G0']],
+                                            dates, cube=cube),
+                   reporting.PerfOverviewReport(work.reported, work.periods,
+                                                cube=cube)]
+
+        def run():
+            with cls(stream=io.StringIO()) as view:
+                for report in reports:
+                    view.append(report, title="Report")
+        return run
+    return _view
+
+
+for _name, _cls in sorted(views.VIEWS.items()):
+    _view_benchmark(_name, _cls)
+
+
+def machine():
+    """Return a dict describing this machine and interpreter."""
+    meta = {'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+            'hostname': platform.node(),
+            'timestamp': dt.datetime.now().isoformat(timespec='seconds')}
+    try:
+        here = os.path.dirname(os.path.abspath(__file__))
+        meta['git'] = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=here,
+            stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        meta['git'] = None
+    return meta
+
+
+def run(params, repeat=5, pattern=None, progress=None):
+    """Run the benchmarks, return the results (a JSON-able dict).
+
+    Arguments:
+      params - arguments for generator.generate (accounts, years, seed...)
+      repeat - the number of timed runs of each benchmark
+      pattern - a regular expression, only matching benchmarks are run
+      progress - (optional) a stream to note each benchmark's progress on
+    """
+    work = _Workload(**params)
+    results = {}
+    for (name, setup) in BENCHMARKS:
+        if pattern and not re.search(pattern, name):
+            continue
+        func = setup(work)
+        func()    # warm up
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+        results[name] = {'samples': samples, 'min': min(samples),
+                         'median': statistics.median(samples),
+                         'mean': statistics.mean(samples)}
+        if progress:
+            print("%-32s %10.4f s (median of %d)" %
+                  (name, results[name]['median'], repeat), file=progress)
+
+    meta = machine()
+    meta['params'] = dict(params, repeat=repeat)
+    return {'meta': meta, 'benchmarks': results}
+
+
+def _add_workload_arguments(parser):
+    parser.add_argument('--accounts', type=int, default=50,
+                        help="number of accounts (default: %(default)s)")
+    parser.add_argument('--years', type=int, default=10,
+                        help="years of monthly records (default: "
+                        "%(default)s)")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="random seed (default: %(default)s)")
+
+
+def _workload(args):
+    return {'accounts': args.accounts, 'years': args.years,
+            'seed': args.seed}
+
+
+def main(argv):
+    """Run the 'bench' command (argv excludes 'bench')."""
+    parser = argparse.ArgumentParser(prog="bnk bench")
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    runp = commands.add_parser('run', help="run the benchmarks")
+    _add_workload_arguments(runp)
+    runp.add_argument('--repeat', type=int, default=5,
+                      help="timed runs of each benchmark (default: "
+                      "%(default)s)")
+    runp.add_argument('--filter', metavar='REGEX',
+                      help="only run benchmarks matching REGEX")
+    runp.add_argument('--output', metavar='FILE',
+                      help="write the JSON results to FILE")
+
+    cmpp = commands.add_parser('compare', help="run the benchmarks, save"
+                               " the results and compare with a baseline")
+    _add_workload_arguments(cmpp)
+    cmpp.add_argument('--repeat', type=int, default=10,
+                      help="timed runs of each benchmark (default: "
+                      "%(default)s)")
+    cmpp.add_argument('--filter', metavar='REGEX',
+                      help="only run benchmarks matching REGEX")
+    cmpp.add_argument('--history', default=compare.DEFAULT_HISTORY,
+                      metavar='DIR', help="where results are kept (default:"
+                      " %(default)s)")
+    cmpp.add_argument('--baseline', metavar='FILE',
+                      help="results to compare with (default: the latest"
+                      " saved results for the same workload)")
+    cmpp.add_argument('--results', metavar='FILE',
+                      help="compare these results rather than running the"
+                      " benchmarks")
+    cmpp.add_argument('--alpha', type=float, default=0.05,
+                      help="significance level (default: %(default)s)")
+    cmpp.add_argument('--threshold', type=float, default=0.05,
+                      help="ignore changes of the median smaller than this"
+                      " fraction (default: %(default)s)")
+    cmpp.add_argument('--no-save', action='store_true',
+                      help="don't add the results to the history")
+
+    genp = commands.add_parser('generate', help="write synthetic records")
+    genp.add_argument('file', help="the records file to write")
+    _add_workload_arguments(genp)
+
+    args = parser.parse_args(argv)
+    if args.command == 'generate':
+        with open(args.file, 'w') as fout:
+            count = generator.generate(fout, **_workload(args))
+        print("%s: %d records" % (args.file, count), file=sys.stderr)
+        return 0
+
+    if args.command == 'compare':
+        return _compare(args)
+
+    results = run(_workload(args), args.repeat, args.filter, sys.stdout)
+    if args.output:
+        with open(args.output, 'w') as fout:
+            json.dump(results, fout, indent=1)
+    return 0
+
+
+def _compare(args):
+    """Run the 'compare' command, return 1 if anything got slower."""
+    if args.results:
+        results = compare.load(args.results)
+    else:
+        results = run(_workload(args), args.repeat, args.filter, sys.stderr)
+
+    saved = None
+    if not args.no_save:
+        saved = compare.save(results, args.history)
+        print("saved %s" % saved, file=sys.stderr)
+
+    if args.baseline:
+        basepath, baseline = args.baseline, compare.load(args.baseline)
+    else:
+        basepath, baseline = compare.latest(args.history,
+                                            results['meta'].get('params'),
+                                            exclude=(saved, args.results))
+    if baseline is None:
+        print("No baseline to compare with (yet)", file=sys.stderr)
+        return 0
+    if baseline['meta'].get('params') != results['meta'].get('params'):
+        print("Warning: the baseline's workload differs: %s" %
+              baseline['meta'].get('params'), file=sys.stderr)
+    if baseline['meta'].get('hostname') != results['meta'].get('hostname'):
+        print("Warning: the baseline ran on %s" %
+              baseline['meta'].get('hostname'), file=sys.stderr)
+
+    rows = compare.compare(baseline, results, args.alpha, args.threshold)
+    print("baseline: %s (%s)" % (basepath, baseline['meta'].get('git')))
+    print(compare.format_comparison(rows))
+    slower = [row['name'] for row in rows if row['verdict'] == 'slower']
+    if slower:
+        print("Slower: %s" % ", ".join(slower), file=sys.stderr)
+        return 1
+    return 0
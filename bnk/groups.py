@@ -2,10 +2,15 @@
 
 import logging
 from bnk import account
+from bnk import metrics
+from bnk import trace
 import operator
 
 _log = logging.getLogger(__name__)
 
+_METAS = metrics.counter('meta.accounts')
+_META_MARKS = metrics.histogram('meta.value_marks')
+
 
 class Group(object):
     """A group of related accounts.
@@ -17,8 +22,22 @@ class Group(object):
     def __init__(self, name, iterable):
         """Create a group with the specified name and members."""
         self._members = tuple(iterable)
+        # members are hashed by identity; Groups define __eq__ (and are thus
+        # unhashable) and Accounts don't, so identity is the common ground
+        self._memberids = frozenset(id(m) for m in self._members)
         self._name = name
 
+    def __getstate__(self):
+        """Return the state for pickling, less the identity-based set."""
+        state = dict(self.__dict__)
+        del state['_memberids']
+        return state
+
+    def __setstate__(self, state):
+        """Restore the pickled state, rebuilding the identity-based set."""
+        self.__dict__.update(state)
+        self._memberids = frozenset(id(m) for m in self._members)
+
     def __str__(self):
         """Generate a string representation for the Group."""
         mems = ",".join((a.name for a in self._members))
@@ -34,7 +53,10 @@ class Group(object):
 
     def __contains__(self, k):
         """Return true iff the group contains k as a member."""
-        return k in self._members
+        if id(k) in self._memberids:
+            return True
+        # an equivilant (but distinct) Group is still a member
+        return isinstance(k, Group) and k in self._members
 
     def __iter__(self):
         """Return an iterator over the group members."""
@@ -57,6 +79,82 @@ class Group(object):
 
         return False
 
+    def accounts(self):
+        """Generate the accounts in the group, including those nested.
+
+        Nested groups are walked depth first, and each account is generated
+        only once (even if it is reachable through several nested groups).
+        """
+        seen = set()
+        stack = list(reversed(self._members))
+        while stack:
+            member = stack.pop()
+            if isinstance(member, Group):
+                stack.extend(reversed(member._members))
+            elif id(member) not in seen:
+                seen.add(id(member))
+                yield member
+
+
+class MembershipIndex(object):
+    """A reverse index from accounts to the groups/metas that contain them.
+
+    The index is built once (after records are read) so that questions like
+    "which groups contain this account?" or "which metas are affected if this
+    account changes?" don't require scanning every group.  Membership is
+    transitive: an account in a nested group is a member of the outer group.
+    """
+
+    def __init__(self, groups=(), metas=()):
+        """Index the specified groups and meta accounts.
+
+        Arguments:
+         groups -- an iterable of Group instances
+         metas  -- an iterable of MetaAccount instances
+        """
+        self._groups = {}
+        self._metas = {}
+
+        for group in groups:
+            for act in group.accounts():
+                self._groups.setdefault(act, []).append(group)
+
+        for meta in metas:
+            for act in meta._group.accounts():
+                self._metas.setdefault(act, []).append(meta)
+
+    def groups_of(self, act):
+        """Return a tuple of Groups that contain the specified account."""
+        return tuple(self._groups.get(act, ()))
+
+    def metas_of(self, act):
+        """Return a tuple of MetaAccounts built from the specified account."""
+        return tuple(self._metas.get(act, ()))
+
+    def is_member(self, act, group):
+        """Return True iff account is (perhaps indirectly) in group/meta."""
+        if isinstance(group, MetaAccount):
+            return any(m is group for m in self._metas.get(act, ()))
+        return any(g is group for g in self._groups.get(act, ()))
+
+    def affected(self, accounts):
+        """Return the Groups and MetaAccounts containing any given account.
+
+        Groups are listed before MetaAccounts, each in the order in which
+        they are first encountered, and each is listed once.
+        """
+        groups = []
+        metas = []
+        seen = set()
+        for act in accounts:
+            for (found, index) in [(groups, self._groups),
+                                   (metas, self._metas)]:
+                for item in index.get(act, ()):
+                    if id(item) not in seen:
+                        seen.add(id(item))
+                        found.append(item)
+        return groups + metas
+
 
 class MetaAccount(account.Account):
     """A single account that captures transactions/values of multiple others.
@@ -68,10 +166,17 @@ class MetaAccount(account.Account):
 
     def __init__(self, name, contributors):
         """Initialize a MetaAccount with specified name and child accounts."""
+        with trace.span('MetaAccount.__init__', meta=name):
+            self._init(name, contributors)
+
+    def _init(self, name, contributors):
 
         openings = [(act._topen, act) for act in contributors]
         openings.sort(key=operator.itemgetter(0))
-        account.Account.__init__(self, name, openings[0][0])
+        cents = {act.cents for act in contributors}
+        if len(cents) > 1:
+            raise ValueError("%s mixes accounts in cents and dollars" % name)
+        account.Account.__init__(self, name, openings[0][0], cents.pop())
 
         # contribtors sorted by start date
         contributors = [a[1] for a in openings]
@@ -92,19 +197,22 @@ class MetaAccount(account.Account):
         all_value_marks.discard(self._topen)
         value_marks_list = list(all_value_marks)
         value_marks_list.sort()
+        _METAS.value += 1
+        _META_MARKS.observe(len(value_marks_list))
 
         for act in contributors:
             for t in act._transactions:
                 t.add_to_account(self)
 
         for date in value_marks_list:
-            v = 0.0
+            v = self._zero()
             for act in contributors:
 
                 if date > act._topen:
-                    actv, msg = act.get_value(date)
-                    v += actv
-                # otherwise, add 0...
+                    actv, msg = act._get_value(date)[:2]
+                    if msg in ("Marked", "Carried"):
+                        v += actv
+                # otherwise (not open, closed), add 0...
 
             self.mark_value(account.Value(date, v))
 
@@ -0,0 +1,238 @@
+"""Memory profiling: peak and retained memory by stage and by type.
+
+A MemoryProfiler listens to trace spans (see bnk.trace) and, with
+tracemalloc, measures for each stage the peak memory above what was in use
+when the stage began, and the memory the stage retained (in use when it
+ended less in use when it began).  Spans with the same name are aggregated:
+the largest peak, the total retained.
+
+At the end of the stages listed in MemoryProfiler.CENSUS (and of each
+report's __init__), the live objects of the types that make up a ledger are
+counted: PLY tokens and parser symbols, Records, Transaction and Value
+tuples, Accounts, MetaAccounts, report Tables and Cells.  Sizes are shallow
+(an object and its __dict__, not what it refers to).  The record text is
+sized when it's parsed.  The largest census of each type is kept, with the
+stage it was taken at.
+
+Usage:
+
+    profiler = memprofile.MemoryProfiler()
+    with profiler:             # traces spans and starts tracemalloc
+        read_bnk_data(...)
+    print(profiler.summary())
+
+Memory is process-wide: allocations in other threads count toward the
+stage that's open in the profiled thread, and allocations in worker
+processes (see --jobs) aren't seen.  Tracing allocations slows everything
+down, so don't combine --memprofile and --profile timings.
+"""
+
+import gc
+import json
+import sys
+import threading
+import tracemalloc
+
+import ply.lex
+import ply.yacc
+
+from bnk import trace
+from bnk.account import Account, Transaction, Value
+from bnk.groups import MetaAccount
+from bnk.parse import Record
+from bnk.tables import Cell, Table
+
+# the tracked types, in the order they're reported
+_TYPES = [('PLY tokens', ply.lex.LexToken),
+          ('PLY symbols', ply.yacc.YaccSymbol),
+          ('Record', Record),
+          ('Transaction', Transaction),
+          ('Value', Value),
+          ('Account', Account),
+          ('MetaAccount', MetaAccount),
+          ('Table', Table),
+          ('Cell', Cell)]
+
+_TEXT = 'record text'
+
+
+def _sizeof(obj):
+    """Return the shallow size of obj and its __dict__ (if any)."""
+    size = sys.getsizeof(obj)
+    d = getattr(obj, '__dict__', None)
+    if d is not None:
+        size += sys.getsizeof(d)
+    return size
+
+
+def census():
+    """Return {type label: [count, bytes]} for the live tracked objects.
+
+    Transactions and Values are tuples of untracked (atomic) values, which
+    the garbage collector may stop tracking, so they're found through the
+    Records and Accounts that hold them.
+    """
+    exact = {cls: label for (label, cls) in _TYPES}
+    counts = {label: [0, 0] for (label, cls) in _TYPES}
+    seen = set()
+
+    def add(label, obj):
+        if id(obj) not in seen:
+            seen.add(id(obj))
+            counts[label][0] += 1
+            counts[label][1] += _sizeof(obj)
+
+    for obj in gc.get_objects():
+        label = exact.get(type(obj))
+        if label is None:
+            continue
+        add(label, obj)
+        if label == 'Record':
+            record = obj.record()
+            if type(record) in (Transaction, Value):
+                add(exact[type(record)], record)
+        elif label in ('Account', 'MetaAccount'):
+            for t in obj._transactions:
+                add('Transaction', t)
+            for v in obj._values:
+                add('Value', v)
+    return counts
+
+
+class _Stage(object):
+    """A stage being measured."""
+
+    __slots__ = ('name', 'start', 'peak')
+
+    def __init__(self, name, start):
+        self.name = name
+        self.start = start
+        self.peak = start
+
+
+class MemoryProfiler(object):
+    """Measures memory by stage (a trace listener) and by type."""
+
+    # census is taken at the end of these stages (and of reports' __init__)
+    CENSUS = ('parse', 'read_bnk_data', 'copy records')
+
+    def __init__(self):
+        """Initialize a MemoryProfiler (not yet measuring)."""
+        # name -> [count, peak, retained] (bytes), in order of first use
+        self.stages = {}
+        # label -> (count, bytes, stage) of the largest census
+        self.types = {}
+        self._stack = []
+        self._thread = None
+        self._tracer = None
+        self._enabled = False
+        self._started = False
+
+    def start(self):
+        """Start tracemalloc and listen to spans (enabling tracing)."""
+        self._thread = threading.get_ident()
+        self._tracer = trace.tracer()
+        self._enabled = self._tracer is None
+        if self._enabled:
+            self._tracer = trace.enable()
+        self._tracer.listeners.append(self)
+        self._started = not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+    def stop(self):
+        """Stop listening (and tracemalloc, if start() started it)."""
+        if self in self._tracer.listeners:
+            self._tracer.listeners.remove(self)
+        if self._enabled and self._tracer is trace.tracer():
+            trace.disable()
+            self._enabled = False
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    def _fold_peak(self):
+        """Fold the peak since the last reset into the open stage."""
+        current, peak = tracemalloc.get_traced_memory()
+        if self._stack:
+            top = self._stack[-1]
+            top.peak = max(top.peak, peak)
+        return current
+
+    def span_enter(self, name, depth, args):
+        """Begin measuring a stage (a span's begun)."""
+        if threading.get_ident() != self._thread:
+            return
+        current = self._fold_peak()
+        self._stack.append(_Stage(name, current))
+        tracemalloc.reset_peak()
+
+    def span_exit(self, name, depth, args):
+        """Finish measuring a stage (a span's ended)."""
+        if threading.get_ident() != self._thread or not self._stack:
+            return
+        current = self._fold_peak()
+        stage = self._stack.pop()
+        if self._stack:
+            self._stack[-1].peak = max(self._stack[-1].peak, stage.peak)
+
+        if stage.name not in self.stages:
+            self.stages[stage.name] = [0, 0, 0]
+        totals = self.stages[stage.name]
+        totals[0] += 1
+        totals[1] = max(totals[1], stage.peak - stage.start)
+        totals[2] += current - stage.start
+
+        if args and 'size' in args and name == 'parse':
+            self._keep(_TEXT, 1, args['size'], name)
+        if name in self.CENSUS or name.endswith('Report.__init__'):
+            for label, (count, size) in census().items():
+                self._keep(label, count, size, name)
+        # the census (and this bookkeeping) isn't part of any stage's peak
+        tracemalloc.reset_peak()
+
+    def _keep(self, label, count, size, stage):
+        if label not in self.types or size > self.types[label][1]:
+            self.types[label] = (count, size, stage)
+
+    def summary(self):
+        """Return the breakdowns by stage and by type as a string."""
+        lines = ["%-40s %8s %12s %12s" % ("stage", "count", "peak KiB",
+                                          "retained KiB")]
+        for name, (count, peak, retained) in self.stages.items():
+            lines.append("%-40s %8d %12.1f %12.1f" % (
+                name[:40], count, peak / 1024.0, retained / 1024.0))
+        lines.append("")
+        lines.append("%-40s %8s %12s  %s" % ("type (largest census)",
+                                             "count", "KiB", "at"))
+        for label in [_TEXT] + [label for (label, cls) in _TYPES]:
+            if label in self.types:
+                count, size, stage = self.types[label]
+                lines.append("%-40s %8d %12.1f  %s" % (
+                    label, count, size / 1024.0, stage))
+        return "\n".join(lines)
+
+    def as_dict(self):
+        """Return the breakdowns as a JSON-able dict."""
+        return {'stages': {name: {'count': count, 'peak': peak,
+                                  'retained': retained}
+                           for name, (count, peak, retained)
+                           in self.stages.items()},
+                'types': {label: {'count': count, 'bytes': size,
+                                  'stage': stage}
+                          for label, (count, size, stage)
+                          in self.types.items()}}
+
+    def write(self, path):
+        """Write the breakdowns to path as JSON."""
+        with open(path, 'w') as fout:
+            json.dump(self.as_dict(), fout, indent=1)
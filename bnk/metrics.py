@@ -0,0 +1,143 @@
+"""A process-wide registry of counters and histograms.
+
+Where trace answers 'where does the time go?', metrics answer 'why?':
+how many times balances were looked up, how many bisection steps each IRR
+solve took, how many solves failed, how many report cells are empty, etc.
+
+Instruments are created once (usually at import) and updated in place:
+
+    _LOOKUPS = metrics.counter('account.get_value')
+    ...
+    _LOOKUPS.value += 1          # in a hot path
+    _LOOKUPS.inc()               # elsewhere
+
+    _STEPS = metrics.histogram('irr.iterations')
+    _STEPS.observe(steps)
+
+Counters are always on; an update is an attribute increment.
+snapshot() returns the current values (for use from python), dump()
+writes them as JSON, and dump_at_exit() arranges for that at exit.
+
+Updates made in worker processes (see --jobs) aren't collected.
+"""
+
+import atexit
+import json
+import math
+import sys
+
+_REGISTRY = {}
+
+
+class Counter(object):
+    """A count of events."""
+
+    __slots__ = ('name', 'value')
+
+    def __init__(self, name):
+        """Initialize a Counter (at 0)."""
+        self.name = name
+        self.value = 0
+
+    def inc(self, n=1):
+        """Count n more events."""
+        self.value += n
+
+    def reset(self):
+        """Return the counter to 0."""
+        self.value = 0
+
+    def snapshot(self):
+        """Return the count."""
+        return self.value
+
+
+class Histogram(object):
+    """The distribution of an observed quantity (e.g., iterations).
+
+    Observations are counted in power-of-two buckets: bucket b counts the
+    observations v with 2**(b-1) < v <= 2**b (bucket 0 counts v <= 1).
+    """
+
+    __slots__ = ('name', 'count', 'total', 'min', 'max', 'buckets')
+
+    def __init__(self, name):
+        """Initialize an empty Histogram."""
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        """Forget all observations."""
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.buckets = {}
+
+    def observe(self, value):
+        """Record an observation."""
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        bucket = (math.ceil(value) - 1).bit_length() if value > 1 else 0
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def snapshot(self):
+        """Return the count, sum, min, max, mean and buckets as a dict."""
+        return {'count': self.count, 'sum': self.total,
+                'min': self.min, 'max': self.max,
+                'mean': self.total / self.count if self.count else None,
+                'buckets': {'<=%d' % (1 << b): n
+                            for b, n in sorted(self.buckets.items())}}
+
+
+def _instrument(cls, name):
+    instrument = _REGISTRY.get(name)
+    if instrument is None:
+        instrument = _REGISTRY[name] = cls(name)
+    elif not isinstance(instrument, cls):
+        raise TypeError("Metric %s is a %s, not a %s" %
+                        (name, type(instrument).__name__, cls.__name__))
+    return instrument
+
+
+def counter(name):
+    """Return the Counter named name (creating it if need be)."""
+    return _instrument(Counter, name)
+
+
+def histogram(name):
+    """Return the Histogram named name (creating it if need be)."""
+    return _instrument(Histogram, name)
+
+
+def snapshot():
+    """Return {name: value} for all metrics (sorted by name)."""
+    return {name: _REGISTRY[name].snapshot() for name in sorted(_REGISTRY)}
+
+
+def reset():
+    """Reset all metrics (they stay registered)."""
+    for instrument in _REGISTRY.values():
+        instrument.reset()
+
+
+def dump(stream=None):
+    """Write the snapshot to stream (default: sys.stderr) as JSON."""
+    stream = stream or sys.stderr
+    json.dump(snapshot(), stream, indent=1, sort_keys=True)
+    stream.write('\n')
+
+
+def dump_at_exit(path=None):
+    """Dump the metrics when the process exits, to path or sys.stderr."""
+    def _dump():
+        if path:
+            with open(path, 'w') as fout:
+                dump(fout)
+        else:
+            dump()
+    atexit.register(_dump)
@@ -1,18 +1,26 @@
 """bnk record-string parser."""
 
+import copy
 import logging
+import sys
+import time
 from collections import OrderedDict
 import datetime as dt
 import ply.lex as lex
 import ply.yacc as yacc
 from bnk.account import Account, Value, Transaction
-from bnk.groups import Group, MetaAccount
+from bnk.groups import Group, MetaAccount, MembershipIndex
+from bnk import metrics
+from bnk import trace
 
 _log = logging.getLogger(__name__)
 
 
 _ErrorToken = None
 
+_READS = metrics.counter('parse.reads')
+_RECORDS = metrics.counter('parse.records')
+
 
 def last_error_token():
     """Return the token that led to the most recent error."""
@@ -98,8 +106,15 @@ def t_newline(t):
 
 def t_DATEMDY(t):
     r'\d\d-\d\d-\d\d\d\d'
-    t.value = dt.date(int(t.value[6:10]),
-                      int(t.value[0:2]), int(t.value[3:5]))
+    # records repeat a few dates many times, and dates are immutable, so
+    # each distinct date is made once per read (see parse_records)
+    dates = t.lexer.DATES
+    date = dates.get(t.value)
+    if date is None:
+        date = dates[t.value] = dt.date(int(t.value[6:10]),
+                                        int(t.value[0:2]),
+                                        int(t.value[3:5]))
+    t.value = date
     return t
 
 
@@ -114,10 +129,20 @@ def t_QUARTER(t):
 
 def t_NUMBER(t):
     r'-{0,1}\d+\.{0,1}\d{0,2}'
-    t.value = float(t.value)
+    if t.lexer.cents:
+        t.value = to_cents(t.value)
+    else:
+        t.value = float(t.value)
     return t
 
 
+def to_cents(number):
+    """Convert a number string (at most 2 decimal places) to integer cents."""
+    whole, _, fraction = number.partition('.')
+    cents = abs(int(whole)) * 100 + int((fraction + '00')[:2])
+    return -cents if whole.startswith('-') else cents
+
+
 def t_YEAR(t):
     r'\d\d\d\d'
     year = int(t.value)
@@ -140,9 +165,7 @@ def t_error(t):     # No doc string for this t_ function  noqa: D103
 
 def is_new_name(name):
     """Determine if an (account/group) name is already known."""
-    if name in _lexer.ACCOUNTS or name in _lexer.GROUPS or name in _lexer.META:
-        return False
-    return True
+    return name not in _lexer.NAMES
 
 
 def build_record(account, r, date, lineno, t):
@@ -168,7 +191,9 @@ def build_record(account, r, date, lineno, t):
                          account, lineno)
 
             _lexer.ACCOUNTS[account] = Account(account, dt.date.min +
-                                               dt.timedelta(days=1))
+                                               dt.timedelta(days=1),
+                                               _lexer.cents)
+            _lexer.NAMES[account] = _lexer.ACCOUNTS[account]
 
     return Record(account, r, date, lineno)
 
@@ -192,8 +217,9 @@ def p_statement_transactions(t):
                           t[1][0], lineno, t)
              for (act, amt, lineno) in t[3]]
 
+    # integer cents sum exactly, floats need a tolerance
     amts = sum([i.record().amount for i in items])
-    if abs(amts) > 1e-10:
+    if abs(amts) > (0 if t.lexer.cents else 1e-10):
         raise NonZeroSumError("Transactions must sum to zero (%e) @line %d" %
                               (amts, t.lexer.lineno))
     t[0] = items
@@ -236,7 +262,8 @@ def make_account(name, opening, lineno):
         raise SyntaxError("Can't open an existing account! %s line:%d"
                           (name, lineno))
 
-    _lexer.ACCOUNTS[name] = Account(name, opening)
+    _lexer.ACCOUNTS[name] = Account(name, opening, _lexer.cents)
+    _lexer.NAMES[name] = _lexer.ACCOUNTS[name]
 
 
 def make_group(name, members, lineno):
@@ -244,17 +271,16 @@ def make_group(name, members, lineno):
     if not is_new_name(name):
         raise SyntaxError("?")
     _lexer.GROUPS[name] = Group(name, [resolve_name(n) for n in members])
+    _lexer.NAMES[name] = _lexer.GROUPS[name]
 
 
 def resolve_name(n):
     """Get the account/group/meta-account with the specified name."""
-    if n in _lexer.ACCOUNTS:
-        return _lexer.ACCOUNTS[n]
-    if n in _lexer.META:
-        return _lexer.META[n]  # at this point, this is actually a group...
-    if n in _lexer.GROUPS:
-        return _lexer.GROUPS[n]
-    raise ValueError("Unknown name! %s" % n)
+    # note that a meta-account is, at this point, actually a group...
+    try:
+        return _lexer.NAMES[n]
+    except KeyError:
+        raise ValueError("Unknown name! %s" % n)
 
 
 def make_meta(name, members, lineno):
@@ -264,6 +290,7 @@ def make_meta(name, members, lineno):
     # initially, this needs to be created as a group
     # until records are all processed
     _lexer.META[name] = Group(name, [_lexer.ACCOUNTS[n] for n in members])
+    _lexer.NAMES[name] = _lexer.META[name]
 
 
 def p_statement_open(t):
@@ -273,8 +300,7 @@ def p_statement_open(t):
         # TODO, could use SyntaxError with better error handling...
         raise ValueError("Bad Account Name? %s line:%d" % (name, t.lineno(3)))
 
-    opening = dt.date(t[1].year, t[1].month, t[1].day)
-    make_account(name, opening, t.lineno(3))
+    make_account(name, t[1], t.lineno(3))
 
     t[0] = []
 
@@ -284,8 +310,7 @@ def p_statement_close(t):
     name = t[3]
     if is_new_name(name):
         raise SyntaxError("Bad Account Name? %s line:%d" % (name, t.lineno(3)))
-    closing = dt.date(t[1].year, t[1].month, t[1].day)
-    _lexer.ACCOUNTS[name].set_closing(closing)
+    _lexer.ACCOUNTS[name].set_closing(t[1])
     t[0] = []
 
 
@@ -358,8 +383,7 @@ def p_transfer(t):
 
 def p_daterange_ds_ds(t):
     'daterange : FROM DATEMDY UNTIL DATEMDY'
-    t[0] = (dt.date(t[2].year, t[2].month, t[2].day),
-            dt.date(t[4].year, t[4].month, t[4].day))
+    t[0] = (t[2], t[4])
 
 
 def p_daterange_quarter(t):
@@ -388,53 +412,115 @@ def p_error(t):  # No doc string for this p_ function  noqa: D103
 
 _parser = yacc.yacc()
 _lexer = lex.lex()
+_lexer.cents = False
+_lexer.DATES = {}
 
 
 def read_bnk_data(record_string, carry_last=False, to_date=None, strict=False,
-                  debug=0):
+                  debug=0, cents=False):
     """Read records.
 
     Arguments:
       record_string - a record_string to read
       strict - warnings trigger exceptions (default)
+      cents - hold amounts as integer cents (exact sums), not floats
 
     Returns:
-     dictionary mapping account names -> account isntances
-
+     dictionary with the following keys:
+      'Account' - mapping of account names -> account isntances
+      'Group'   - mapping of group names -> Group instances
+      'Meta'    - mapping of meta names -> MetaAccount instances
+      'Index'   - MembershipIndex from accounts -> containing groups/metas
     """
     if not isinstance(record_string, str):
         return None
 
+    with trace.span('read_bnk_data'):
+        return _read_bnk_data(record_string, carry_last, to_date, strict,
+                              debug, cents)
+
+
+def parse_records(record_string, strict=False, debug=0, cents=False):
+    """Parse a record string, return a list of its Records.
+
+    Accounts, groups and metas are created as they're declared (the lexer
+    holds them) but records aren't yet added to the accounts; see
+    read_bnk_data.
+    """
     _lexer.strict = strict
+    _lexer.cents = cents
     _lexer.lineno = 0
+    # date text -> date, for this read only
+    _lexer.DATES = {}
     _lexer.ACCOUNTS = {}
     _lexer.GROUPS = {}
     _lexer.META = {}
-    result = _parser.parse(record_string, debug=debug)
-    for rec in result:
-        try:
-            account = _lexer.ACCOUNTS[rec.account()]
-            rec.record().add_to_account(account)
+    # all known names (accounts, groups and metas share one namespace)
+    _lexer.NAMES = {}
+    tracer = trace.tracer()
+    with trace.span('parse', size=sys.getsizeof(record_string)):
+        if tracer is None:
+            result = _parser.parse(record_string, debug=debug)
+        else:
+            tokenfunc, totals = trace.timed_tokens(_lexer.token)
+            start = time.perf_counter_ns()
+            result = _parser.parse(record_string, debug=debug,
+                                   lexer=_lexer, tokenfunc=tokenfunc)
+            tracer.add('lex', start, totals[1], {'tokens': totals[0]})
+    return result
+
+
+def _read_bnk_data(record_string, carry_last, to_date, strict, debug, cents):
+    result = parse_records(record_string, strict, debug, cents)
+    _READS.value += 1
+    _RECORDS.value += len(result)
+    with trace.span('apply records'):
+        for rec in result:
+            try:
+                account = _lexer.ACCOUNTS[rec.account()]
+                rec.record().add_to_account(account)
 
-        except ValueError as e:
-            _log.critical("** Failed to update account ** [%s] %s",
-                          str(rec), str(e))
+            except ValueError as e:
+                _log.critical("** Failed to update account ** [%s] %s",
+                              str(rec), str(e))
 
-            raise e
+                raise e
 
     if carry_last:
         assert isinstance(to_date, dt.date)
-        for a in _lexer.ACCOUNTS:
-            try:
-                _lexer.ACCOUNTS[a].carrylast(to_date)
-            except ValueError:
-                pass
+        _carry_last(_lexer.ACCOUNTS.values(), to_date)
 
     # note we need to actually create the meta accounts
     # what's in _lexer.META at this point is a Group, not a MetaAccount
-    # we don't
-    meta = OrderedDict([(name, MetaAccount(name, _lexer.META[name]))
-                        for name in sorted(_lexer.META)])
+    meta = _meta_accounts(_lexer.META, carry_last)
+
+    groups = OrderedDict([(name, _lexer.GROUPS[name])
+                          for name in sorted(_lexer.GROUPS)])
+
+    with trace.span('index'):
+        index = MembershipIndex(groups.values(), meta.values())
+    return {'Account': OrderedDict([(name, _lexer.ACCOUNTS[name])
+                                   for name in sorted(_lexer.ACCOUNTS)]),
+            'Group': groups,
+            'Meta': meta,
+            'Index': index}
+
+
+@trace.traced('carry last')
+def _carry_last(accounts, to_date):
+    """Carry the last value of each account to to_date (if need be)."""
+    for account in accounts:
+        try:
+            account.carrylast(to_date)
+        except ValueError:
+            pass
+
+
+@trace.traced('meta accounts')
+def _meta_accounts(metagroups, carry_last):
+    """Create MetaAccounts from a mapping of meta names -> Groups."""
+    meta = OrderedDict([(name, MetaAccount(name, metagroups[name]))
+                        for name in sorted(metagroups)])
 
     if carry_last:
         # change the name of meta accounts to update their
@@ -448,9 +534,60 @@ def read_bnk_data(record_string, carry_last=False, to_date=None, strict=False,
                     cl = max(cl, account._cl)
             if cl > 0:
                 meta[m].name = meta[m].name + " [cl%d]" % cl
+    return meta
 
-    return {'Account': OrderedDict([(name, _lexer.ACCOUNTS[name])
-                                   for name in sorted(_lexer.ACCOUNTS)]),
-            'Group': OrderedDict([(name, _lexer.GROUPS[name])
-                                 for name in sorted(_lexer.GROUPS)]),
-            'Meta': meta}
+
+def carry_last(bnkdata, to_date):
+    """Return a copy of bnkdata with last values carried to to_date.
+
+    This is equivalent to read_bnk_data(..., carry_last=True,
+    to_date=to_date) but needs no reparsing, so one parse of a record string
+    can serve reports at several dates.  bnkdata is not modified; it should
+    come from read_bnk_data without carry_last.
+    """
+    metagroups = OrderedDict([(name, m._group)
+                              for name, m in bnkdata['Meta'].items()])
+    # one deepcopy, so accounts shared by groups and metas stay shared
+    with trace.span('copy records'):
+        accounts, groups, metagroups = copy.deepcopy(
+            (bnkdata['Account'], bnkdata['Group'], metagroups))
+
+    _carry_last(accounts.values(), to_date)
+    meta = _meta_accounts(metagroups, True)
+    return {'Account': accounts,
+            'Group': groups,
+            'Meta': meta,
+            'Index': MembershipIndex(groups.values(), meta.values())}
+
+
+def diff_ledgers(old, new):
+    """Return the names of the accounts, metas and groups that differ.
+
+    old and new are results of read_bnk_data (e.g., before and after a
+    records file was edited).  A name is in the result if it was added,
+    removed or changed: accounts and metas are compared by fingerprint,
+    groups by member names and by whether any (nested) member changed.
+    """
+    changed = set()
+    for kind in ('Account', 'Meta'):
+        olds, news = old[kind], new[kind]
+        changed.update(olds.keys() ^ news.keys())
+        for name in olds.keys() & news.keys():
+            if olds[name].fingerprint() != news[name].fingerprint():
+                changed.add(name)
+
+    olds, news = old['Group'], new['Group']
+    changed.update(olds.keys() ^ news.keys())
+    for name in olds.keys() & news.keys():
+        members = [_member_name(m) for m in olds[name]]
+        if members != [_member_name(m) for m in news[name]] or \
+                any(a.name in changed for a in news[name].accounts()):
+            changed.add(name)
+    return changed
+
+
+def _member_name(member):
+    """Return the name of a group member (an account or a group)."""
+    if isinstance(member, Group):
+        return member._name
+    return member.name
@@ -1,12 +1,304 @@
 """Reports for bnk data."""
 
 import logging
+import os
+from itertools import repeat
 from bnk.tables import Cell, CF, Table
 from bnk.groups import Group
+from bnk import metrics
+from bnk import trace
 import subprocess
 
 _log = logging.getLogger(__name__)
 
+_EMPTY_CELLS = metrics.counter('reports.empty_cells')
+_EVALUATIONS = metrics.counter('cube.evaluations')
+_UNANSWERABLE = metrics.counter('cube.unanswerable')
+_FAILURES = metrics.counter('cube.failures')
+
+
+def _flatten(accounts):
+    """Generate the accounts in a list of accounts and/or (nested) Groups."""
+    for act in accounts:
+        if isinstance(act, Group):
+            for nested in _flatten(act):
+                yield nested
+        else:
+            yield act
+
+
+def _chunksize(ntasks):
+    """Choose a chunksize that gives each worker a few chunks of tasks."""
+    return max(1, ntasks // (4 * (os.cpu_count() or 1)))
+
+
+def _evaluate_spans(act, spans):
+    """Evaluate an account over (start, end) spans; run in a worker."""
+    cube = PerformanceCube()
+    return [cube._evaluate(act, start, end) for (start, end) in spans]
+
+
+def _empty_cell():
+    """Return a cell for a value that can't be determined."""
+    _EMPTY_CELLS.value += 1
+    return Cell(None, f=0, s='---')
+
+
+def _balances_at(act, dates):
+    """Return an account's balances on sorted dates; run in a worker."""
+    return act.balances_at(dates)
+
+
+class PerformanceCube(object):
+    """Performance measures of accounts over periods, computed once.
+
+    The cube is indexed by account, period and metric (i.e., the keys
+    produced by Account.get_performance).  Each (account, period) is evaluated
+    at most once, the first time it is needed; reports built from the same
+    cube just slice it.
+
+    Before anything is computed, the account's coverage index is consulted;
+    periods that can't be answered (e.g., no mark at the start) are never
+    evaluated.  Failures while evaluating answerable periods are unexpected,
+    they are logged as warnings.  Either way, the cell is empty (get returns
+    None).
+
+    Evaluation can be fanned out (one task per account) to an executor,
+    e.g., a concurrent.futures.ProcessPoolExecutor; accounts are pickled
+    in a compact form and the results are collected in account order.
+
+    Results are shared, callers should not modify them.
+    """
+
+    def __init__(self, accounts=(), periods=()):
+        """Initialize the cube, evaluating the given accounts and periods.
+
+        Arguments:
+         accounts : a list of accounts and/or Groups to evaluate up front
+         periods : a list of periods to evaluate up front
+        """
+        self._perf = {}
+        self._balances = {}
+        self._dietz = {}
+        self.compute(accounts, periods)
+
+    @trace.traced()
+    def compute(self, accounts, periods, executor=None):
+        """Evaluate each account (or Group member) over each period.
+
+        Arguments:
+         accounts : a list of accounts and/or Groups to evaluate
+         periods : a list of periods to evaluate
+         executor : (optional) an Executor used to evaluate accounts
+                    in parallel
+        """
+        spans = [(period.start, period.end) for period in periods]
+        if executor is None:
+            for act in _flatten(accounts):
+                for (start, end) in spans:
+                    self._evaluate(act, start, end)
+            return
+
+        todo = []
+        for act in _flatten(accounts):
+            missing = [span for span in spans
+                       if (act,) + span not in self._perf]
+            if missing:
+                todo.append((act, missing))
+        if not todo:
+            return
+
+        results = executor.map(_evaluate_spans,
+                               [act for (act, _) in todo],
+                               [missing for (_, missing) in todo],
+                               chunksize=_chunksize(len(todo)))
+        for ((act, missing), perfs) in zip(todo, results):
+            for (span, perf) in zip(missing, perfs):
+                self._perf[(act,) + span] = perf
+
+    @trace.traced()
+    def compute_balances(self, accounts, dates, executor=None):
+        """Determine the balances of each account (or Group member).
+
+        Arguments:
+         accounts : a list of accounts and/or Groups
+         dates : a list of dates on which balances are needed
+         executor : (optional) an Executor used to evaluate accounts
+                    in parallel
+        """
+        key = tuple(dates)
+        todo = [act for act in _flatten(accounts)
+                if (act, key) not in self._balances]
+        if not todo:
+            return
+
+        ordered = sorted(set(dates))
+        if executor is None:
+            results = map(_balances_at, todo, repeat(ordered))
+        else:
+            results = executor.map(_balances_at, todo, repeat(ordered),
+                                   chunksize=_chunksize(len(todo)))
+        for (act, balances) in zip(todo, results):
+            found = dict(zip(ordered, balances))
+            self._balances[(act, key)] = [found[d] for d in dates]
+
+    def rebase(self, old, new, changed):
+        """Return a cube for new records, keeping results that still hold.
+
+        Arguments:
+         old : the records (as from read_bnk_data) this cube was built from
+         new : the records the returned cube is for
+         changed : names of the accounts/metas that differ between old and
+                   new (see parse.diff_ledgers)
+
+        Results of accounts and metas that are in both old and new, and
+        didn't change, are moved over to new's (equivalent) accounts; metas
+        holding a changed account are dropped too.
+        """
+        index = old['Index']
+        stale = [old['Account'][name] for name in changed
+                 if name in old['Account']]
+        dropped = {id(m) for m in index.affected(stale)}
+
+        moved = {}
+        for kind in ('Account', 'Meta'):
+            for name, act in old[kind].items():
+                if name in changed or id(act) in dropped or \
+                        name not in new[kind]:
+                    continue
+                moved[act] = new[kind][name]
+
+        cube = PerformanceCube()
+        cube._perf = {(moved[key[0]],) + key[1:]: perf
+                      for key, perf in self._perf.items() if key[0] in moved}
+        cube._balances = {(moved[key[0]], key[1]): balances
+                          for key, balances in self._balances.items()
+                          if key[0] in moved}
+        cube._dietz = {(moved[key[0]],) + key[1:]: dietz
+                       for key, dietz in self._dietz.items()
+                       if key[0] in moved}
+        return cube
+
+    def export(self):
+        """Return the results, keyed by account name rather than account.
+
+        A worker process's accounts are copies; its results are returned
+        this way and merged into the parent's cube (see merge).
+        """
+        return {attr: {(key[0].name,) + key[1:]: value
+                       for key, value in getattr(self, attr).items()}
+                for attr in ('_perf', '_balances', '_dietz')}
+
+    def merge(self, exported, bnkdata):
+        """Add exported results (see export) for the accounts of bnkdata.
+
+        Results the cube already holds are kept.
+        """
+        named = {act.name: act for acts in (bnkdata['Account'],
+                                            bnkdata['Meta'])
+                 for act in acts.values()}
+        for attr, results in exported.items():
+            cache = getattr(self, attr)
+            for key, value in results.items():
+                act = named.get(key[0])
+                if act is not None:
+                    cache.setdefault((act,) + key[1:], value)
+
+    def _evaluate(self, act, start, end):
+        """Return the performance dict, or why there isn't one.
+
+        The reason is a str if the period isn't answerable, or the Exception
+        raised while computing an answerable period.
+        """
+        key = (act, start, end)
+        try:
+            return self._perf[key]
+        except KeyError:
+            pass
+
+        _EVALUATIONS.value += 1
+        perf = act.coverage(start, end)
+        if perf is None:
+            perf = {}
+            try:
+                act.get_performance(start, end, perf)
+            except Exception as E:
+                _log.warning("Failed to compute performance: %s %s %s -> %s",
+                             act.name, start, end, E)
+                _FAILURES.value += 1
+                perf = E
+        else:
+            _UNANSWERABLE.value += 1
+        self._perf[key] = perf
+        return perf
+
+    def get(self, act, start, end):
+        """Return the performance dict for an account between start and end.
+
+        Returns None if the performance can't be determined.
+        """
+        perf = self._evaluate(act, start, end)
+        if isinstance(perf, dict):
+            return perf
+        _log.debug("Empty cell: %s %s %s -> %s", act.name, start, end, perf)
+        return None
+
+    def performance(self, act, start, end):
+        """Return the performance dict for an account between start and end.
+
+        Unlike get, this raises a ValueError if the period isn't answerable
+        (or the exception raised while computing it).
+        """
+        perf = self._evaluate(act, start, end)
+        if isinstance(perf, Exception):
+            raise perf
+        if not isinstance(perf, dict):
+            raise ValueError(perf)
+        return perf
+
+    def balances(self, act, dates):
+        """Return the account's balances on the given dates.
+
+        Balances are (value, info, carry) tuples as produced by
+        Account.balances_at, listed in the same order as dates.
+        """
+        key = (act, tuple(dates))
+        if key not in self._balances:
+            self.compute_balances([act], dates)
+        return self._balances[key]
+
+    def dietz(self, act, start, end):
+        """Return the Modified Dietz envelope (see Account.get_dietz).
+
+        This is much cheaper than the IRR (in the performance dict), and is
+        computed on its own, in this process.  Returns None if it can't be
+        determined.
+        """
+        key = (act, start, end)
+        try:
+            return self._dietz[key]
+        except KeyError:
+            pass
+
+        dietz = act.coverage(start, end)
+        if dietz is None:
+            try:
+                dietz = act.get_dietz(start, end)
+            except Exception as E:
+                _log.debug("No Modified Dietz return: %s %s %s -> %s",
+                           act.name, start, end, E)
+                dietz = None
+        else:
+            _log.debug("Empty cell: %s %s %s -> %s", act.name, start, end,
+                       dietz)
+            dietz = None
+        self._dietz[key] = dietz
+        return dietz
+
+    def metric(self, act, period, key):
+        """Return one metric, such as 'irr', for an account and period."""
+        return self.performance(act, period.start, period.end)[key]
+
 
 class VersionReport(object):
     """Displays information about the version of the codebase and records.
@@ -17,6 +309,7 @@ class VersionReport(object):
      - (optionally) enforces that bnk has no working modifications
     """
 
+    @trace.traced()
     def __init__(self, cmdline, files=[], strict=False):
         """Initialize the VersionReport.
 
@@ -79,21 +372,33 @@ class PerfOverviewReport(object):
     """Displays the performace of accounts for the given periods.
 
     Accounts are placed in rows, periods are placed in columns. Each
-    cell contains the performance (internal rate of return) of the given
-    account for the given period.
+    cell contains the performance (internal rate of return, or for quick
+    screening, the Modified Dietz return) of the given account for the
+    given period.
 
     Cell metadata:
      'min':True - the lowest performing account for the given period (column)
      'max':True - the highest performing account for the given period
     """
 
-    def __init__(self, accounts, periods, name="Performance Overview Report"):
+    @trace.traced()
+    def __init__(self, accounts, periods, name="Performance Overview Report",
+                 cube=None, executor=None, metric='irr'):
         """Initialize the PerfOverviewReport.
 
         Arguments:
          accounts : a list of accounts and/or Groups to include in the report
          periods : a list of periods on which the IRR should be calculated
+         cube : a PerformanceCube to draw results from (default: a new one)
+         executor : an Executor to evaluate account rows in parallel
+         metric : 'irr' (exact) or 'dietz' (the Modified Dietz approximation)
         """
+        if metric not in ('irr', 'dietz'):
+            raise ValueError("Unknown metric %s" % metric)
+        if cube is None:
+            cube = PerformanceCube()
+        if executor is not None and metric == 'irr':
+            cube.compute(accounts, periods, executor)
 
         table = Table(len(accounts), len(periods) + 1)
         header = ["Account"] + [p.name for p in periods]
@@ -101,14 +406,15 @@ class PerfOverviewReport(object):
         for (i, act) in enumerate(accounts):
             row = [act.name]
             for period in periods:
-                try:
-                    row.append(Cell(act.get_irr(period.start, period.end),
-                                    fmt="{: 6.2f}"))
-
-                except Exception as E:
-                    row.append(Cell(None, f=0, s="---"))
-                    _log.debug("Empty cell: %s %s %s -> %s", name,
-                               act.name, period, E)
+                if metric == 'dietz':
+                    rate = cube.dietz(act, period.start, period.end)
+                else:
+                    perf = cube.get(act, period.start, period.end)
+                    rate = None if perf is None else perf['irr']
+                if rate is None:
+                    row.append(_empty_cell())
+                else:
+                    row.append(Cell(rate, fmt="{: 6.2f}"))
             table.set_row(i, row)
 
         try:
@@ -120,9 +426,9 @@ class PerfOverviewReport(object):
                 for cell in table.column(i + 1):
                     if cell.object():
                         if cell.object()[0] == cmin:
-                            cell.meta['min'] = True
+                            cell.annotate(min=True)
                         if cell.object()[1] == cmax:
-                            cell.meta['max'] = True
+                            cell.annotate(max=True)
         except Exception as E:
             _log.debug("Couldn't find min/max")
 
@@ -148,13 +454,22 @@ class NetWorthReport(object):
      days for which the information is out of date).
     """
 
-    def __init__(self, accounts, dates, name="NetWorth Report"):
+    @trace.traced()
+    def __init__(self, accounts, dates, name="NetWorth Report", cube=None,
+                 executor=None):
         """Initialize the NetWorthReport.
 
         Arguments:
          accounts : a list of accounts and/or Groups to include in the report
          dates : a list of dates on which the total value should be calculated
+         cube : a PerformanceCube to draw results from (default: a new one)
+         executor : an Executor to evaluate account rows in parallel
         """
+        if cube is None:
+            cube = PerformanceCube()
+        if executor is not None:
+            cube.compute_balances(accounts, dates, executor)
+        self._cube = cube
 
         self.table = self._make_nw_table(accounts, dates)
 
@@ -164,7 +479,8 @@ class NetWorthReport(object):
         A subtable is built for each group.
         """
 
-        table = Table(len(accounts), len(dates) + 1)
+        table = Table(len(accounts), len(dates) + 1,
+                      numeric=range(1, len(dates) + 1))
 
         if not depth:
             name = 'Accounts'
@@ -180,23 +496,19 @@ class NetWorthReport(object):
             else:
                 row = [act.name]
                 maxcarry = 0
-                for date in dates:
-                    try:
-                        perf = {}
-                        act.get_performance(date, date, perf)
-                        meta = {}
-                        if perf['carry'] > maxcarry:
-                            c = perf['carry']
-                            meta['carry'] = c
-                            if c > maxcarry:
-                                maxcarry = c
-                        row.append(Cell(perf['start balance'],
-                                        fmt="{: ,.2f}", meta=meta))
-
-                    except Exception as E:
-                        row.append(Cell(None, f=0, s='---'))
+                balances = self._cube.balances(act, dates)
+                for (date, (value, info, carry)) in zip(dates, balances):
+                    if info != 'Marked' and info != 'Carried':
+                        row.append(_empty_cell())
                         _log.debug("Empty cell: %s %s -> %s", act.name,
-                                   date, E)
+                                   date, info)
+                        continue
+
+                    meta = {}
+                    if carry > maxcarry:
+                        meta['carry'] = carry
+                        maxcarry = carry
+                    row.append(Cell(value, fmt="{: ,.2f}", meta=meta))
 
                 if maxcarry:
                     row[0] = act.name + " [c%d]" % (maxcarry)
@@ -210,8 +522,7 @@ class NetWorthReport(object):
         for columni in range(len(dates)):
             # sum across all entries in the table/subtables
             # ignore headers and footers
-            f.append(Cell(sum([c for c in
-                               table.column(columni + 1, False, False, True)]),
+            f.append(Cell(table.column_sum(columni + 1, r=True),
                           fmt='{: ,.2f}'))
 
         table.set_footer(f)
@@ -237,41 +548,47 @@ class BasicStatsReport(object):
 
     """
 
+    @trace.traced()
     def __init__(self, accounts, periods, attribute,
-                 name="Performance Overview Report"):
+                 name="Performance Overview Report", cube=None,
+                 executor=None):
         """Initialize the Basic Stats Report.
 
         Arguments:
           accounts (list) - a list of accounts to report on
           periods (list)  - a list of periods to report on
           attribute       - the attribute to report on
+          cube            - a PerformanceCube to draw results from
+                            (default: a new one)
+          executor        - an Executor to evaluate account rows in parallel
         """
+        if cube is None:
+            cube = PerformanceCube()
+        if executor is not None:
+            cube.compute(accounts, periods, executor)
         known_attrs = ['gain', 'additions', 'subtractions', 'net additions']
         assert attribute in known_attrs
 
-        table = Table(len(accounts), len(periods) + 1)
+        table = Table(len(accounts), len(periods) + 1,
+                      numeric=range(1, len(periods) + 1))
         header = ["Account"] + [p.name for p in periods]
         table.set_header(header)
         for (i, act) in enumerate(accounts):
             row = [act.name]
             maxcarry = 0
             for period in periods:
-                try:
-                    perf = {}
-                    act.get_performance(period.start, period.end, perf)
-                    meta = {}
-                    if perf['carry'] > maxcarry:
-                        c = perf['carry']
-                        meta['carry'] = c
-                        if c > maxcarry:
-                            maxcarry = c
-                    row.append(Cell(perf[attribute],
-                                    fmt="{: ,.2f}", meta=meta))
-
-                except Exception as E:
-                    row.append(Cell(None, f=0, s='---'))
-                    _log.debug("Empty cell: %s %s %s -> %s", name,
-                               act.name, period, E)
+                perf = cube.get(act, period.start, period.end)
+                if perf is None:
+                    row.append(_empty_cell())
+                    continue
+
+                meta = {}
+                if perf['carry'] > maxcarry:
+                    c = perf['carry']
+                    meta['carry'] = c
+                    if c > maxcarry:
+                        maxcarry = c
+                row.append(Cell(perf[attribute], fmt="{: ,.2f}", meta=meta))
 
             if maxcarry:
                 row[0] = act.name + " [c%d]" % (maxcarry)
@@ -279,8 +596,7 @@ class BasicStatsReport(object):
 
         f = ['Total:']
         for columni in range(len(periods)):
-            f.append(Cell(sum([c for c in table.column(columni + 1)]),
-                          fmt='{: ,.2f}'))
+            f.append(Cell(table.column_sum(columni + 1), fmt='{: ,.2f}'))
         table.set_footer(f)
         table.set_column_formats([CF('<', 30)] + [CF('>', 15)] * len(periods))
         self.table = table
@@ -309,14 +625,19 @@ class DetailReport(object):
 
     """
 
-    def __init__(self, account, periods, name=None):
+    @trace.traced()
+    def __init__(self, account, periods, name=None, cube=None):
         """Initialize the Detail Report.
 
         Arguments:
             account - the account to report on
             periods (list) - a list of periods to examine
             name -   the name of the report
+            cube -   a PerformanceCube to draw results from
+                     (default: a new one)
         """
+        if cube is None:
+            cube = PerformanceCube()
         if not name:
             life = "{:%Y-%m-%d} to {:%Y-%m-%d}".format(account._topen,
                                                        account._values[-1].t)
@@ -332,9 +653,11 @@ class DetailReport(object):
         table.set_header(header)
         for i, period in enumerate(periods):
             row = [period.name]
-            perf = {}
-            try:
-                account.get_performance(period.start, period.end, perf)
+            perf = cube.get(account, period.start, period.end)
+            if perf is None:
+                while len(row) < 8:
+                    row.append(_empty_cell())
+            else:
                 row.append(Cell(perf['start date'], fmt="{:%Y-%m-%d}"))
                 row.append(Cell(perf['irr'], fmt="{: .2f}"))
                 row.append(Cell(perf['additions'], fmt="{: ,.2f}"))
@@ -345,11 +668,6 @@ class DetailReport(object):
 
                 if perf['carry'] != 0:
                     row[0] = row[0] + ' [c%d]' % (perf['carry'])
-            except Exception as E:
-                while len(row) < 8:
-                    row.append(Cell(None, f=0, s="---"))
-                _log.debug("Empty row: %s %s %s -> %s", name,
-                           account.name, period, E)
 
             table.set_row(i, row)
 
@@ -2,7 +2,7 @@
 import datetime as dt
 
 from bnk import reporting
-from bnk.views import AsciiView
+from bnk.views import FanoutView
 from bnk import fiscalyear as fy
 
 
@@ -14,26 +14,35 @@ def report(args, bnkdata):
                dt.date(2014, 12, 31)]
 
     group = bnkdata['Group']
-    with AsciiView() as ascii:
+    # all reports share one cube, so each (account, period) is evaluated once
+    cube = getattr(args, 'cube', None) or reporting.PerformanceCube()
+    executor = getattr(args, 'executor', None)
+    # each report is built once and rendered to every requested view
+    with FanoutView.from_specs(getattr(args, 'view', None) or
+                               ['ascii']) as view:
         if 'R_networth' in group:
-            report = reporting.NetWorthReport(group['R_networth'], nwdates)
-            ascii.append(report, title="Net Worth Report")
+            report = reporting.NetWorthReport(group['R_networth'], nwdates,
+                                              cube=cube, executor=executor)
+            view.append(report, title="Net Worth Report")
 
         if 'R_performance' in group:
             report = reporting.PerfOverviewReport(group['R_performance'],
-                                                  periods)
-            ascii.append(report, title="Performance Overview Report")
+                                                  periods, cube=cube,
+                                                  executor=executor)
+            view.append(report, title="Performance Overview Report")
 
         if 'R_basicstats' in group:
             report = reporting.BasicStatsReport(group['R_basicstats'],
-                                                periods, 'net additions')
-            ascii.append(report, title="Net Additions Report")
+                                                periods, 'net additions',
+                                                cube=cube, executor=executor)
+            view.append(report, title="Net Additions Report")
 
             report = reporting.BasicStatsReport(group['R_basicstats'],
-                                                periods, 'gain')
-            ascii.append(report, title="Gain Report")
+                                                periods, 'gain', cube=cube,
+                                                executor=executor)
+            view.append(report, title="Gain Report")
 
         if 'R_detail' in group:
             for account in group['R_detail']:
-                report = reporting.DetailReport(account, periods)
-                ascii.append(report, title=report.name)
+                report = reporting.DetailReport(account, periods, cube=cube)
+                view.append(report, title=report.name)
@@ -0,0 +1,345 @@
+"""A long running bnk process that answers queries over a local socket.
+
+'python -m bnk serve FILE' reads the records file once and then answers
+queries (one JSON object per line) on a Unix socket.  The file is polled for
+changes; when it changes it is reread, and only the cached answers about
+accounts, metas and groups that changed are dropped.
+
+'python -m bnk query OP [key=value ...]' is a thin client, e.g.:
+
+  python -m bnk query balance account=a date=2002-12-31
+  python -m bnk query irr account=a start=2001-12-31 end=2002-12-31
+  python -m bnk query report report=bnk.reports.asciireport view=csv
+
+Requests are objects with an 'op' ('ping', 'balance', 'irr', 'report',
+'reload' or 'shutdown') and the op's parameters.  Responses are objects
+with 'ok' (a bool) and either 'result' or 'error'.
+"""
+
+import argparse
+import contextlib
+import datetime as dt
+import importlib
+import io
+import json
+import logging
+import math
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import time
+
+_log = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(),
+                              'bnk-%d.sock' % os.getuid())
+
+
+def _parse_date(s):
+    """Parse a YYYY-MM-DD (or YYYYMMDD) date, None stays None."""
+    if s is None:
+        return None
+    return dt.datetime.strptime(s.replace('-', ''), '%Y%m%d').date()
+
+
+def _jsonable(obj):
+    """Return obj in a form json can encode (dates/Ranges/nan handled)."""
+    if isinstance(obj, dict):
+        return {str(k): _jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_jsonable(v) for v in obj]
+    if isinstance(obj, float) and math.isnan(obj):
+        return None
+    if isinstance(obj, dt.date):
+        return obj.isoformat()
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    return str(obj)
+
+
+class LedgerService(object):
+    """A loaded records file, answering (and caching) queries about it.
+
+    Answers are cached until the records they depend on change: balance and
+    irr answers depend on one account/meta, report output depends on
+    everything.
+    """
+
+    def __init__(self, path, carry_forward=0):
+        """Load the records file at path.
+
+        Arguments:
+          path - the records file
+          carry_forward - days balances may be carried forward (see
+             --carry-forward)
+        """
+        self.path = path
+        self.carry_forward = carry_forward
+        self.bnkdata = None
+        self.loads = 0
+        self._signature = None
+        self._cache = {}
+        self._cube = None
+        self.refresh()
+
+    def _stat(self):
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def refresh(self):
+        """Reread the records file if it changed, return True if reread."""
+        try:
+            signature = self._stat()
+        except OSError as E:
+            _log.error("Can't stat %s: %s", self.path, E)
+            return False
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        try:
+            self.reload()
+        except Exception as E:
+            # keep answering from the last good read
+            _log.error("Failed to reread %s: %s", self.path, E)
+            if self.bnkdata is None:
+                raise
+            return False
+        return True
+
+    def reload(self):
+        """Reread the records file, dropping cached answers that changed."""
+        from bnk import read_bnk_data
+        from bnk.parse import diff_ledgers
+        from bnk.reporting import PerformanceCube
+
+        with open(self.path, 'r') as fin:
+            bnkdata = read_bnk_data(fin.read())
+        carrydays = dt.timedelta(days=self.carry_forward)
+        for acts in [bnkdata['Account'], bnkdata['Meta']]:
+            for act in acts.values():
+                act.carryvalues = carrydays
+
+        if self.bnkdata is None:
+            self._cache = {}
+        else:
+            changed = diff_ledgers(self.bnkdata, bnkdata)
+            _log.info("Reread %s, changed: %s", self.path,
+                      ", ".join(sorted(changed)) or "nothing")
+            if changed:
+                self._cache = {key: cached
+                               for key, cached in self._cache.items()
+                               if cached[0] is not None and
+                               not cached[0] & changed}
+        self.bnkdata = bnkdata
+        self._cube = PerformanceCube()
+        self.loads += 1
+
+    def _account(self, name):
+        for kind in ('Account', 'Meta'):
+            if name in self.bnkdata[kind]:
+                return self.bnkdata[kind][name]
+        raise KeyError("Unknown account: %s" % name)
+
+    def handle(self, request):
+        """Answer a request (a dict), return the response (a dict)."""
+        try:
+            op = request.get('op')
+            if op == 'ping':
+                return {'ok': True, 'result': 'pong'}
+            if op == 'reload':
+                self._signature = None
+                return {'ok': True, 'result': self.refresh()}
+
+            self.refresh()
+            key = json.dumps(request, sort_keys=True)
+            if key not in self._cache:
+                if op == 'balance':
+                    answer = self._balance(request)
+                    depends = {request['account']}
+                elif op == 'irr':
+                    answer = self._irr(request)
+                    depends = {request['account']}
+                elif op == 'report':
+                    answer = self._report(request)
+                    depends = None
+                else:
+                    raise ValueError("Unknown op: %s" % op)
+                self._cache[key] = (depends, answer)
+            return {'ok': True, 'result': self._cache[key][1]}
+        except Exception as E:
+            return {'ok': False, 'error': "%s: %s" % (type(E).__name__, E)}
+
+    def _balance(self, request):
+        act = self._account(request['account'])
+        found = act.get_value(_parse_date(request['date']))
+        answer = {'value': found[0], 'info': found[1]}
+        if len(found) > 2:
+            # a Carried value: how many days it was carried
+            answer['carry'] = found[2].days
+        return _jsonable(answer)
+
+    def _irr(self, request):
+        act = self._account(request['account'])
+        perf = self._cube.performance(act, _parse_date(request.get('start')),
+                                      _parse_date(request.get('end')))
+        return _jsonable(perf)
+
+    def _report(self, request):
+        from bnk.parse import carry_last
+
+        date = _parse_date(request.get('date'))
+        if date is None:
+            from bnk import fiscalyear as fy
+            date = fy.end_of_completed_quarter(dt.date.today())
+        bnkdata = self.bnkdata
+        if request.get('carry_last'):
+            bnkdata = carry_last(bnkdata, date)
+
+        views = request.get('view', ['ascii'])
+        if isinstance(views, str):
+            views = [views]
+        if any(':' in spec for spec in views):
+            raise ValueError("Report views can't name files")
+        args = argparse.Namespace(file=self.path, date=date,
+                                  report=request['report'],
+                                  carry_last=bool(request.get('carry_last')),
+                                  carry_forward=self.carry_forward,
+                                  view=views, executor=None, jobs=0)
+        report = importlib.import_module(args.report)
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            report.report(args, bnkdata)
+        return stdout.getvalue()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Answer each request line on a connection with a response line."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line.decode('utf-8'))
+                if not isinstance(request, dict):
+                    raise ValueError("Requests must be JSON objects")
+            except ValueError as E:
+                response = {'ok': False, 'error': "Bad request: %s" % E}
+            else:
+                if request.get('op') == 'shutdown':
+                    self.server.stopping = True
+                    response = {'ok': True, 'result': 'stopping'}
+                else:
+                    response = self.server.service.handle(request)
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class BnkServer(socketserver.UnixStreamServer):
+    """A (single threaded) Unix socket server for a LedgerService."""
+
+    def __init__(self, path, service, poll=1.0):
+        """Listen on the Unix socket at path.
+
+        Arguments:
+          path - the socket path (a stale socket file is removed)
+          service - the LedgerService answering requests
+          poll - seconds between checks of the records file
+        """
+        if os.path.exists(path):
+            if ping(path):
+                raise OSError("A server is already listening on %s" % path)
+            os.unlink(path)
+        socketserver.UnixStreamServer.__init__(self, path, _Handler)
+        self.service = service
+        self.timeout = poll
+        self.stopping = False
+
+    def serve(self):
+        """Answer requests until a 'shutdown' request arrives."""
+        try:
+            while not self.stopping:
+                self.handle_request()
+                self.service.refresh()
+        finally:
+            self.server_close()
+            with contextlib.suppress(OSError):
+                os.unlink(self.server_address)
+
+
+def query(request, path=DEFAULT_SOCKET, timeout=30.0):
+    """Send a request (a dict) to the server at path, return the response."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as fin:
+            line = fin.readline()
+    if not line:
+        raise ConnectionError("No response from %s" % path)
+    return json.loads(line.decode('utf-8'))
+
+
+def ping(path=DEFAULT_SOCKET, timeout=1.0):
+    """Return True iff a server answers at path."""
+    try:
+        return query({'op': 'ping'}, path, timeout)['ok']
+    except (OSError, ValueError):
+        return False
+
+
+def main(argv):
+    """Run 'serve' or 'query' (argv[0]) with the remaining arguments."""
+    parser = argparse.ArgumentParser(prog="bnk")
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    serve = commands.add_parser('serve', help="load records, answer queries")
+    serve.add_argument('file', help="records file to load")
+    serve.add_argument('--socket', default=DEFAULT_SOCKET,
+                       help="Unix socket path (default: %(default)s)")
+    serve.add_argument('--carry-forward', type=int, default=0,
+                       help="Carry balances forward N days from previous"
+                       " marks if necessary")
+    serve.add_argument('--poll', type=float, default=1.0,
+                       help="Seconds between checks for changes to file")
+
+    client = commands.add_parser('query', help="query a running server")
+    client.add_argument('op', help="ping, balance, irr, report, reload or"
+                        " shutdown")
+    client.add_argument('params', nargs='*', metavar='KEY=VALUE',
+                        help="request parameters, e.g., account=a")
+    client.add_argument('--socket', default=DEFAULT_SOCKET,
+                        help="Unix socket path (default: %(default)s)")
+
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        start = time.perf_counter()
+        service = LedgerService(args.file, args.carry_forward)
+        _log.info("Loaded %s in %.3fs", args.file,
+                  time.perf_counter() - start)
+        BnkServer(args.socket, service, args.poll).serve()
+        return 0
+
+    request = {'op': args.op}
+    for param in args.params:
+        key, sep, value = param.partition('=')
+        if not sep:
+            parser.error("Expected KEY=VALUE, got '%s'" % param)
+        if key == 'view':
+            request.setdefault('view', []).append(value)
+        elif key == 'carry_last':
+            request[key] = value.lower() in ('1', 'true', 'yes')
+        else:
+            request[key] = value
+    response = query(request, args.socket)
+    if not response['ok']:
+        print(response['error'], file=sys.stderr)
+        return 1
+    if args.op == 'report':
+        sys.stdout.write(response['result'])
+    else:
+        print(json.dumps(response['result'], indent=1))
+    return 0
@@ -1,8 +1,27 @@
 """Tables hold Cells."""
 
+import math
+import types
+from array import array
+
+try:
+    import numpy as np
+except ImportError:     # numpy is optional; reductions fall back to python
+    np = None
+
+# cells without metadata share this (read-only) empty mapping
+_NOMETA = types.MappingProxyType({})
+
 
 class Cell(object):
-    """A table cell. Holds an object, meta data and string/float views."""
+    """A table cell. Holds an object, meta data and string/float views.
+
+    The float and string views are computed when first needed (cells that
+    are never rendered are never formatted).  Metadata is read-only, use
+    annotate() to add to it.
+    """
+
+    __slots__ = ('_obj', '_fval', '_fmt', '_str', 'meta')
 
     def __init__(self, obj, f=None, fmt=None, s=None, meta=None):
         """Initialize a Cell.
@@ -15,23 +34,31 @@ class Cell(object):
          meta - a dictionary of metadata
         """
         self._obj = obj
-        if f is None:
+        self._fval = None if f is None else float(f)
+        self._fmt = fmt
+        self._str = s if s else None
+        self.meta = meta if meta else _NOMETA
+
+    @property
+    def _f(self):
+        """The floating point representation (nan if there isn't one)."""
+        if self._fval is None:
             try:
-                self._f = float(obj)
+                self._fval = float(self._obj)
             except:   # noqa (the scope of possible errors here is large)
-                self._f = float('nan')
-        else:
-            self._f = f
+                self._fval = float('nan')
+        return self._fval
 
-        if s:
-            self._s = s
-        else:
-            self.stringify(fmt)
+    @property
+    def _s(self):
+        """The string representation of the cell."""
+        if self._str is None:
+            self.stringify(self._fmt)
+        return self._str
 
-        if meta is None:
-            self.meta = {}
-        else:
-            self.meta = meta
+    def annotate(self, **meta):
+        """Add the given key/values to the cell's metadata."""
+        self.meta = dict(self.meta, **meta)
 
     def object(self):
         """Return the wrapped object."""
@@ -58,15 +85,15 @@ class Cell(object):
         """
 
         if fmt:
-            self._s = fmt.format(self._obj)
+            self._str = fmt.format(self._obj)
             return
 
         if isinstance(self._obj, str):
-            self._s = self._obj
+            self._str = self._obj
         elif isinstance(self._obj, float):
-            self._s = "%.2f" % self._obj
+            self._str = "%.2f" % self._obj
         else:
-            self._s = str(self._obj)
+            self._str = str(self._obj)
 
     def __format__(self, fmt):
         """Format the string representation: adjust width and alignment."""
@@ -99,11 +126,29 @@ class CF(object):
         return '{:' + self.justify + str(self.width) + "s}"
 
 
+def _cell_value(cell):
+    """Return the float held in a numeric column for the given cell."""
+    if cell is None or cell._obj is None:
+        return math.nan
+    return cell._f
+
+
 class Table(object):
-    """A Table holds Cell instances."""
+    """A Table holds Cell instances.
 
-    def __init__(self, rows, cols, growable=False):
-        """Initialize a table with specified number of rows and columns."""
+    Numeric columns (specified when the Table is created) are also kept in a
+    parallel float64 array, with nan standing in for empty cells (those
+    holding None) and nested tables.  Column sums are reductions over these
+    arrays rather than walks over the cells.
+    """
+
+    def __init__(self, rows, cols, growable=False, numeric=()):
+        """Initialize a table with specified number of rows and columns.
+
+        Arguments:
+         growable - True iff rows can be added (see addrow)
+         numeric - indices of columns whose values are stored as floats
+        """
 
         self._table = []
         for r in range(rows):
@@ -114,6 +159,9 @@ class Table(object):
         self._rows = rows
         self._cols = cols
         self._growable = growable
+        self._numeric = {coli: array('d', [math.nan]) * rows
+                         for coli in numeric}
+        self._nested = set()
 
     def addrow(self):
         """Add a new row to the table, if possible."""
@@ -122,6 +170,8 @@ class Table(object):
 
         self._rows += 1
         self._table.append([None] * self._cols)
+        for values in self._numeric.values():
+            values.append(math.nan)
         return True
 
     def _check_vector(self, value):
@@ -141,9 +191,15 @@ class Table(object):
         if isinstance(value, Table):
             assert value._cols == self._cols
             myrow = value
+            self._nested.add(rowi)
+            for values in self._numeric.values():
+                values[rowi] = math.nan
         else:
             assert len(value) == self._cols
             myrow = self._check_vector(value)
+            self._nested.discard(rowi)
+            for (coli, values) in self._numeric.items():
+                values[rowi] = _cell_value(myrow[coli])
 
         self._table[rowi] = myrow
 
@@ -153,11 +209,15 @@ class Table(object):
         mycol = self._check_vector(value)
         for i, row in enumerate(self._table):
             row[coli] = mycol[i]
+        if coli in self._numeric:
+            self._numeric[coli] = array('d', map(_cell_value, mycol))
 
     def set_cell(self, rowi, colj, value):
         """Set the cell of the table."""
         myv = self._check_vector([value])[0]
         self._table[rowi][colj] = myv
+        if colj in self._numeric:
+            self._numeric[colj][rowi] = _cell_value(myv)
 
     def row(self, rowi):
         """Generate all cells in the specified row."""
@@ -184,6 +244,41 @@ class Table(object):
         if f and self.has_footer():
             yield self._footer[coli]
 
+    def numeric_column(self, coli, r=False):
+        """Return a float64 array of the values in a column.
+
+        Empty cells are nan.  Headers and footers are not included.
+
+        Arugments:
+         r - True to include values from nested tables (in place of the
+             nested table itself)
+        """
+        if coli in self._numeric:
+            values = self._numeric[coli]
+        else:
+            values = array('d', [math.nan if isinstance(row, Table)
+                                 else _cell_value(row[coli])
+                                 for row in self._table])
+        if not (r and self._nested):
+            return array('d', values)
+
+        # splice in the nested tables' values
+        result = array('d')
+        start = 0
+        for rowi in sorted(self._nested):
+            result.extend(values[start:rowi])
+            result.extend(self._table[rowi].numeric_column(coli, r))
+            start = rowi + 1
+        result.extend(values[start:])
+        return result
+
+    def column_sum(self, coli, r=False):
+        """Return the sum of the (non-empty) values in a column."""
+        values = self.numeric_column(coli, r)
+        if np is not None:
+            return float(np.nansum(np.frombuffer(values)))
+        return math.fsum(v for v in values if not math.isnan(v))
+
     def set_header(self, header):
         """Set the table header."""
 
@@ -363,6 +363,97 @@ class AccountTest(unittest.TestCase):
         # and since we're carrying the balance from 12-31-2001 to 6-30-2002
         self.assertEqual(perf['start balance'], perf['end balance'])
 
+    def test_balances_at(self):
+        """Verify balances_at agrees with get_value for many dates."""
+        data = read_bnk_data(recstrings.a3t3b3b)
+        acct_b = data['Account']['b']
+        acct_b.set_closing(dt.date(2003, 1, 31))
+        dates = [dt.date(2001, 12, 1), dt.date(2001, 12, 30),
+                 dt.date(2001, 12, 31), dt.date(2002, 2, 1),
+                 dt.date(2002, 3, 31), dt.date(2002, 4, 1),
+                 dt.date(2002, 9, 30), dt.date(2002, 12, 31),
+                 dt.date(2003, 1, 31), dt.date(2003, 2, 1)]
+
+        for carry in [None, dt.timedelta(days=300)]:
+            acct_b.carryvalues = carry
+            balances = acct_b.balances_at(dates)
+            self.assertEqual(len(balances), len(dates))
+            for date, balance in zip(dates, balances):
+                value = acct_b.get_value(date)
+                # balances aren't carried into a transaction window
+                if date == dt.date(2002, 4, 1) and carry:
+                    self.assertEqual(value[1], "Carried")
+                    self.assertEqual(balance[1], "No Data")
+                    continue
+                if math.isnan(value[0]):
+                    self.assertTrue(math.isnan(balance[0]))
+                else:
+                    self.assertEqual(value[0], balance[0])
+                self.assertEqual(value[1], balance[1])
+                if balance[1] == "Carried":
+                    self.assertEqual(value[2].days, balance[2])
+                else:
+                    self.assertEqual(balance[2], 0)
+
+        self.assertRaises(ValueError, acct_b.balances_at,
+                          [dt.date(2002, 1, 1), dt.date(2001, 1, 1)])
+
+    def test_coverage(self):
+        """Verify the coverage index predicts get_performance failures."""
+        acct_a = read_bnk_data(recstrings.a3t3b3b)['Account']['a']
+        dates = [None, dt.date(2001, 12, 1), dt.date(2001, 12, 30),
+                 dt.date(2001, 12, 31), dt.date(2002, 3, 31),
+                 dt.date(2002, 6, 30), dt.date(2002, 12, 31)]
+
+        for carry in [None, dt.timedelta(days=300)]:
+            acct_a.carryvalues = carry
+            for start in dates:
+                for end in dates:
+                    if start and end and end < start:
+                        continue
+                    reason = acct_a.coverage(start, end)
+                    try:
+                        acct_a.get_performance(start, end, {})
+                        self.assertIsNone(reason)
+                    except (ValueError, AssertionError):
+                        self.assertIsNotNone(reason)
+                    except Exception:
+                        # some cash flows just don't have a solution
+                        # (e.g., 0 -> 100 after a 200 deposit in a day)
+                        # there's no predicting that without solving
+                        self.assertIsNone(reason)
+
+        self.assertTrue(acct_a.coverage(dt.date(2001, 12, 1),
+                                        None).startswith("Not Open"))
+        self.assertTrue(acct_a.coverage(dt.date(2001, 12, 31),
+                                        dt.date(2002, 3, 31)).startswith(
+                                            "Transaction spans end"))
+        acct_a.carryvalues = None
+        self.assertTrue(acct_a.coverage(dt.date(2001, 12, 31),
+                                        dt.date(2002, 3, 31)).startswith(
+                                            "No Data at end"))
+        self.assertTrue(acct_a.coverage(dt.date(2002, 12, 31),
+                                        dt.date(2001, 12, 31)).startswith(
+                                            "End 2001-12-31 precedes"))
+
+        # zero amounts don't put money in an account
+        recs = """12-30-2001 open a
+                  01-01-1900 open Assets
+                  12-31-2001 balances
+                  ---
+                  a 0
+                  from 01-01-2002 until 03-31-2002
+                  ---
+                  Assets -> a 0.00
+                  06-30-2002 balances
+                  ---
+                  a 0
+        """
+        acct_a = read_bnk_data(recs)['Account']['a']
+        start, end = dt.date(2001, 12, 31), dt.date(2002, 6, 30)
+        self.assertTrue(acct_a.coverage(start, end).startswith("No money"))
+        self.assertRaises(AssertionError, acct_a.get_irr, start, end)
+
     def test_range(self):
         """Test the Range class; they're just tuples in disguise."""
         self.assertEqual(account.Range(3, 5), (3, 5))
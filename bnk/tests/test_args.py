@@ -1,8 +1,18 @@
 """Tests for arguments passed in via command-line usage."""
 
 import datetime as dt
+import importlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
 import unittest
+from contextlib import redirect_stderr, redirect_stdout
 from bnk import __main__ as main
+from bnk import fiscalyear as fy
+from bnk.bench import generator
 from bnk.tests import recstrings
 
 
@@ -35,12 +45,158 @@ class ArgsTest(unittest.TestCase):
         args.test = "carrylast-false"
         main.main(args)
 
+    def test_multiple_reports_dates(self):
+        """Verify several reports/dates run against one read of the data."""
+
+        arg_str = ('--carry-last --date 20021231 --date 20021130 '
+                   '--report bnk.tests.test_args --report bnk.tests.test_args '
+                   'DUMMY_FILE')
+        args = main.parse_args(arg_str.split())
+        self.assertEqual(args.date, [dt.date(2002, 12, 31),
+                                     dt.date(2002, 11, 30)])
+        args.data = recstrings.a3t3b3c
+        args.file = None
+        args.test = "record"
+        del _RUNS[:]
+        main.main(args)
+
+        self.assertEqual([r[0] for r in _RUNS],
+                         [dt.date(2002, 12, 31)] * 2 +
+                         [dt.date(2002, 11, 30)] * 2)
+        # both reports at a date share data, each date has its own
+        self.assertIs(_RUNS[0][1], _RUNS[1][1])
+        self.assertIsNot(_RUNS[1][1], _RUNS[2][1])
+        self.assertEqual(_RUNS[0][2], 'ab [cl92]')
+        self.assertEqual(_RUNS[0][3], (490.0, 'Marked'))
+        self.assertEqual(_RUNS[2][2], 'ab [cl61]')
+
+    def test_watch(self):
+        """Verify --watch reruns reports, reusing unchanged results."""
+
+        with tempfile.NamedTemporaryFile('w', suffix='.r',
+                                         delete=False) as fout:
+            fout.write(recstrings.a3t3b3c)
+        self.addCleanup(os.unlink, fout.name)
+
+        arg_str = '--watch --date 20021231 --report bnk.tests.test_args'
+        args = main.parse_args(arg_str.split() + [fout.name])
+        self.assertTrue(args.watch)
+        args.test = "record"
+        reports = [sys.modules[__name__]]
+        accounts = main.read_bnk_data(recstrings.a3t3b3c)
+        dated = main._dated_data(args, accounts, [])
+        cube = main.PerformanceCube()
+        cube.compute(list(accounts['Account'].values()),
+                     fy.standard_periods(args.date))
+        cubes = {args.date: cube}
+
+        def edit():
+            with open(fout.name, 'w') as fedit:
+                fedit.write(recstrings.a3t3b3c.replace("b     280",
+                                                       "b     290"))
+            st = os.stat(fout.name)
+            os.utime(fout.name, ns=(st.st_atime_ns,
+                                    st.st_mtime_ns + 1000000000))
+
+        timer = threading.Timer(0.05, edit)
+        timer.start()
+        del _RUNS[:]
+        stderr = io.StringIO()
+        with redirect_stderr(stderr):
+            main._watch(args, reports, accounts, dated, cubes, poll=0.1,
+                        rounds=1)
+        timer.join()
+
+        self.assertIn("changed (ab, b)", stderr.getvalue())
+        self.assertEqual(len(_RUNS), 1)
+        b = _RUNS[0][1]['Account']['b']
+        self.assertEqual(b.get_value(dt.date(2002, 6, 30)), (290.0, 'Marked'))
+        # a's results were carried over to the new records
+        self.assertIsNot(cubes[args.date], cube)
+        self.assertTrue(any(key[0].name == 'a'
+                            for key in cubes[args.date]._perf))
+
+    def test_jobs_share_cubes(self):
+        """Verify reports run in workers (--jobs) fill each date's cube."""
+
+        arg_str = ('--jobs 2 --date 20041231 --date 20031231 '
+                   '--report bnk.reports.asciireport DUMMY_FILE')
+        args = main.parse_args(arg_str.split())
+        args.file = None
+        accounts = main.read_bnk_data(generator.records(accounts=4, years=5))
+        dated = main._dated_data(args, accounts, [])
+        cubes = {date: main.PerformanceCube() for date in dated}
+        reports = [importlib.import_module(args.report[0])]
+        with redirect_stdout(io.StringIO()):
+            main._run_reports(args, reports, dated, cubes, [])
+
+        a0 = accounts['Account']['A0']
+        for date in args.date:
+            self.assertTrue(cubes[date]._perf)
+            self.assertTrue(cubes[date]._balances)
+            # keyed by this process's accounts, not the workers' copies
+            self.assertTrue(any(key[0] is a0 for key in cubes[date]._perf))
+            self.assertTrue(all(key[0] in accounts['Account'].values() or
+                                key[0] in accounts['Meta'].values()
+                                for key in cubes[date]._perf))
+
+        # --carry-last renames carried accounts and metas (e.g. 'a [cl92]')
+        arg_str = ('--carry-last --jobs 2 --date 20021231 --date 20021130 '
+                   '--report bnk.reports.asciireport DUMMY_FILE')
+        args = main.parse_args(arg_str.split())
+        args.file = None
+        accounts = main.read_bnk_data(recstrings.a3t3b3c + """
+            group R_performance -> (a b)
+            """)
+        dated = main._dated_data(args, accounts, [])
+        cubes = {date: main.PerformanceCube() for date in dated}
+        with redirect_stdout(io.StringIO()):
+            main._run_reports(args, reports, dated, cubes, [])
+        for date, bnkdata in dated.items():
+            a = bnkdata['Account']['a']
+            self.assertNotEqual(a.name, 'a')
+            self.assertTrue(any(key[0] is a for key in cubes[date]._perf))
+
+    def test_file_view_runs(self):
+        """Verify a file view is refused for several runs (dates/reports)."""
+
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'report.csv')
+        arg_str = ('--date 20021231 --date 20021130 '
+                   '--report bnk.reports.asciireport DUMMY_FILE')
+        args = main.parse_args(arg_str.split() + ['--view', 'csv:' + path])
+        args.file = None
+        args.data = recstrings.a3t3b3c + """
+            group R_performance -> (a b)
+            """
+        with redirect_stdout(io.StringIO()):
+            self.assertRaises(ValueError, main.main, args)
+        self.assertFalse(os.path.exists(path))
+
+        # stdout views are fine, as is a file for a single date
+        args.view = ['ascii', 'csv:-']
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            main.main(args)
+        self.assertEqual(stdout.getvalue().splitlines().count(
+            "Performance Overview Report"), 2)
+        args.date = [dt.date(2002, 12, 31)]
+        args.view = ['csv:' + path]
+        main.main(args)
+        with open(path) as fin:
+            self.assertTrue(fin.readline().startswith("title,depth"))
+
+
+_RUNS = []
+
 
 def report(args, accounts):
     """Perform the report-time testing."""
 
     tests = {'carrylast-true': carrylast_true_test,
-             'carrylast-false': carrylast_false_test}
+             'carrylast-false': carrylast_false_test,
+             'record': record_run}
 
     assert args.test in tests, "Don't know what report-time test to apply!"
 
@@ -73,3 +229,11 @@ def carrylast_false_test(args, accounts):
         "Meta account name is unexpected"
     assert v[1] == 'No Data', \
         "Expect NoData unless --carry-last is used."
+
+
+def record_run(args, accounts):
+    """Record the date, data and 'ab' meta-account state of a run."""
+
+    meta = accounts['Meta']['ab']
+    _RUNS.append((args.date, accounts, meta.name,
+                  meta.get_value(dt.date(2002, 12, 31))))
@@ -0,0 +1,108 @@
+"""Tests for bnk.bench package."""
+
+import io
+import shutil
+import tempfile
+import unittest
+from bnk import read_bnk_data
+from bnk.bench import compare, generator, runner
+
+
+class BenchTest(unittest.TestCase):
+    """Test cases for bnk.bench package."""
+
+    def test_generator(self):
+        """Verify generated records are reproducible and readable."""
+
+        stream = io.StringIO()
+        count = generator.generate(stream, accounts=12, years=3, seed=7,
+                                   groups=2, metas=2, report_accounts=4)
+        text = stream.getvalue()
+        self.assertEqual(text, generator.records(accounts=12, years=3,
+                                                 seed=7, groups=2, metas=2,
+                                                 report_accounts=4))
+        self.assertNotEqual(text, generator.records(accounts=12, years=3,
+                                                    seed=8, groups=2,
+                                                    metas=2,
+                                                    report_accounts=4))
+
+        bnkdata = read_bnk_data(text)
+        self.assertEqual(len(bnkdata['Account']), 13)    # and Assets
+        self.assertEqual(sorted(bnkdata['Meta']), ['M0', 'M1'])
+        self.assertIn('R_performance', bnkdata['Group'])
+        self.assertEqual(len(list(bnkdata['Group']['R_networth'])), 4)
+        marks = sum(len(act._values) - 1 + len(act._transactions)
+                    for act in bnkdata['Account'].values())
+        self.assertEqual(marks, count)
+
+    def test_runner(self):
+        """Verify benchmark results hold samples and machine metadata."""
+
+        params = {'accounts': 4, 'years': 2}
+        results = runner.run(params, repeat=2, pattern='^(parse|view.csv)$')
+        self.assertEqual(sorted(results['benchmarks']), ['parse', 'view.csv'])
+        parse = results['benchmarks']['parse']
+        self.assertEqual(len(parse['samples']), 2)
+        self.assertEqual(parse['min'], min(parse['samples']))
+        self.assertEqual(results['meta']['params'],
+                         dict(params, repeat=2))
+        self.assertIn('python', results['meta'])
+
+        names = [name for (name, setup) in runner.BENCHMARKS]
+        for name in ['load', 'meta', 'get_irr', 'report.NetWorthReport',
+                     'view.ascii', 'view.html']:
+            self.assertIn(name, names)
+
+    def test_mann_whitney(self):
+        """Verify the one-sided Mann-Whitney U test."""
+
+        x, y = [1, 2, 3, 4, 5], [6, 7, 8, 9, 10]
+        self.assertEqual(compare.mann_whitney_u(x, y), (25, 1 / 252.0))
+        self.assertEqual(compare.mann_whitney_u(y, x), (0, 1.0))
+        u, p = compare.mann_whitney_u([1, 3, 5], [2, 4, 6])
+        self.assertEqual((u, p), (6, 0.35))
+        self.assertEqual(sum(compare._u_distribution(4, 6)), 210)
+
+        # large samples (and ties) use the normal approximation
+        x = [float(i % 7) for i in range(30)]
+        y = [v + 1 for v in x]
+        u, p = compare.mann_whitney_u(x, y)
+        self.assertLess(p, 0.05)
+        u, p = compare.mann_whitney_u(x, list(x))
+        self.assertEqual(u, 450)
+        self.assertGreater(p, 0.4)
+
+    def test_compare(self):
+        """Verify slowdowns are found and the history is kept in order."""
+
+        def results(samples, timestamp):
+            return {'meta': {'timestamp': timestamp, 'git': 'abc',
+                             'params': {'accounts': 1}},
+                    'benchmarks': {name: {'samples': values}
+                                   for name, values in samples.items()}}
+
+        base = results({'a': [1.0, 1.1, 0.9, 1.0, 1.05],
+                        'b': [1.0, 1.1, 0.9, 1.0, 1.05],
+                        'c': [1.0, 1.1, 0.9, 1.0, 1.05]},
+                       '2020-01-01T00:00:00')
+        new = results({'a': [1.5, 1.6, 1.4, 1.5, 1.55],
+                       'b': [1.0, 1.08, 0.92, 1.01, 1.04],
+                       'c': [0.5, 0.55, 0.45, 0.5, 0.52]},
+                      '2020-01-01T00:00:00')
+        rows = {row['name']: row for row in compare.compare(base, new)}
+        self.assertEqual(rows['a']['verdict'], 'slower')
+        self.assertAlmostEqual(rows['a']['change'], 0.5)
+        self.assertEqual(rows['b']['verdict'], 'same')
+        self.assertEqual(rows['c']['verdict'], 'faster')
+        self.assertIn('slower', compare.format_comparison(rows.values()))
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        first = compare.save(base, directory)
+        second = compare.save(new, directory)
+        self.assertEqual(compare.history(directory), [first, second])
+        self.assertEqual(compare.latest(directory), (second, new))
+        self.assertEqual(compare.latest(directory, {'accounts': 1},
+                                        exclude=(second,)), (first, base))
+        self.assertEqual(compare.latest(directory, {'accounts': 2}),
+                         (None, None))
@@ -106,3 +106,35 @@ class GroupingTest(unittest.TestCase):
         self.assertEqual(actb.get_value(dt.date(2001, 12, 31))[1], "Marked")
         self.assertEqual(actb.get_value(dt.date(2002, 12, 31))[1], "Marked")
         self.assertEqual(actb.get_value(dt.date(2002, 3, 31))[1], "Marked")
+
+    def test_membership_index(self):
+        """Verify group membership and the account -> group reverse index."""
+
+        s = recstrings.a3t3b3b + """
+            group ab -> (a b)
+            group outer -> (ab Assets)
+            meta mb -> (b)
+            """
+        bnkdata = read_bnk_data(s)
+        acts = bnkdata['Account']
+        ab = bnkdata['Group']['ab']
+        outer = bnkdata['Group']['outer']
+        mb = bnkdata['Meta']['mb']
+
+        self.assertIn(acts['a'], ab)
+        self.assertNotIn(acts['Assets'], ab)
+        # equivilant groups are members, even if they're distinct objects
+        self.assertIn(groups.Group('ab', [acts['a'], acts['b']]), outer)
+        self.assertEqual(list(outer.accounts()),
+                         [acts['a'], acts['b'], acts['Assets']])
+
+        index = bnkdata['Index']
+        self.assertEqual(index.groups_of(acts['a']), (ab, outer))
+        self.assertEqual(index.groups_of(acts['Assets']), (outer,))
+        self.assertEqual(index.metas_of(acts['a']), ())
+        self.assertEqual(index.metas_of(acts['b']), (mb,))
+        self.assertTrue(index.is_member(acts['b'], outer))
+        self.assertTrue(index.is_member(acts['b'], mb))
+        self.assertFalse(index.is_member(acts['a'], mb))
+        self.assertEqual(index.affected([acts['Assets'], acts['b']]),
+                         [outer, ab, mb])
@@ -2,9 +2,17 @@
 
 import datetime as dt
 import unittest
+from bnk import metrics
 from bnk import read_bnk_data
+from bnk.account import Range
+from bnk.bench import generator
 from bnk.tests import WriteCSVs
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 class AccountIRRTest(unittest.TestCase):
     """Test cases for bnk.account.Account.get_irr() method."""
@@ -213,6 +221,218 @@ class AccountIRRTest(unittest.TestCase):
         # Using XIRR in LibreOffice (TEST 2)
         self.assertEqual(irounded, (-76.272, -41.99))
 
+    def test_dietz(self):
+        """Test Account.get_dietz() and its use seeding get_irr()."""
+
+        r = """12-30-2000 open a
+               12-30-2000 open b
+
+               12-31-2000 balances
+               ---
+               a 100000
+               b 0
+
+               from 01-01-2002 until 06-30-2002
+               ---
+               b -> a  50000
+
+               12-31-2001 balances
+               ---
+               a 110000
+
+               12-31-2002 balances
+               ---
+               a 175000
+        """
+        a = read_bnk_data(r)['Account']['a']
+
+        # without flows, the Modified Dietz return is the IRR
+        start, mid, end = (dt.date(2000, 12, 31), dt.date(2001, 12, 31),
+                           dt.date(2002, 12, 31))
+        dietz = a.get_dietz(start, mid)
+        self.assertAlmostEqual(dietz[0], 10.0)
+        self.assertAlmostEqual(dietz[0], a.get_irr(start, mid)[0])
+
+        # with flows, it approximates the IRR envelope
+        dietz = a.get_dietz(mid, end)
+        irr = a.get_irr(mid, end)
+        self.assertLess(dietz[0], dietz[1])
+        self.assertAlmostEqual(dietz[0], irr[0], delta=0.5)
+        self.assertAlmostEqual(dietz[1], irr[1], delta=0.5)
+
+        self.assertRaises(ValueError, a.get_dietz, end, end)
+
+        # seeded from the Modified Dietz rates, the solver needs few steps
+        metrics.reset()
+        a.get_irr(start, end)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['irr.unseeded'], 0)
+        self.assertLessEqual(snapshot['irr.iterations']['max'], 30)
+
+    def test_irr_fast_paths(self):
+        """Test Account.get_irr() for flows that need no (or one) solve."""
+
+        r = """12-30-2009 open a
+               12-30-2009 open b
+               12-30-2000 open Assets
+
+               12-31-2009 balances
+               ---
+               a 100000
+               b 0
+
+               from 06-30-2010 until 06-30-2010
+               ---
+               Assets -> b  50000
+
+               12-31-2010 balances
+               ---
+               a 110000
+               b 52000
+
+               from 02-01-2011 until 02-01-2011
+               ---
+               Assets -> a  10000
+
+               12-31-2011 balances
+               ---
+               a 130000
+        """
+        accts = read_bnk_data(r)['Account']
+        a, b = accts['a'], accts['b']
+        dates = [dt.date(2009, 12, 31), dt.date(2010, 12, 31),
+                 dt.date(2011, 12, 31)]
+
+        def counts(*args):
+            metrics.reset()
+            irr = args[0].get_irr(*args[1:])
+            snapshot = metrics.snapshot()
+            return irr, snapshot['irr.fast_paths'], snapshot['irr.solves']
+
+        # zero-length period
+        self.assertEqual(counts(a, dates[1], dates[1]),
+                         (Range(0.0, 0.0), 1, 0))
+
+        # no flows, just the starting balance
+        irr, fast, solves = counts(a, dates[0], dates[1])
+        self.assertAlmostEqual(irr[0], 10.0)
+        self.assertEqual(irr[0], irr[1])
+        self.assertEqual((fast, solves), (1, 0))
+
+        # a single deposit (nothing at the start)
+        irr, fast, solves = counts(b, dates[0], dates[1])
+        self.assertAlmostEqual(irr[0], 100 * (1.04 ** (365 / 184.0) - 1))
+        self.assertEqual((fast, solves), (1, 0))
+
+        # exact timing: long and short timings are identical, solved once
+        irr, fast, solves = counts(a, dates[1], dates[2])
+        self.assertEqual(irr[0], irr[1])
+        self.assertEqual((fast, solves), (0, 1))
+        fv = (110000 * (1 + irr[0] / 100) +
+              10000 * (1 + irr[0] / 100) ** (333 / 365.0))
+        self.assertAlmostEqual(fv, 130000, places=2)
+
+    def test_rolling_irr(self):
+        """Test Account.rolling_irr() against get_irr() for each window."""
+
+        bnkdata = read_bnk_data(generator.records(accounts=4, years=5))
+        for act in bnkdata['Account'].values():
+            if act.name == 'Assets':
+                continue
+            rolling = act.rolling_irr(12, 3)
+            self.assertTrue(rolling)
+            ends = [period.end for (period, irr) in rolling]
+            self.assertEqual(ends[-1], act._values[-1].t)
+            self.assertEqual(ends, sorted(ends))
+            for (period, irr) in rolling:
+                self.assertGreaterEqual(period.start, act._topen)
+                self.assertEqual(period.start.year + 1, period.end.year)
+                if act.coverage(period.start, period.end) is not None:
+                    self.assertIsNone(irr)
+                    continue
+                expected = act.get_irr(period.start, period.end)
+                self.assertAlmostEqual(irr[0], expected[0], places=4)
+                self.assertAlmostEqual(irr[1], expected[1], places=4)
+
+        # windows end at month ends
+        a = bnkdata['Account']['A2']
+        ends = [p.end for (p, irr) in a.rolling_irr(24, 6,
+                                                    dt.date(2004, 2, 29))]
+        self.assertEqual(ends[-2:], [dt.date(2003, 8, 31),
+                                     dt.date(2004, 2, 29)])
+
+    def test_rolling_irr_warm_start(self):
+        """Verify each money timing warm starts from its own last rate."""
+
+        # quarter long deposit windows: long and short money rates differ
+        r = ["12-30-1999 open a\n01-01-1900 open Assets\n"
+             "from 12-31-1999 until 12-31-1999\n---\nAssets -> a 1000\n"
+             "12-31-1999 balances\n---\na 1000\n"]
+        balance = 1000.0
+        for q in range(16):
+            first = dt.date(2000 + q // 4, 3 * (q % 4) + 1, 1)
+            following = dt.date(first.year + (q % 4 == 3),
+                                (first.month + 2) % 12 + 1, 1)
+            last = following - dt.timedelta(days=1)
+            balance = balance * 1.03 + 40000 * 1.015
+            r.append("from {:%m-%d-%Y} until {:%m-%d-%Y}\n---\n"
+                     "Assets -> a 40000\n{:%m-%d-%Y} balances\n---\n"
+                     "a {:.2f}\n".format(first, last, last, balance))
+        a = read_bnk_data("".join(r))['Account']['a']
+
+        metrics.reset()
+        rolling = a.rolling_irr(12, 3)
+        iterations = metrics.snapshot()['irr.iterations']
+        self.assertEqual(metrics.snapshot()['irr.unseeded'], 1)
+        self.assertGreater(rolling[-1][1][1] - rolling[-1][1][0], 0.5)
+        # after the first solve (a bisection), each takes ~3 Newton steps;
+        # started from the other timing's last rate, each would take 4+
+        warm = iterations['count'] - 1
+        self.assertEqual(warm, 2 * len(rolling) - 1)
+        self.assertLess(iterations['sum'] - iterations['max'], 3.5 * warm)
+
+    @unittest.skipIf(numpy is None, "needs numpy")
+    def test_irr_distribution(self):
+        """Test Account.irr_distribution() against the get_irr() envelope."""
+
+        bnkdata = read_bnk_data(generator.records(accounts=4, years=5))
+        a = bnkdata['Account']['A2']
+        start, end = dt.date(2001, 12, 31), dt.date(2004, 12, 31)
+        envelope = a.get_irr(start, end)
+        self.assertLess(envelope[0], envelope[1])
+
+        dist = a.irr_distribution(start, end, samples=2000, seed=1)
+        self.assertEqual(list(dist), [0.05, 0.25, 0.5, 0.75, 0.95])
+        rates = list(dist.values())
+        self.assertEqual(rates, sorted(rates))
+        self.assertLess(rates[0], rates[-1])
+        for rate in rates:
+            self.assertGreaterEqual(rate, envelope[0] - 1e-6)
+            self.assertLessEqual(rate, envelope[1] + 1e-6)
+        self.assertEqual(a.irr_distribution(start, end, samples=2000,
+                                            seed=1), dist)
+
+        # with exact timings, there's nothing uncertain
+        r = """12-30-2009 open a
+               12-30-2000 open Assets
+
+               12-31-2009 balances
+               ---
+               a 100000
+
+               from 02-01-2010 until 02-01-2010
+               ---
+               Assets -> a  10000
+
+               12-31-2010 balances
+               ---
+               a 120000
+        """
+        a = read_bnk_data(r)['Account']['a']
+        start, end = dt.date(2009, 12, 31), dt.date(2010, 12, 31)
+        dist = a.irr_distribution(start, end, quantiles=(0.5,))
+        self.assertEqual(dist[0.5], a.get_irr(start, end)[0])
+
 
 if __name__ == "__main__":
     WriteCSVs = True
@@ -0,0 +1,73 @@
+"""Tests for bnk.memprofile module."""
+
+import json
+import os
+import tempfile
+import tracemalloc
+import unittest
+from bnk import memprofile
+from bnk import read_bnk_data
+from bnk import trace
+from bnk.tests import recstrings
+
+
+class MemProfileTest(unittest.TestCase):
+    """Test cases for bnk.memprofile module."""
+
+    def tearDown(self):
+        """Leave tracing disabled."""
+        trace.disable()
+
+    def test_profile(self):
+        """Verify memory is broken down by stage and by type."""
+
+        profiler = memprofile.MemoryProfiler()
+        with profiler:
+            self.assertTrue(tracemalloc.is_tracing())
+            self.assertIsNotNone(trace.tracer())
+            bnkdata = read_bnk_data(recstrings.a3t3b3c)
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertIsNone(trace.tracer())
+
+        stages = profiler.stages
+        self.assertEqual(list(stages)[:2], ['parse', 'apply records'])
+        self.assertEqual(stages['read_bnk_data'][0], 1)
+        self.assertEqual(stages['MetaAccount.__init__'][0], 1)
+        # a stage's peak includes the peaks of the stages within it
+        self.assertGreaterEqual(stages['read_bnk_data'][1],
+                                stages['parse'][1])
+        self.assertGreater(stages['parse'][2], 0)
+
+        # the census counts all live objects (some from earlier tests)
+        types = profiler.types
+        self.assertEqual(types['record text'][0], 1)
+        self.assertGreaterEqual(types['Record'][0], 12)
+        self.assertEqual(types['Record'][2], 'parse')
+        self.assertGreaterEqual(types['Transaction'][0], 6)
+        # each account has an opening value of 0
+        self.assertGreaterEqual(types['Value'][0],
+                                6 + len(bnkdata['Account']))
+        self.assertGreaterEqual(types['MetaAccount'][0], 1)
+
+        summary = profiler.summary()
+        self.assertIn('apply records', summary)
+        self.assertIn('record text', summary)
+
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self.addCleanup(os.unlink, path)
+        profiler.write(path)
+        with open(path) as fin:
+            self.assertEqual(json.load(fin)['types']['Record']['count'],
+                             types['Record'][0])
+
+    def test_with_tracing(self):
+        """Verify the profiler leaves an enabled tracer enabled."""
+
+        tracer = trace.enable()
+        with memprofile.MemoryProfiler() as profiler:
+            read_bnk_data(recstrings.a3t3b3c)
+        self.assertIs(trace.tracer(), tracer)
+        self.assertEqual(tracer.listeners, [])
+        self.assertIn('parse', [s[0] for s in tracer.stages()])
+        self.assertIn('parse', profiler.stages)
@@ -0,0 +1,70 @@
+"""Tests for bnk.metrics module."""
+
+import datetime as dt
+import io
+import json
+import unittest
+from bnk import metrics
+from bnk import read_bnk_data
+from bnk import reporting
+from bnk.account import Period
+from bnk.tests import recstrings
+
+
+class MetricsTest(unittest.TestCase):
+    """Test cases for bnk.metrics module."""
+
+    def test_instruments(self):
+        """Verify counters, histograms and the registry."""
+
+        c = metrics.counter('test.counter')
+        self.assertIs(metrics.counter('test.counter'), c)
+        c.reset()
+        c.inc()
+        c.value += 2
+        self.assertEqual(metrics.snapshot()['test.counter'], 3)
+        self.assertRaises(TypeError, metrics.histogram, 'test.counter')
+
+        h = metrics.histogram('test.histogram')
+        h.reset()
+        for v in [1, 2, 3, 4, 5, 40]:
+            h.observe(v)
+        snap = h.snapshot()
+        self.assertEqual((snap['count'], snap['sum']), (6, 55))
+        self.assertEqual((snap['min'], snap['max']), (1, 40))
+        self.assertEqual(snap['buckets'], {'<=1': 1, '<=2': 1, '<=4': 2,
+                                           '<=8': 1, '<=64': 1})
+
+        stream = io.StringIO()
+        metrics.dump(stream)
+        self.assertEqual(json.loads(stream.getvalue())['test.histogram'],
+                         snap)
+
+    def test_instrumentation(self):
+        """Verify parsing, IRR solves and reports are counted."""
+
+        before = metrics.snapshot()
+        bnkdata = read_bnk_data(recstrings.a3t3b3c)
+        accts = bnkdata['Account']
+        start = dt.date(2001, 12, 31)
+        periods = [Period(start, dt.date(2002, 6, 30), 'H1'),
+                   Period(start, dt.date(2002, 3, 31), 'Q1')]
+        reporting.PerfOverviewReport([accts['a'], accts['b']], periods)
+        after = metrics.snapshot()
+
+        def delta(name):
+            return after[name] - before[name]
+
+        self.assertEqual(delta('parse.reads'), 1)
+        self.assertGreater(delta('parse.records'), 5)
+        self.assertEqual(delta('meta.accounts'), 1)
+        self.assertGreater(delta('account.get_value'), 0)
+        # a has no Q1 mark: 3 periods are answered, b's Q1 has no flows
+        # (a fast path), the others have distinct long and short timings
+        self.assertEqual(delta('cube.evaluations'), 4)
+        self.assertEqual(delta('cube.unanswerable'), 1)
+        self.assertEqual(delta('reports.empty_cells'), 1)
+        self.assertEqual(delta('irr.fast_paths'), 1)
+        self.assertEqual(delta('irr.solves'), 4)
+        self.assertEqual(after['irr.iterations']['count'] -
+                         before['irr.iterations']['count'], 4)
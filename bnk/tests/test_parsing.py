@@ -2,7 +2,10 @@
 
 import datetime as dt
 import unittest
-from bnk.parse import read_bnk_data, last_error_token
+from bnk.parse import read_bnk_data, last_error_token, diff_ledgers
+from bnk.parse import NonZeroSumError, to_cents
+from bnk import parse
+from bnk.tests import recstrings
 
 
 class ParsingTest(unittest.TestCase):
@@ -59,6 +62,123 @@ class ParsingTest(unittest.TestCase):
         """
         bd = read_bnk_data(minrecs)
 
+    def test_diff_ledgers(self):
+        """Test finding the accounts/metas/groups changed by an edit."""
+
+        recs = recstrings.a3t3b3c + """
+            group g -> (b)
+            group all -> (g Assets)
+            """
+        old = read_bnk_data(recs)
+        self.assertEqual(diff_ledgers(old, read_bnk_data(recs)), set())
+
+        # a new balance for b changes b, the meta and groups holding it
+        edited = recs.replace("b     280", "b     285")
+        self.assertEqual(diff_ledgers(old, read_bnk_data(edited)),
+                         {'b', 'ab', 'g', 'all'})
+
+        # a new account changes nothing else
+        edited = recs.replace("open Assets", "open Assets\n12-30-2001 open c")
+        self.assertEqual(diff_ledgers(old, read_bnk_data(edited)), {'c'})
+
+    def test_cents(self):
+        """Test reading amounts as integer cents."""
+
+        self.assertEqual([to_cents(n) for n in ['12', '12.3', '12.34', '-0.05',
+                                                '-7.', '0']],
+                         [1200, 1230, 1234, -5, -700, 0])
+
+        dollars = read_bnk_data(recstrings.a3t3b3c)
+        cents = read_bnk_data(recstrings.a3t3b3c, cents=True)
+        a = cents['Account']['a']
+        self.assertTrue(a.cents)
+        self.assertTrue(all(isinstance(v.value, int) for v in a._values))
+        self.assertTrue(all(isinstance(t.amount, int)
+                            for t in a._transactions))
+        self.assertEqual(a.get_value(dt.date(2001, 12, 31)), (100.0, 'Marked'))
+        self.assertTrue(cents['Meta']['ab'].cents)
+        self.assertEqual(cents['Meta']['ab']._values,
+                         [(v.t, int(round(100 * v.value)))
+                          for v in dollars['Meta']['ab']._values])
+
+        # reports see the same (dollar) amounts and returns
+        start, end = dt.date(2001, 12, 31), dt.date(2002, 6, 30)
+        for name in ['a', 'b']:
+            expected, perf = {}, {}
+            dollars['Account'][name].get_performance(start, end, expected)
+            cents['Account'][name].get_performance(start, end, perf)
+            for (x, y) in zip(perf.pop('irr'), expected.pop('irr')):
+                self.assertAlmostEqual(x, y, delta=1e-3)
+            self.assertEqual(perf, expected)
+        self.assertEqual(a.balances_at([start, end]),
+                         dollars['Account']['a'].balances_at([start, end]))
+
+        # a meta over a closed account stays in cents
+        recs = """01-01-2000 open a
+                  01-01-2000 open b
+                  01-01-1900 open Assets
+                  meta m -> (a b)
+                  from 01-02-2000 until 01-02-2000
+                  ---
+                  Assets -> a 100
+                  Assets -> b 50
+                  01-31-2000 balances
+                  ---
+                  a 100.10
+                  b 50.25
+                  from 02-01-2000 until 02-01-2000
+                  ---
+                  b -> Assets 50.25
+                  02-01-2000 balances
+                  ---
+                  b 0
+                  02-01-2000 close b
+                  02-29-2000 balances
+                  ---
+                  a 101.50
+        """
+        closed = read_bnk_data(recs, cents=True)
+        b = closed['Account']['b']
+        self.assertEqual(b._get_value(dt.date(2000, 3, 1)), (0, 'Closed'))
+        self.assertIsInstance(b._get_value(dt.date(1999, 1, 1))[0], int)
+        meta = closed['Meta']['m']
+        self.assertEqual(meta._values[1:], [(dt.date(2000, 1, 31), 15035),
+                                            (dt.date(2000, 2, 29), 10150)])
+        self.assertEqual(meta.get_value(dt.date(2000, 2, 29)),
+                         (101.5, 'Marked'))
+
+        # zero-sum checks are exact
+        recs = """01-01-2000 open a
+                  01-01-2000 open b
+                  01-01-2000 open c
+                  from 01-02-2000 until 01-02-2000
+                  ---
+                  a -0.30
+                  b 0.10
+                  c 0.20
+        """
+        read_bnk_data(recs, cents=True)
+        self.assertRaises(NonZeroSumError, read_bnk_data,
+                          recs.replace("c 0.20", "c 0.21"), cents=True)
+
+    def test_interned_dates(self):
+        """Verify each distinct date is one (shared) date object."""
+
+        bnkdata = read_bnk_data(recstrings.a3t3b3b)
+        acct_a = bnkdata['Account']['a']
+        acct_b = bnkdata['Account']['b']
+        self.assertIs(acct_a._topen, acct_b._topen)
+        self.assertIs(acct_a._values[-1].t, acct_b._values[-1].t)
+        self.assertIs(acct_a._transactions[0].tstart,
+                      acct_a._transactions[0].tend)
+        self.assertEqual(acct_a._topen, dt.date(2001, 12, 30))
+
+        # each read has its own table, none are kept between reads
+        again = read_bnk_data(recstrings.a3t3b3b)['Account']['a']
+        self.assertIsNot(again._topen, acct_a._topen)
+        read_bnk_data("01-01-2000 open c")
+        self.assertEqual(list(parse._lexer.DATES), ['01-01-2000'])
+
     def test_invalid_parsing(self):
         """Test parsing error detection."""
 
@@ -0,0 +1,121 @@
+"""Tests for bnk.reporting module."""
+
+import datetime as dt
+import pickle
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from bnk import read_bnk_data
+from bnk import reporting
+from bnk.parse import diff_ledgers
+from bnk.account import Period
+from bnk.tests import recstrings
+
+
+class ReportingTest(unittest.TestCase):
+    """Test cases for bnk.reporting module."""
+
+    def test_performance_cube(self):
+        """Verify reports sharing a cube evaluate each cell once."""
+
+        accts = read_bnk_data(recstrings.a3t3b3b)['Account']
+        acts = [accts['a'], accts['b']]
+        start = dt.date(2001, 12, 31)
+        periods = [Period(start, dt.date(2002, 12, 31), '2002'),
+                   Period(start, dt.date(2002, 3, 31), 'Q1'),
+                   Period(None, None, 'Lifetime')]
+
+        cube = reporting.PerformanceCube(acts, periods)
+        evaluated = len(cube._perf)
+        self.assertEqual(evaluated, len(acts) * len(periods))
+
+        irr = reporting.PerfOverviewReport(acts, periods, cube=cube)
+        gain = reporting.BasicStatsReport(acts, periods, 'gain', cube=cube)
+        self.assertEqual(len(cube._perf), evaluated)
+
+        # cube results are the same as those computed directly
+        perf = {}
+        accts['a'].get_performance(start, dt.date(2002, 12, 31), perf)
+        self.assertEqual(cube.metric(accts['a'], periods[0], 'irr'),
+                         perf['irr'])
+        self.assertEqual(float(next(gain.table.column(1))), perf['gain'])
+        self.assertEqual(next(irr.table.column(1)).object(), perf['irr'])
+
+        # failures are remembered and re-raised (a has no Q1 mark)
+        self.assertRaises(ValueError, cube.metric, accts['a'], periods[1],
+                          'irr')
+        self.assertEqual(next(irr.table.column(2))._s, '---')
+
+        # the Modified Dietz approximation is cached alongside
+        dietz = reporting.PerfOverviewReport(acts, periods, cube=cube,
+                                             metric='dietz')
+        cell = next(dietz.table.column(1)).object()
+        self.assertEqual(cell, accts['a'].get_dietz(start,
+                                                    dt.date(2002, 12, 31)))
+        self.assertEqual(next(dietz.table.column(2))._s, '---')
+        self.assertEqual(len(cube._dietz), len(acts) * len(periods))
+        self.assertEqual(len(cube._perf), evaluated)
+        self.assertRaises(ValueError, reporting.PerfOverviewReport, acts,
+                          periods, metric='twr')
+
+    def test_cube_rebase(self):
+        """Verify a rebased cube keeps only results for unchanged records."""
+
+        s = recstrings.a3t3b3b + "\nmeta ab -> (a b)\n"
+        old = read_bnk_data(s)
+        new = read_bnk_data(s.replace("b      200", "b      210"))
+        changed = diff_ledgers(old, new)
+        self.assertEqual(changed, {'b', 'ab'})
+
+        periods = [Period(dt.date(2001, 12, 31), dt.date(2002, 12, 31), '')]
+        acts = list(old['Account'].values()) + [old['Meta']['ab']]
+        cube = reporting.PerformanceCube(acts, periods)
+        cube.compute_balances(acts, [dt.date(2002, 6, 30)])
+
+        rebased = cube.rebase(old, new, changed)
+        span = (periods[0].start, periods[0].end)
+        self.assertEqual(len(rebased._perf), 2)
+        self.assertIs(rebased._perf[(new['Account']['a'],) + span],
+                      cube._perf[(old['Account']['a'],) + span])
+        self.assertEqual(len(rebased._balances), 2)
+        self.assertNotIn((new['Account']['b'],) + span, rebased._perf)
+
+    def test_parallel_cube(self):
+        """Verify evaluating accounts in worker processes."""
+
+        s = recstrings.a3t3b3b + "\nmeta ab -> (a b)\ngroup g -> (a b)\n"
+        bnkdata = read_bnk_data(s)
+        accts = bnkdata['Account']
+        meta = bnkdata['Meta']['ab']
+
+        # accounts survive the trip to a worker
+        copy = pickle.loads(pickle.dumps(meta))
+        self.assertEqual(copy._values, meta._values)
+        self.assertEqual(copy._transactions, meta._transactions)
+        self.assertIn(copy._group[0], copy._group)
+
+        acts = [accts['a'], accts['b'], meta]
+        start = dt.date(2001, 12, 31)
+        periods = [Period(start, dt.date(2002, 12, 31), '2002'),
+                   Period(start, dt.date(2002, 3, 31), 'Q1'),
+                   Period(None, None, 'Lifetime')]
+        dates = [dt.date(2002, 12, 31), dt.date(2002, 3, 31)]
+
+        serial = reporting.PerformanceCube(acts, periods)
+        cube = reporting.PerformanceCube()
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            report = reporting.PerfOverviewReport(acts, periods, cube=cube,
+                                                  executor=executor)
+            nwreport = reporting.NetWorthReport([bnkdata['Group']['g']],
+                                                dates, cube=cube,
+                                                executor=executor)
+        for act in acts:
+            for period in periods:
+                self.assertEqual(cube.get(act, period.start, period.end),
+                                 serial.get(act, period.start, period.end))
+            self.assertEqual([b[1] for b in cube.balances(act, dates)],
+                             [act.get_value(d)[1] for d in dates])
+        self.assertEqual(next(report.table.column(1)).object(),
+                         serial.metric(accts['a'], periods[0], 'irr'))
+        self.assertEqual([float(c) for c in nwreport.table.column(1,
+                                                                  r=True)],
+                         [200.0, 300.0])
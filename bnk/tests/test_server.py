@@ -0,0 +1,102 @@
+"""Tests for bnk.server module."""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from bnk import server
+from bnk.tests import recstrings
+
+
+class ServerTest(unittest.TestCase):
+    """Test cases for bnk.server module."""
+
+    def setUp(self):
+        """Write the records to a temporary file."""
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'records.r')
+        self._write(recstrings.a3t3b3c)
+
+    def tearDown(self):
+        """Remove the temporary files."""
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, records):
+        with open(self.path, 'w') as fout:
+            fout.write(records)
+        # make sure the change is visible even on coarse clocks
+        st = os.stat(self.path)
+        os.utime(self.path, ns=(st.st_atime_ns,
+                                st.st_mtime_ns + 1000000000))
+
+    def test_ledger_service(self):
+        """Verify answers are cached until their records change."""
+
+        service = server.LedgerService(self.path)
+        balance_a = {'op': 'balance', 'account': 'a', 'date': '2002-06-30'}
+        balance_b = {'op': 'balance', 'account': 'b', 'date': '20020630'}
+        irr_ab = {'op': 'irr', 'account': 'ab', 'start': '2001-12-31',
+                  'end': '2002-06-30'}
+
+        self.assertEqual(service.handle(balance_a),
+                         {'ok': True, 'result': {'value': 180.0,
+                                                 'info': 'Marked'}})
+        self.assertEqual(service.handle(balance_b)['result']['value'], 280.0)
+        irr = service.handle(irr_ab)['result']
+        self.assertEqual(irr['start date'], '2001-12-31')
+        self.assertEqual(len(service._cache), 3)
+
+        # unchanged file: nothing is reread
+        service.handle(balance_a)
+        self.assertEqual(service.loads, 1)
+
+        # edit b: answers about b (and the meta ab) are dropped, a's stay
+        self._write(recstrings.a3t3b3c.replace("b     280", "b     290"))
+        self.assertEqual(service.handle(balance_b)['result']['value'], 290.0)
+        self.assertEqual(service.loads, 2)
+        self.assertEqual(len(service._cache), 2)
+        self.assertNotEqual(service.handle(irr_ab)['result'], irr)
+
+        # errors are reported, not raised
+        response = service.handle({'op': 'balance', 'account': 'zz',
+                                   'date': '2002-06-30'})
+        self.assertFalse(response['ok'])
+        self.assertIn('zz', response['error'])
+
+        # a broken edit keeps the last good read
+        self._write("this isn't a record")
+        self.assertEqual(service.handle(balance_b)['result']['value'], 290.0)
+
+    def test_balance_carried_nodata(self):
+        """Verify carried and missing balances are answered as JSON."""
+
+        query = {'op': 'balance', 'account': 'a', 'date': '2002-07-15'}
+        response = server.LedgerService(self.path, 30).handle(query)
+        self.assertEqual(response, {'ok': True, 'result': {
+            'value': 180.0, 'info': 'Carried', 'carry': 15}})
+
+        response = server.LedgerService(self.path).handle(query)
+        self.assertEqual(response, {'ok': True, 'result': {
+            'value': None, 'info': 'No Data'}})
+        json.dumps(response, allow_nan=False)
+
+    def test_socket(self):
+        """Verify queries and shutdown over the Unix socket."""
+
+        sock = os.path.join(self.tmpdir, 'bnk.sock')
+        srv = server.BnkServer(sock, server.LedgerService(self.path),
+                               poll=0.05)
+        thread = threading.Thread(target=srv.serve)
+        thread.start()
+        try:
+            self.assertTrue(server.ping(sock))
+            response = server.query({'op': 'balance', 'account': 'a',
+                                     'date': '2002-06-30'}, sock)
+            self.assertEqual(response['result']['value'], 180.0)
+        finally:
+            server.query({'op': 'shutdown'}, sock)
+            thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertFalse(os.path.exists(sock))
@@ -1,5 +1,6 @@
 """Tests for the bnk.tables module."""
 
+import math
 import unittest
 from bnk import tables
 
@@ -14,3 +15,57 @@ class TableTest(unittest.TestCase):
         self.assertEqual(float(c), 10.0)
         self.assertEqual(c._s, "10.00")
         self.assertEqual(c.object(), 10.0)
+
+    def test_cell_lazy(self):
+        """Verify Cell views are built on demand and meta is shared."""
+        c = tables.Cell(1234.5, fmt="{: ,.2f}")
+        self.assertIsNone(c._str)
+        self.assertEqual(c._s, " 1,234.50")
+        self.assertEqual(c + 1, 1235.5)
+
+        c = tables.Cell(None, f=0, s='---')
+        self.assertEqual(float(c), 0)
+        self.assertTrue(math.isnan(float(tables.Cell('x'))))
+
+        # cells without metadata share one read-only mapping
+        self.assertIs(c.meta, tables.Cell(1.0).meta)
+        with self.assertRaises(TypeError):
+            c.meta['min'] = True
+        c.annotate(min=True)
+        self.assertEqual(c.meta, {'min': True})
+        self.assertEqual(len(tables.Cell(1.0).meta), 0)
+        self.assertRaises(AttributeError, setattr, c, 'other', 1)
+
+    def test_numeric_columns(self):
+        """Verify the float64 column store and its reductions."""
+        nested = tables.Table(2, 2, numeric=[1])
+        nested.set_row(0, ['x', tables.Cell(5.0)])
+        nested.set_row(1, ['y', tables.Cell(None, f=0, s='---')])
+        nested.set_footer(['SubTotal:', tables.Cell(5.0)])
+
+        table = tables.Table(3, 2, numeric=[1])
+        table.set_row(0, ['a', tables.Cell(1.5)])
+        table.set_row(1, nested)
+        table.set_row(2, ['b', tables.Cell(-2.0)])
+
+        values = table.numeric_column(1)
+        self.assertEqual((values[0], values[2]), (1.5, -2.0))
+        self.assertTrue(math.isnan(values[1]))
+        values = table.numeric_column(1, r=True)
+        self.assertEqual(len(values), 4)
+        self.assertTrue(math.isnan(values[2]))
+        self.assertEqual(table.column_sum(1), -0.5)
+        self.assertEqual(table.column_sum(1, r=True), 4.5)
+
+        # the store agrees with the cells, however they were set
+        table.set_cell(2, 1, tables.Cell(3.0))
+        self.assertEqual(table.column_sum(1, r=True),
+                         sum(c for c in table.column(1, r=True)))
+        # columns that aren't numeric are computed from the cells
+        self.assertEqual(table.column_sum(0), 0.0)
+
+        growable = tables.Table(0, 1, growable=True, numeric=[0])
+        growable.addrow()
+        self.assertTrue(math.isnan(growable.numeric_column(0)[0]))
+        growable.set_cell(0, 0, tables.Cell(2.0))
+        self.assertEqual(growable.column_sum(0), 2.0)
@@ -0,0 +1,120 @@
+"""Tests for bnk.timeseries module."""
+
+import datetime as dt
+import os
+import shutil
+import tempfile
+import unittest
+from bnk import read_bnk_data
+from bnk import timeseries
+from bnk.tests import recstrings
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, "needs numpy")
+class TimeseriesTest(unittest.TestCase):
+    """Test cases for bnk.timeseries module."""
+
+    def test_grids(self):
+        """Verify the daily and month end grids."""
+
+        self.assertEqual(timeseries.daily(dt.date(2001, 12, 30),
+                                          dt.date(2002, 1, 2)),
+                         [dt.date(2001, 12, 30), dt.date(2001, 12, 31),
+                          dt.date(2002, 1, 1), dt.date(2002, 1, 2)])
+        self.assertEqual(timeseries.month_ends(dt.date(2001, 11, 30),
+                                               dt.date(2002, 3, 30)),
+                         [dt.date(2001, 11, 30), dt.date(2001, 12, 31),
+                          dt.date(2002, 1, 31), dt.date(2002, 2, 28)])
+
+    def test_balances(self):
+        """Verify filled forward balances and their long/short bounds."""
+
+        dates = [dt.date(2001, 12, 29), dt.date(2001, 12, 31),
+                 dt.date(2002, 1, 15), dt.date(2002, 3, 31),
+                 dt.date(2002, 5, 15), dt.date(2002, 7, 31),
+                 dt.date(2002, 12, 31)]
+        for cents in [False, True]:
+            bnkdata = read_bnk_data(recstrings.a3t3b3b, cents=cents)
+            accounts = [bnkdata['Account']['a'], bnkdata['Account']['b']]
+            series = timeseries.balances(accounts, dates, bounds=True)
+            self.assertEqual(series.names, ['a', 'b'])
+            self.assertEqual(series.values.tolist(),
+                             [[0, 100, 100, 100, 100, 100, 200],
+                              [0, 200, 200, 250, 250, 250, 300]])
+            self.assertEqual(series.long.tolist(),
+                             [[0, 100, 100, 100, 100, 0, 200],
+                              [0, 200, 200, 250, 300, 300, 300]])
+            self.assertEqual(series.short.tolist(),
+                             [[0, 100, 50, 50, 0, 0, 200],
+                              [0, 200, 200, 250, 250, 300, 300]])
+
+        # the values are the marks, filled forward
+        act = bnkdata['Account']['b']
+        grid = timeseries.daily(dt.date(2001, 12, 30), dt.date(2002, 12, 31))
+        series = timeseries.balances([act], grid)
+        self.assertIsNone(series.long)
+        act.carryvalues = dt.timedelta(days=400)
+        self.assertEqual(series.values[0].tolist(),
+                         [act.get_value(d)[0] for d in grid])
+
+    def test_write(self):
+        """Verify series are written as .npy and CSV."""
+
+        bnkdata = read_bnk_data(recstrings.a3t3b3b)
+        accounts = [bnkdata['Account']['a'], bnkdata['Account']['b']]
+        dates = [dt.date(2001, 12, 31), dt.date(2002, 5, 15)]
+        series = timeseries.balances(accounts, dates, bounds=True)
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'series.npy')
+            series.write(path)
+            self.assertEqual(numpy.load(path).shape, (3, 2, 2))
+            path = os.path.join(tmpdir, 'series.csv')
+            series.write(path)
+            with open(path) as fin:
+                lines = fin.read().splitlines()
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertEqual(lines[0], "account,series,2001-12-31,2002-05-15")
+        self.assertEqual(lines[1], "a,balance,100.00,100.00")
+        self.assertEqual(lines[4], "b,long,200.00,300.00")
+        self.assertEqual(len(lines), 7)
+
+    def test_main(self):
+        """Verify the 'series' command (a group's accounts, nested too)."""
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            records = os.path.join(tmpdir, 'records.r')
+            with open(records, 'w') as fout:
+                fout.write(recstrings.a3t3b3c + """
+                    group g -> (b)
+                    group all -> (g a)
+                    group metas -> (ab)
+                    """)
+            path = os.path.join(tmpdir, 'series.csv')
+            self.assertEqual(timeseries.main([records, '--group', 'all',
+                                              '--output', path]), 0)
+            with open(path) as fin:
+                lines = fin.read().splitlines()
+            self.assertEqual([line.split(',')[0] for line in lines],
+                             ['account', 'a', 'b'])
+            self.assertEqual(lines[0].split(',')[2], '2001-12-31')
+
+            # a group holding a meta holds the meta's accounts
+            path = os.path.join(tmpdir, 'series.npy')
+            timeseries.main([records, '--group', 'metas', '--bounds',
+                             '--freq', 'daily', '--output', path])
+            self.assertEqual(numpy.load(path).shape[:2], (3, 2))
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
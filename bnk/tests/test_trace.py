@@ -0,0 +1,62 @@
+"""Tests for bnk.trace module."""
+
+import json
+import os
+import tempfile
+import unittest
+from bnk import read_bnk_data
+from bnk import trace
+from bnk.tests import recstrings
+
+
+class TraceTest(unittest.TestCase):
+    """Test cases for bnk.trace module."""
+
+    def tearDown(self):
+        """Leave tracing disabled."""
+        trace.disable()
+
+    def test_disabled(self):
+        """Verify spans are no-ops while tracing is disabled."""
+
+        self.assertIsNone(trace.tracer())
+        self.assertIs(trace.span('a'), trace.span('b', x=1))
+        with trace.span('a'):
+            pass
+
+        @trace.traced()
+        def double(x):
+            return 2 * x
+        self.assertEqual(double(2), 4)
+        self.assertEqual(double.__name__, 'double')
+
+    def test_stages(self):
+        """Verify stages of reading records are recorded and summarized."""
+
+        tracer = trace.enable()
+        read_bnk_data(recstrings.a3t3b3c)
+        self.assertIs(trace.disable(), tracer)
+
+        stages = {name: (depth, count)
+                  for (name, depth, count, seconds) in tracer.stages()}
+        self.assertEqual(stages['read_bnk_data'], (0, 1))
+        self.assertEqual(stages['parse'], (1, 1))
+        self.assertEqual(stages['lex'][0], 2)
+        self.assertEqual(stages['MetaAccount.__init__'], (2, 1))
+        self.assertIn('apply records', tracer.summary())
+
+        events = [e for e in tracer.events if e[0] == 'lex']
+        self.assertGreater(events[0][5]['tokens'], 50)
+
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self.addCleanup(os.unlink, path)
+        tracer.write_chrome(path)
+        with open(path) as fin:
+            chrome = json.load(fin)
+        names = [e['name'] for e in chrome['traceEvents']]
+        self.assertEqual(names[0], 'read_bnk_data')
+        self.assertTrue(all(e['ph'] == 'X' and e['dur'] >= 0
+                            for e in chrome['traceEvents']))
+        meta = chrome['traceEvents'][names.index('MetaAccount.__init__')]
+        self.assertEqual(meta['args'], {'meta': 'ab'})
@@ -0,0 +1,144 @@
+"""Tests for bnk.views module."""
+
+import csv
+import datetime as dt
+import io
+import json
+import unittest
+from contextlib import redirect_stdout
+from bnk import read_bnk_data
+from bnk import reporting
+from bnk import views
+from bnk.tests import recstrings
+
+
+def _nested_networth():
+    """Return a NetWorthReport with nested group tables."""
+    s = recstrings.a3t3b3b + """
+        group ab -> (a b)
+        group all -> (ab Assets)
+        """
+    bnkdata = read_bnk_data(s)
+    dates = [dt.date(2002, 12, 31), dt.date(2002, 3, 31)]
+    return reporting.NetWorthReport(bnkdata['Group']['all'], dates)
+
+
+class ViewTest(unittest.TestCase):
+    """Test cases for bnk.views module."""
+
+    def test_ascii_view(self):
+        """Verify the streamed ascii view of nested tables."""
+        report = _nested_networth()
+        stream = io.StringIO()
+        with views.AsciiView(stream=stream) as view:
+            view.append(report, title="Net Worth")
+
+        lines = stream.getvalue().rstrip('\n').splitlines()
+        self.assertEqual(lines[0], "Net Worth")
+        # banners span the longest line, even the lines of nested tables
+        width = max(len(line) for line in lines)
+        self.assertEqual(lines[1], '-' * width)
+        self.assertTrue(lines[2].startswith("Accounts"))
+        self.assertEqual(lines[3], '-' * width)
+        self.assertTrue(lines[4].startswith("ab"))
+        self.assertEqual(lines[5], '-' * len(lines[4]))
+        self.assertTrue(lines[6].startswith(" a "))
+        self.assertIn("SubTotal:", stream.getvalue())
+        self.assertTrue(lines[-1].startswith("Total:"))
+        self.assertIn("650.00", lines[-1])
+
+        # rendering to a string is the same as streaming
+        self.assertEqual(views._ascii_view_recursive(report.table,
+                                                     title="Net Worth"),
+                         "\n".join(lines))
+
+    def test_csv_view(self):
+        """Verify the CSV view carries raw values, meta and depths."""
+        report = _nested_networth()
+        stream = io.StringIO()
+        with views.CsvView(stream=stream) as view:
+            view.append(report, title="Net Worth")
+
+        records = list(csv.DictReader(io.StringIO(stream.getvalue())))
+        self.assertEqual(list(records[0].keys()), views.CsvView.fields)
+        self.assertTrue(all(r['title'] == "Net Worth" for r in records))
+        self.assertEqual(records[0]['section'], 'header')
+        self.assertEqual(records[0]['text'], 'Accounts')
+        self.assertEqual(set(r['depth'] for r in records), {'0', '1'})
+        names = [r['text'] for r in records if r['column'] == 'Accounts']
+        self.assertIn('SubTotal:', names)
+        total = [r for r in records if r['section'] == 'footer' and
+                 r['depth'] == '0' and r['column'] != 'Accounts']
+        self.assertEqual(float(total[0]['value']), 650.0)
+        self.assertEqual(total[0]['text'], '650.00')
+
+    def test_jsonlines_view(self):
+        """Verify the JSON Lines view writes one object per row."""
+        report = _nested_networth()
+        stream = io.StringIO()
+        with views.JsonLinesView(stream=stream) as view:
+            view.section("Reports")
+            view.append(report, title="Net Worth")
+
+        objs = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(objs[0], {'section': 'Reports'})
+        self.assertEqual(objs[1]['section'], 'header')
+        self.assertEqual(objs[1]['depth'], 0)
+        nested = [o for o in objs[1:] if o['depth'] == 1]
+        self.assertTrue(nested)
+        self.assertEqual(nested[0]['section'], 'header')
+        self.assertEqual(objs[-1]['section'], 'footer')
+        self.assertEqual(objs[-1]['cells'][0]['text'], 'Total:')
+        self.assertEqual(objs[-1]['cells'][1]['value'], 650.0)
+
+    def test_html_view(self):
+        """Verify the HTML view escapes text and adds data attributes."""
+        report = _nested_networth()
+        stream = io.StringIO()
+        with views.HtmlView(stream=stream) as view:
+            view.append(report, title="Net <Worth>")
+
+        doc = stream.getvalue()
+        self.assertTrue(doc.startswith('<!DOCTYPE html>'))
+        self.assertTrue(doc.endswith('</html>\n'))
+        self.assertIn('<h2>Net &lt;Worth&gt;</h2>', doc)
+        self.assertIn('<tr class="header depth-1">', doc)
+        self.assertIn('data-value="650.0">650.00</td>', doc)
+
+    def test_fanout_view(self):
+        """Verify one report is rendered to several views in block writes."""
+
+        class _CountingIO(io.StringIO):
+            def __init__(self):
+                io.StringIO.__init__(self)
+                self.writes = 0
+
+            def write(self, s):
+                self.writes += 1
+                return io.StringIO.write(self, s)
+
+        report = _nested_networth()
+        expected = io.StringIO()
+        with views.AsciiView(stream=expected) as view:
+            view.append(report, title="Net Worth")
+
+        astream, jstream = _CountingIO(), _CountingIO()
+        with views.FanoutView(views.AsciiView(stream=astream),
+                              views.JsonLinesView(stream=jstream)) as view:
+            view.append(report, title="Net Worth")
+        self.assertEqual(astream.getvalue(), expected.getvalue())
+        self.assertEqual(len(jstream.getvalue().splitlines()), 7)
+        # one block for the report, one for the trailing newline
+        self.assertEqual(astream.writes, 2)
+        self.assertEqual(jstream.writes, 1)
+
+        with self.assertRaises(ValueError):
+            views.FanoutView.from_specs(['ascii', 'bogus'])
+
+        # the default stream is sys.stdout when the view is made
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            with views.FanoutView.from_specs(['ascii', 'csv']) as view:
+                view.append(report, title="Net Worth")
+        self.assertIn(expected.getvalue().rstrip(), stdout.getvalue())
+        self.assertTrue(stdout.getvalue().startswith("title,depth"))
@@ -0,0 +1,240 @@
+"""Balance time series: accounts' balances on a regular grid of dates.
+
+  python -m bnk series FILE [--freq daily|monthly] [--start YYYYMMDD]
+                            [--end YYYYMMDD] [--group NAME] [--bounds]
+                            --output PATH(.npy|.csv)
+
+balances() computes an accounts x dates matrix of balances.  A balance on
+a date is the value of the account's last mark at or before it (filled
+forward), 0 where the account isn't open.  With bounds, two more matrices
+add the flows since that mark, placed as the IRR timings place them:
+'long' money (deposits at the start of their window, withdrawals at its
+end) and 'short' money (deposits at the end, withdrawals at the start).
+Between them lie the balances any timing of the flows would give (growth
+aside); on a mark all three agree.
+
+The marks and flows of all accounts are concatenated, keyed by (account,
+ordinal), so one searchsorted (and one cumsum of the flows) answers every
+cell at once.  This needs numpy.
+"""
+
+import argparse
+import datetime as dt
+import io
+import sys
+
+try:
+    import numpy as np
+except ImportError:     # numpy is optional, but the series need it
+    np = None
+
+from bnk import read_bnk_data
+from bnk import trace
+
+# keys are account * _KEY + ordinal (ordinals of dates are below 2**22)
+_KEY = 1 << 22
+
+
+def daily(start, end):
+    """Return the dates from start to end (inclusive)."""
+    return [dt.date.fromordinal(n)
+            for n in range(start.toordinal(), end.toordinal() + 1)]
+
+
+def month_ends(start, end):
+    """Return the last day of each month ending from start to end."""
+    dates = []
+    year, month = start.year, start.month
+    while True:
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        last = dt.date(year, month, 1) - dt.timedelta(days=1)
+        if last > end:
+            return dates
+        if last >= start:
+            dates.append(last)
+
+
+FREQUENCIES = {'daily': daily, 'monthly': month_ends}
+
+
+class BalanceSeries(object):
+    """Accounts' balances (rows) on dates (columns), in dollars.
+
+    values holds the marks filled forward; long and short hold the bounds
+    (see balances), or are None.
+    """
+
+    def __init__(self, names, dates, values, long=None, short=None):
+        """Initialize a BalanceSeries from (accounts x dates) arrays."""
+        self.names = names
+        self.dates = dates
+        self.values = values
+        self.long = long
+        self.short = short
+
+    def matrices(self):
+        """Return [(series name, matrix)]: values, then any bounds."""
+        series = [('balance', self.values)]
+        if self.long is not None:
+            series.extend([('long', self.long), ('short', self.short)])
+        return series
+
+    def to_array(self):
+        """Return the values, or values, long and short stacked (3 deep)."""
+        matrices = self.matrices()
+        if len(matrices) == 1:
+            return self.values
+        return np.stack([matrix for (name, matrix) in matrices])
+
+    def to_csv(self):
+        """Return the series as CSV text: a row per account and series."""
+        lines = [",".join(["account", "series"] +
+                          [d.isoformat() for d in self.dates])]
+        for (series, matrix) in self.matrices():
+            for name, row in zip(self.names, matrix.tolist()):
+                lines.append(",".join([name, series] +
+                                      ["%.2f" % v if v == v else ""
+                                       for v in row]))
+        lines.append("")
+        return "\n".join(lines)
+
+    def write(self, path):
+        """Write the series to path: .npy (see to_array), otherwise CSV.
+
+        The file is written in a single write.
+        """
+        if path.endswith('.npy'):
+            buf = io.BytesIO()
+            np.save(buf, self.to_array())
+            with open(path, 'wb') as fout:
+                fout.write(buf.getvalue())
+        else:
+            text = self.to_csv()
+            with open(path, 'w') as fout:
+                fout.write(text)
+
+
+def _flows(indexes, scales, timing):
+    """Return the (keys, cumulative amounts) of all accounts' flows.
+
+    Flows are placed by timing ('long' or 'short'), keys are sorted and
+    cumulative[i] is the sum of the amounts of the first i flows.
+    """
+    owners, ordinals, amounts = [], [], []
+    for n, (index, scale) in enumerate(zip(indexes, scales)):
+        amount = np.asarray(index.amounts, dtype=float) / scale
+        tstarts = np.asarray(index.tstarts, dtype=np.int64)
+        tends = np.asarray(index.tends, dtype=np.int64)
+        early = amount > 0 if timing == 'long' else amount < 0
+        owners.append(np.full(len(amount), n, dtype=np.int64))
+        ordinals.append(np.where(early, tstarts, tends))
+        amounts.append(amount)
+    keys = np.concatenate(owners) * _KEY + np.concatenate(ordinals)
+    order = np.argsort(keys, kind='stable')
+    cumulative = np.zeros(len(keys) + 1)
+    np.cumsum(np.concatenate(amounts)[order], out=cumulative[1:])
+    return (keys[order], cumulative)
+
+
+def balances(accounts, dates, bounds=False):
+    """Return the accounts' balances on dates (sorted), a BalanceSeries.
+
+    Arguments:
+      accounts - Accounts (or MetaAccounts), the rows
+      dates - the dates, the columns
+      bounds - if True, also compute the long and short money bounds
+    """
+    if np is None:
+        raise ImportError("balances needs numpy")
+    with trace.span('timeseries.balances', accounts=len(accounts),
+                    dates=len(dates)):
+        return _balances(accounts, dates, bounds)
+
+
+def _balances(accounts, dates, bounds):
+    indexes = [act._coverage_index() for act in accounts]
+    scales = [100.0 if act.cents else 1.0 for act in accounts]
+    owners = np.arange(len(accounts), dtype=np.int64)
+    grid = np.array([d.toordinal() for d in dates], dtype=np.int64)
+
+    # all marks, keyed by (account, ordinal); every account has a mark
+    # when it opens, so the last mark before an open date is its own
+    counts = [len(index.marks) for index in indexes]
+    marks = np.concatenate([np.asarray(index.marks, dtype=np.int64)
+                            for index in indexes])
+    keys = np.repeat(owners, counts) * _KEY + marks
+    marked = np.concatenate([np.asarray(index.values, dtype=float) / scale
+                             for (index, scale) in zip(indexes, scales)])
+
+    cells = owners[:, None] * _KEY + grid[None, :]
+    last = np.searchsorted(keys, cells, side='right') - 1
+    topen = np.array([act._topen.toordinal() for act in accounts])
+    tclose = np.array([act._tclose.toordinal() if act._tclose
+                       else dt.date.max.toordinal() for act in accounts])
+    isopen = ((grid[None, :] >= topen[:, None]) &
+              (grid[None, :] <= tclose[:, None]))
+    values = np.where(isopen, marked[last], 0.0)
+
+    series = [values]
+    if bounds:
+        since = keys[last]     # (account, ordinal) of the last mark
+        for timing in ('long', 'short'):
+            flowkeys, cumulative = _flows(indexes, scales, timing)
+            flows = (cumulative[np.searchsorted(flowkeys, cells, 'right')] -
+                     cumulative[np.searchsorted(flowkeys, since, 'right')])
+            series.append(np.where(isopen, values + flows, 0.0))
+    return BalanceSeries([act.name for act in accounts], list(dates),
+                         *series)
+
+
+def _parse_date(s):
+    """Parse a YYYYMMDD date string."""
+    return dt.date(int(s[:4]), int(s[4:6]), int(s[6:8]))
+
+
+def main(argv):
+    """Run the 'series' command (argv excludes 'series')."""
+    parser = argparse.ArgumentParser(prog="bnk series",
+                                     description="write accounts' balances"
+                                     " on a grid of dates")
+    parser.add_argument('file', help="records file to load")
+    parser.add_argument('--output', required=True, metavar='PATH',
+                        help="file to write: .npy (a matrix) or CSV")
+    parser.add_argument('--freq', choices=sorted(FREQUENCIES),
+                        default='monthly',
+                        help="grid of dates (default: %(default)s)")
+    parser.add_argument('--start', type=_parse_date, metavar='YYYYMMDD',
+                        help="first date (default: the first mark after an"
+                        " account opened)")
+    parser.add_argument('--end', type=_parse_date, metavar='YYYYMMDD',
+                        help="last date (default: the last mark)")
+    parser.add_argument('--group', metavar='NAME',
+                        help="only the accounts of group NAME (default: all"
+                        " accounts)")
+    parser.add_argument('--bounds', action='store_true',
+                        help="add long and short money bounds (rows in"
+                        " CSV, a leading axis of 3 in .npy)")
+    parser.add_argument('--cents', action='store_true',
+                        help="Hold amounts as integer cents")
+    args = parser.parse_args(argv)
+
+    with open(args.file, 'r') as fin:
+        bnkdata = read_bnk_data(fin.read(), cents=args.cents)
+    if args.group:
+        if args.group not in bnkdata['Group']:
+            parser.error("No group named %s" % args.group)
+        accounts = list(bnkdata['Group'][args.group].accounts())
+    else:
+        accounts = list(bnkdata['Account'].values())
+    accounts.sort(key=lambda act: act.name)
+
+    start = args.start or min([v.t for act in accounts
+                               for v in act._values[1:2]] or
+                              [act._topen for act in accounts])
+    end = args.end or max(act._values[-1].t for act in accounts)
+    dates = FREQUENCIES[args.freq](start, end)
+    series = balances(accounts, dates, args.bounds)
+    series.write(args.output)
+    print("%s: %d accounts x %d dates" % (args.output, len(accounts),
+                                          len(dates)), file=sys.stderr)
+    return 0
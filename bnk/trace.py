@@ -0,0 +1,224 @@
+"""Lightweight tracing, to see where the time goes in a bnk run.
+
+Code marks stages with spans:
+
+    with trace.span('parse'):
+        ...
+
+    @trace.traced()
+    def expensive(...):
+        ...
+
+Tracing is off by default and a span is then a shared no-op object, so
+marking stages costs next to nothing.  trace.enable() installs a Tracer
+that records each span (name, start, duration, thread and arguments); the
+tracer can summarize the spans by stage or write them as Chrome trace-event
+JSON (viewable with chrome://tracing or https://ui.perfetto.dev).  Listeners
+added to the tracer are told as each span begins and ends (see
+bnk.memprofile); their work isn't included in the span's own duration.
+
+Spans opened in worker processes (see --jobs) aren't recorded.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+
+_tracer = None
+
+
+class _NullSpan(object):
+    """The span used while tracing is disabled; does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    """A span being recorded by a Tracer."""
+
+    __slots__ = ('tracer', 'name', 'args', 'start', 'depth')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.depth = self.tracer._push()
+        for listener in self.tracer.listeners:
+            listener.span_enter(self.name, self.depth, self.args)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter_ns()
+        self.tracer._pop()
+        self.tracer._record(self.name, self.start, end - self.start,
+                            self.depth, self.args)
+        for listener in reversed(self.tracer.listeners):
+            listener.span_exit(self.name, self.depth, self.args)
+        return False
+
+
+class Tracer(object):
+    """Records spans; see span() and traced()."""
+
+    def __init__(self, origin=None):
+        """Initialize an empty Tracer.
+
+        Arguments:
+          origin - when tracing began (in perf_counter_ns, default: now)
+        """
+        self.events = []
+        # objects with span_enter/span_exit(name, depth, args) methods
+        self.listeners = []
+        self.origin = time.perf_counter_ns() if origin is None else origin
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _push(self):
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        return depth
+
+    def _pop(self):
+        self._local.depth -= 1
+
+    def _record(self, name, start, duration, depth, args):
+        event = (name, start, duration, depth, threading.get_ident(), args)
+        with self._lock:
+            self.events.append(event)
+
+    def span(self, name, args=None):
+        """Return a context manager recording a span named name."""
+        return _Span(self, name, args)
+
+    def add(self, name, start, duration, args=None):
+        """Record a span measured elsewhere (times in perf_counter_ns)."""
+        depth = getattr(self._local, 'depth', 0)
+        self._record(name, start, duration, depth, args)
+
+    def stages(self):
+        """Return [(name, depth, count, seconds)], by first occurrence.
+
+        Spans with the same name are aggregated; depth is the nesting depth
+        of the first one.
+        """
+        stages = {}
+        for (name, start, duration, depth, tid, args) in \
+                sorted(self.events, key=lambda e: (e[1], e[3])):
+            if name not in stages:
+                stages[name] = [name, depth, 0, 0]
+            stages[name][2] += 1
+            stages[name][3] += duration
+        return [(name, depth, count, ns / 1e9)
+                for (name, depth, count, ns) in stages.values()]
+
+    def summary(self):
+        """Return a (multiline) stage breakdown as a string."""
+        elapsed = (time.perf_counter_ns() - self.origin) / 1e9
+        lines = ["%-48s %8s %10s %6s" % ("stage", "count", "seconds", "%")]
+        for (name, depth, count, seconds) in self.stages():
+            lines.append("%-48s %8d %10.4f %6.1f" % (
+                ('  ' * depth + name)[:48], count, seconds,
+                100.0 * seconds / elapsed if elapsed else 0.0))
+        lines.append("%-48s %8s %10.4f" % ("elapsed (since tracing began)",
+                                           "", elapsed))
+        return "\n".join(lines)
+
+    def chrome_events(self):
+        """Return the spans as a list of Chrome trace-event dicts."""
+        pid = os.getpid()
+        events = []
+        for (name, start, duration, depth, tid, args) in self.events:
+            event = {'name': name, 'cat': 'bnk', 'ph': 'X', 'pid': pid,
+                     'tid': tid, 'ts': (start - self.origin) / 1000.0,
+                     'dur': duration / 1000.0}
+            if args:
+                event['args'] = {k: str(v) for k, v in args.items()}
+            events.append(event)
+        events.sort(key=lambda e: e['ts'])
+        return events
+
+    def write_chrome(self, path):
+        """Write the spans to path as Chrome trace-event JSON."""
+        with open(path, 'w') as fout:
+            json.dump({'traceEvents': self.chrome_events(),
+                       'displayTimeUnit': 'ms'}, fout)
+
+
+def enable(origin=None):
+    """Start recording spans (in a new Tracer), return the Tracer."""
+    global _tracer
+    _tracer = Tracer(origin)
+    return _tracer
+
+
+def disable():
+    """Stop recording spans, return the Tracer that was recording."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def tracer():
+    """Return the recording Tracer, or None if tracing is disabled."""
+    return _tracer
+
+
+def span(name, **args):
+    """Return a context manager marking a stage named name.
+
+    Keyword arguments are recorded with the span (e.g., an account name).
+    """
+    if _tracer is None:
+        return _NULL_SPAN
+    return _tracer.span(name, args)
+
+
+def traced(name=None):
+    """Decorate a function so each call is a span (named for the function).
+
+    Methods are named Class.method, e.g., 'NetWorthReport.__init__'.
+    """
+    def decorate(func):
+        spanname = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with _tracer.span(spanname, None):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def timed_tokens(token):
+    """Wrap a lexer's token function, return (wrapper, totals).
+
+    Lexing is interleaved with parsing, so lexing can't be a single span;
+    instead, totals (a 2 item list: token count, nanoseconds) accumulates
+    the time spent producing tokens.
+    """
+    totals = [0, 0]
+    clock = time.perf_counter_ns
+
+    def tokenfunc():
+        start = clock()
+        tok = token()
+        totals[0] += 1
+        totals[1] += clock() - start
+        return tok
+    return tokenfunc, totals
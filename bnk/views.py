@@ -1,6 +1,13 @@
 """View classes to transform reports/tables into readable form."""
 
+import csv
+import datetime as dt
+import html
+import json
+import math
 import sys
+from bnk import trace
+from bnk.account import Range
 from bnk.tables import Table
 
 
@@ -11,25 +18,31 @@ class NativeView(object):
     location displayed along with the cell repr string.
     """
 
-    def __init__(self, stream=sys.stdout, buffer=False):
+    def __init__(self, stream=None, buffer=False):
         """Initialize a NativeView.
 
         Arguments:
-          stream - the print stream to receive output (default: sys.stdout)
+          stream - the print stream to receive output (default: sys.stdout,
+             as it is when the view is created)
           buffer - True iff output should be buffered until the instance's
              __exit__() method is called (default: False)
         """
+        if stream is None:
+            stream = sys.stdout
         self.buffer = buffer
         self._bcontent = []
         self.stream = stream
         self.between_report = "\n\n"
+        self._out = _BlockWriter(stream)
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
         if not self.buffer:
-            print("\n".join(self._bcontent), file=self.stream)
+            self._out.write("\n".join(self._bcontent))
+            self._out.write("\n")
+            self._out.flush()
             self._bcontent = []
 
     def section(self, name):
@@ -39,8 +52,10 @@ class NativeView(object):
         if self.buffer:
             self._bcontent.append("%s %s %s" % (banner, name, banner))
         else:
-            print("%s %s %s" % (banner, name, banner), file=self.stream)
+            self._out.write("%s %s %s\n" % (banner, name, banner))
+            self._out.flush()
 
+    @trace.traced()
     def append(self, report, **args):
         """Append a report/table to the NativeView.
 
@@ -53,8 +68,39 @@ class NativeView(object):
             self._bcontent.append(content)
             self._bcontent.append(self.between_report)
         else:
-            print(content, file=self.stream)
-            print(self.between_report, file=self.stream)
+            write = self._out.write
+            write(content)
+            write('\n')
+            write(self.between_report)
+            write('\n')
+            self._out.flush()
+
+
+class _BlockWriter(object):
+    """Collect small writes and pass them to a stream in large blocks.
+
+    Views write many short strings (one or two per line); the stream sees
+    one write per block of roughly blocksize characters, and one at each
+    flush().
+    """
+
+    def __init__(self, stream, blocksize=65536):
+        self.stream = stream
+        self.blocksize = blocksize
+        self._parts = []
+        self._size = 0
+
+    def write(self, text):
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.blocksize:
+            self.flush()
+
+    def flush(self):
+        if self._parts:
+            self.stream.write(''.join(self._parts))
+            self._parts = []
+            self._size = 0
 
 
 def _native_view_recursive(table, depth, **args):
@@ -84,8 +130,10 @@ class AsciiView(NativeView):
 
     The table is transformed into strings and tabular format is maintained.
     Style cues from the report are used to produce the displayed text.
+    Lines are written to the stream as they are produced.
     """
 
+    @trace.traced()
     def append(self, report, **args):
         r"""Append a report to the AsciiView.
 
@@ -107,17 +155,31 @@ class AsciiView(NativeView):
           ' ' : normal
           '>' : body first column indent slightly
         """
-        content = _ascii_view_recursive(report.table, depth=0, **args)
+        lines = _ascii_view_lines(report.table, **args)
         if self.buffer:
-            self._bcontent.append(content)
+            self._bcontent.append('\n'.join(lines))
             self._bcontent.append(self.between_report)
         else:
-            print(content, file=self.stream)
-            print(self.between_report)
+            write = self._out.write
+            for line in lines:
+                write(line)
+                write('\n')
+            write(self.between_report)
+            write('\n')
+            self._out.flush()
 
 
 def _ascii_view_recursive(table, depth=0, c_annotes=None, **args):
-    r"""Internal helper method for AsciiView.
+    """Return the AsciiView of a table as a single string."""
+    return '\n'.join(_ascii_view_lines(table, depth, c_annotes, **args))
+
+
+def _ascii_view_lines(table, depth=0, c_annotes=None, **args):
+    r"""Internal helper method for AsciiView, generates lines of text.
+
+    Rendering takes two passes: the first measures the line length (and
+    thus the banner length) of each (nested) table, the second generates
+    lines one at a time.  Nothing but the measurements is held in memory.
 
     Avaiable args:
       bannerchar  (1-char string):
@@ -152,112 +214,444 @@ def _ascii_view_recursive(table, depth=0, c_annotes=None, **args):
     if 'maxstr' not in args:
         args['maxstr'] = '+ '
 
-    banners = []
-
-    known_metadata = {'min', 'max', 'carry'}
-
     # first pass, look to see if we need space at left and right side
     # of the column
     if c_annotes is None:
-        c_annotes = []
-        for col in range(table._cols):
-            lside = False
-            rside = False
-            for cell in table.column(col, True, True, True):
-                if 'min' in cell.meta or 'max' in cell.meta:
-                    lside = True
-                if 'carry' in cell.meta:
-                    rside = True
-                for meta in cell.meta:
-                    assert meta in known_metadata, \
-                        "ascii_view can't handle '%s'" % meta
-
-            c_annotes.append((lside, rside))
-
-    # build header/footer strings
-    fheader = []
-    ffooter = []
-    if table.has_header() and not args['headerstyle'].startswith('0'):
-        # format the cell's string adding space at the end if necessary
-        fheader = [[hfmt.format(hcell._s + (' ' if colannote[1] else ''))
-                    for hcell, hfmt, colannote in
-                    zip(table._header, table.cf(), c_annotes)]]
-    if table.has_footer() and not args['footerstyle'].startswith('0'):
-        ffooter = [[ffmt.format(fcell._s + (' ' if colannote[1] else ''))
-                    for fcell, ffmt, colannote in
-                    zip(table._footer, table.cf(), c_annotes)]]
-
-    # build strings for the body...
-    ftable = []
+        c_annotes = _ascii_column_annotations(table)
+
+    # second pass, measure the lines of each (nested) table
+    linelens = {}
+    _ascii_measure(table, c_annotes, linelens, args)
+
+    if depth == 0 and args['title']:
+        yield args['title']
+    for line in _ascii_table_lines(table, c_annotes, linelens, args):
+        yield line
+
+
+def _ascii_column_annotations(table):
+    """Determine if columns need space for annotations at left/right."""
+    known_metadata = {'min', 'max', 'carry'}
+
+    c_annotes = []
+    for col in range(table._cols):
+        lside = False
+        rside = False
+        for cell in table.column(col, True, True, True):
+            if 'min' in cell.meta or 'max' in cell.meta:
+                lside = True
+            if 'carry' in cell.meta:
+                rside = True
+            for meta in cell.meta:
+                assert meta in known_metadata, \
+                    "ascii_view can't handle '%s'" % meta
+
+        c_annotes.append((lside, rside))
+    return c_annotes
+
+
+def _nested_args(args):
+    """Return the args used to display a table nested one level deeper."""
+    nargs = dict(args)
+    nargs['headerstyle'] = nargs['headerstyle'][1:]
+    nargs['footerstyle'] = nargs['footerstyle'][1:]
+    nargs['bodystyle'] = nargs['bodystyle'][1:]
+    return nargs
+
+
+def _ascii_hf_strings(cells, table, c_annotes):
+    """Return formatted strings for header/footer cells."""
+    # format the cell's string adding space at the end if necessary
+    return [fmt.format(cell._s + (' ' if colannote[1] else ''))
+            for cell, fmt, colannote in zip(cells, table.cf(), c_annotes)]
+
+
+def _ascii_row_strings(row, table, c_annotes, args):
+    """Return the strings for the cells in a row (prior to justification)."""
+    stringrow = []
+    for i, colannote, cell in zip(range(len(row)), c_annotes, row):
+        stringrep = cell._s
+        if colannote[0]:
+            if 'min' in cell.meta:
+                stringrep = args['minstr'] + stringrep
+            if 'max' in cell.meta:
+                stringrep = args['maxstr'] + stringrep
+        if colannote[1]:
+            if 'carry' in cell.meta:
+                stringrep = stringrep + "'"
+            else:
+                stringrep = stringrep + " "
+        if i == 0 and args['bodystyle'] == '>':
+            stringrep = ' ' + stringrep
+        stringrow.append(stringrep)
+    return stringrow
+
+
+def _has_header(table, args):
+    return table.has_header() and not args['headerstyle'].startswith('0')
+
+
+def _has_footer(table, args):
+    return table.has_footer() and not args['footerstyle'].startswith('0')
+
+
+def _ascii_measure(table, c_annotes, linelens, args):
+    """Determine the longest line of a table (and each nested table).
+
+    Lengths are stored in linelens (keyed by id(table)).
+    """
+    widths = [cfmt.width for cfmt in table.cf()]
+    maxlinelen = 0
+    if _has_header(table, args):
+        maxlinelen = sum(len(s) for s in
+                         _ascii_hf_strings(table._header, table, c_annotes))
+    if _has_footer(table, args):
+        maxlinelen = max(maxlinelen, sum(
+            len(s) for s in _ascii_hf_strings(table._footer, table,
+                                              c_annotes)))
+
+    nargs = None
     for row in table._table:
         if isinstance(row, Table):
-            nargs = dict(args)
-            nargs['headerstyle'] = nargs['headerstyle'][1:]
-            nargs['footerstyle'] = nargs['footerstyle'][1:]
-            nargs['bodystyle'] = nargs['bodystyle'][1:]
-
-            ftable.append(_ascii_view_recursive(row, depth + 1,
-                                                c_annotes, **nargs))
-            ftable.append([])   # Empty row after a table
+            if nargs is None:
+                nargs = _nested_args(args)
+            linelen = _ascii_measure(row, c_annotes, linelens, nargs)
+        else:
+            # a justified string is at least the column width
+            linelen = sum(max(width, len(s)) for width, s in
+                          zip(widths, _ascii_row_strings(row, table,
+                                                         c_annotes, args)))
+        maxlinelen = max(maxlinelen, linelen)
+
+    linelens[id(table)] = maxlinelen
+    return maxlinelen
+
+
+def _ascii_table_lines(table, c_annotes, linelens, args):
+    """Generate the lines of a (measured) table, including nested tables."""
+    banner = args['bannerchar'] * linelens[id(table)]
+    headerstyle = args['headerstyle'] if table.has_header() else ''
+    footerstyle = args['footerstyle'] if table.has_footer() else ''
+
+    if headerstyle.startswith('-') or headerstyle.startswith('='):
+        yield banner
+    if _has_header(table, args):
+        yield ''.join(_ascii_hf_strings(table._header, table, c_annotes))
+    if headerstyle.startswith('_') or headerstyle.startswith('='):
+        yield banner
+    elif headerstyle.startswith('\n'):
+        yield ''
+
+    fmts = ['{:' + cfmt.justify + str(cfmt.width) + "s}"
+            for cfmt in table.cf()]
+    nargs = None
+    for row in table._table:
+        if isinstance(row, Table):
+            if nargs is None:
+                nargs = _nested_args(args)
+            for line in _ascii_table_lines(row, c_annotes, linelens, nargs):
+                yield line
+            yield ''    # Empty row after a table
             continue
 
-        stringrow = []
-        for i, colannote, cell, cfmt in zip(range(len(row)),
-                                            c_annotes, row, table.cf()):
-            stringrep = cell._s
-            if colannote[0]:
-                if 'min' in cell.meta:
-                    stringrep = args['minstr'] + stringrep
-                if 'max' in cell.meta:
-                    stringrep = args['maxstr'] + stringrep
-            if colannote[1]:
-                if 'carry' in cell.meta:
-                    stringrep = stringrep + "'"
+        yield ''.join(fmt.format(s) for fmt, s in
+                      zip(fmts, _ascii_row_strings(row, table, c_annotes,
+                                                   args)))
+
+    if footerstyle.startswith('-') or footerstyle.startswith('='):
+        yield banner
+    elif footerstyle.startswith('\n'):
+        yield ''
+    if _has_footer(table, args):
+        yield ''.join(_ascii_hf_strings(table._footer, table, c_annotes))
+    if footerstyle.startswith('_') or footerstyle.startswith('='):
+        yield banner
+
+
+def _flat_rows(table, depth=0):
+    """Generate (depth, section, rowi, cells) for each row of a table.
+
+    Nested tables are flattened in place, their rows have a greater depth.
+    section is one of 'header', 'body' or 'footer'.
+    """
+    if table.has_header():
+        yield (depth, 'header', None, table._header)
+    for rowi, row in enumerate(table._table):
+        if isinstance(row, Table):
+            for nested in _flat_rows(row, depth + 1):
+                yield nested
+        else:
+            yield (depth, 'body', rowi, row)
+    if table.has_footer():
+        yield (depth, 'footer', None, table._footer)
+
+
+def _raw_value(cell):
+    """Return a cell's object in a form suited to machine-readable output.
+
+    Numbers are numbers (nan becomes None), Ranges are [min, max] lists,
+    dates are ISO-8601 strings, and empty cells are None.
+    """
+    obj = cell.object()
+    if obj is None:
+        return None
+    if isinstance(obj, Range):
+        return [_raw_value_of(obj.min), _raw_value_of(obj.max)]
+    return _raw_value_of(obj)
+
+
+def _raw_value_of(obj):
+    if isinstance(obj, float):
+        return None if math.isnan(obj) else obj
+    if isinstance(obj, (int, str)):
+        return obj
+    if isinstance(obj, dt.date):
+        return obj.isoformat()
+    return str(obj)
+
+
+def _column_names(table):
+    """Return the column names for a table (from its header, if any)."""
+    if table.has_header():
+        return [cell._s for cell in table._header]
+    return [str(i) for i in range(table._cols)]
+
+
+class CsvView(NativeView):
+    """A CSV view of reports/tables, one record per table cell.
+
+    Nested tables are flattened: each record gives the depth of its
+    (nested) table.  Records hold the formatted text, the raw value(s) and
+    the cell metadata.  The columns are:
+
+      title   : the report title
+      depth   : 0 for the report's table, 1 for a nested table, etc.
+      section : 'header', 'body' or 'footer'
+      row     : row index (within the (nested) table) of body cells
+      column  : the name of the column (from the report's header)
+      text    : the formatted string (without alignment padding)
+      value   : the raw numeric/date/string value (empty if none)
+      low     : the low end of a Range value
+      high    : the high end of a Range value
+      min     : 1 if the cell is marked as a column minimum
+      max     : 1 if the cell is marked as a column maximum
+      carry   : number of days a balance was carried
+    """
+
+    fields = ['title', 'depth', 'section', 'row', 'column', 'text', 'value',
+              'low', 'high', 'min', 'max', 'carry']
+
+    def __init__(self, stream=None, header=True):
+        """Initialize a CsvView.
+
+        Arguments:
+          stream - the stream to receive output (default: sys.stdout)
+          header - True iff a header record should be written first
+        """
+        NativeView.__init__(self, stream)
+        self._writer = csv.writer(self._out)
+        if header:
+            self._writer.writerow(self.fields)
+            self._out.flush()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def section(self, name):
+        """Sections aren't represented in CSV output."""
+        pass
+
+    @trace.traced()
+    def append(self, report, **args):
+        """Append a report/table to the CsvView.
+
+        Keyword Arguments:
+          title (str) -- the title of the report being added.
+        """
+        title = args.get('title', '')
+        names = _column_names(report.table)
+        writerow = self._writer.writerow
+        for (depth, section, rowi, cells) in _flat_rows(report.table):
+            for name, cell in zip(names, cells):
+                value = _raw_value(cell)
+                low = high = None
+                if isinstance(value, list):
+                    low, high = value
+                    value = None
+                meta = cell.meta
+                writerow([title, depth, section, rowi, name,
+                          cell._s.strip(), value, low, high,
+                          1 if 'min' in meta else None,
+                          1 if 'max' in meta else None, meta.get('carry')])
+        self._out.flush()
+
+
+class JsonLinesView(NativeView):
+    """A JSON Lines view of reports/tables, one JSON object per table row.
+
+    Each object has the keys:
+      title   : the report title
+      depth   : 0 for the report's table, 1 for a nested table, etc.
+      section : 'header', 'body' or 'footer'
+      row     : row index (within the (nested) table) of body rows
+      cells   : a list of {'text': str, 'value': raw value, 'meta': {}}
+
+    Sections are written as {"section": name} objects.
+    """
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def section(self, name):
+        """Create a new 'section' for the report."""
+        self._out.write(json.dumps({'section': name}))
+        self._out.write('\n')
+        self._out.flush()
+
+    @trace.traced()
+    def append(self, report, **args):
+        """Append a report/table to the JsonLinesView.
+
+        Keyword Arguments:
+          title (str) -- the title of the report being added.
+        """
+        title = args.get('title', '')
+        write = self._out.write
+        for (depth, section, rowi, cells) in _flat_rows(report.table):
+            write(json.dumps({
+                'title': title, 'depth': depth, 'section': section,
+                'row': rowi,
+                'cells': [{'text': cell._s.strip(), 'value': _raw_value(cell),
+                           'meta': dict(cell.meta)} for cell in cells]}))
+            write('\n')
+        self._out.flush()
+
+
+class HtmlView(NativeView):
+    """An HTML view of reports/tables.
+
+    Each report is a <table>; nested tables are flattened into the rows of
+    the report's table with a 'depth-N' class.  Cells carry their raw values
+    and metadata as data- attributes (data-value, data-min, data-max,
+    data-carry).  The document is opened on __enter__ and closed on
+    __exit__.
+    """
+
+    def __enter__(self):
+        self._out.write('<!DOCTYPE html>\n<html>\n<body>\n')
+        self._out.flush()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._out.write('</body>\n</html>\n')
+        self._out.flush()
+
+    def section(self, name):
+        """Create a new 'section' for the report."""
+        self._out.write('<h1>%s</h1>\n' % html.escape(name))
+        self._out.flush()
+
+    @trace.traced()
+    def append(self, report, **args):
+        """Append a report/table to the HtmlView.
+
+        Keyword Arguments:
+          title (str) -- the title of the report being added.
+        """
+        write = self._out.write
+        if args.get('title'):
+            write('<h2>%s</h2>\n' % html.escape(args['title']))
+        write('<table class="bnk">\n')
+        for (depth, section, rowi, cells) in _flat_rows(report.table):
+            tag = 'th' if section == 'header' else 'td'
+            write('<tr class="%s depth-%d">' % (section, depth))
+            for cell in cells:
+                write('<%s%s>%s</%s>' % (tag, _html_attributes(cell),
+                                         html.escape(cell._s.strip()), tag))
+            write('</tr>\n')
+        write('</table>\n')
+        self._out.flush()
+
+
+def _html_attributes(cell):
+    """Return the data- attributes for a cell (as a string)."""
+    attrs = []
+    value = _raw_value(cell)
+    if value is not None and not isinstance(value, str):
+        attrs.append(' data-value="%s"' % html.escape(json.dumps(value)))
+    for key in sorted(cell.meta):
+        attrs.append(' data-%s="%s"' % (key, html.escape(str(cell.meta[key]))))
+    return ''.join(attrs)
+
+
+VIEWS = {'native': NativeView, 'ascii': AsciiView, 'csv': CsvView,
+         'jsonl': JsonLinesView, 'html': HtmlView}
+
+
+class FanoutView(object):
+    """Render each report to several views.
+
+    A report's table is built once, when the report is created, and the
+    FanoutView hands the same report to every view, so producing e.g. an
+    ascii report for the terminal and a CSV file for a spreadsheet costs
+    one set of computations.
+    """
+
+    def __init__(self, *views):
+        """Initialize a FanoutView of the given views."""
+        self.views = list(views)
+        self._streams = []
+
+    @classmethod
+    def from_specs(cls, specs):
+        """Create a FanoutView from 'format[:path]' strings.
+
+        format is one of the keys of VIEWS, path is the file to write (the
+        default, or '-', is sys.stdout).  Files are closed by __exit__.
+        """
+        fanout = cls()
+        try:
+            for spec in specs:
+                fmt, _, path = spec.partition(':')
+                if fmt not in VIEWS:
+                    raise ValueError("Unknown view format '%s' (expected"
+                                     " one of %s)" %
+                                     (fmt, ", ".join(sorted(VIEWS))))
+                if path in ('', '-'):
+                    stream = sys.stdout
                 else:
-                    stringrep = stringrep + " "
-            if i == 0 and args['bodystyle'] == '>':
-                stringrep = ' ' + stringrep
-            fmt = '{:' + cfmt.justify + str(cfmt.width) + "s}"
-            stringrow.append(fmt.format(stringrep))
-        ftable.append(stringrow)
-
-    # now we have all the strings built, note that some of these "lines"
-    # are actually entire tables with linebreaks...
-    lines = [''.join(c for c in row) for row in fheader + ftable + ffooter]
-    # since some lines may in fact be entire tables,
-    # we need a more complex call
-    maxlinelen = max(len(s) for l in lines for s in l.splitlines())
-    banner = args['bannerchar'] * maxlinelen
-
-    # add banners and extra line breaks
-    if table.has_header() and args['headerstyle']:
-        if args['headerstyle'].startswith('-'):
-            banners.append(0)
-        elif args['headerstyle'].startswith('_'):
-            banners.append(1)
-        elif args['headerstyle'].startswith('='):
-            banners.extend([0, 1])
-        elif args['headerstyle'].startswith('\n'):
-            lines.insert(1, '')
-
-    if table.has_footer() and args['footerstyle']:
-        if args['footerstyle'].startswith('-'):
-            banners.append(len(lines) - 1)
-        elif args['footerstyle'].startswith('_'):
-            banners.append(len(lines))
-        elif args['footerstyle'].startswith('='):
-            banners.extend([len(lines) - 1, len(lines)])
-        elif args['footerstyle'].startswith('\n'):
-            lines.insert(len(lines) - 1, '')
-
-    if banners:
-        banners.sort()
-        # from back to front
-        while banners:
-            bloc = banners.pop()
-            lines.insert(bloc, banner)
-    if depth == 0 and args['title']:
-        lines.insert(0, args['title'])
+                    stream = open(path, 'w', newline='')
+                    fanout._streams.append(stream)
+                fanout.views.append(VIEWS[fmt](stream=stream))
+        except Exception:
+            fanout._close()
+            raise
+        return fanout
+
+    def __enter__(self):
+        for view in self.views:
+            view.__enter__()
+        return self
 
-    # build the string
-    return '\n'.join(lines)
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            for view in self.views:
+                view.__exit__(exc_type, exc_value, traceback)
+        finally:
+            self._close()
+
+    def _close(self):
+        for stream in self._streams:
+            stream.close()
+        self._streams = []
+
+    def section(self, name):
+        """Create a new 'section' in each view."""
+        for view in self.views:
+            view.section(name)
+
+    @trace.traced()
+    def append(self, report, **args):
+        """Append a report/table to each view (see the views' append)."""
+        for view in self.views:
+            view.append(report, **args)
@@ -27,17 +27,19 @@ periods = [Period(dt.date(2001, 12, 31), dt.date(2002, 12, 31), '2002'),
            Period(None, None, 'Lifetime')]
 
 accounts = [a for a in bnkdata['Account'].values() if a.name not in ['Assets']]
+cube = reporting.PerformanceCube(accounts, periods)
 
 with AsciiView() as ascii:
 
-    report = reporting.PerfOverviewReport(accounts, periods)
+    report = reporting.PerfOverviewReport(accounts, periods, cube=cube)
     ascii.append(report, title="Performance Overview")
 
-    report = reporting.BasicStatsReport(accounts, periods, 'gain')
+    report = reporting.BasicStatsReport(accounts, periods, 'gain', cube=cube)
     ascii.append(report, title="Gain Report")
 
-    report = reporting.BasicStatsReport(accounts, periods, 'net additions')
+    report = reporting.BasicStatsReport(accounts, periods, 'net additions',
+                                        cube=cube)
     ascii.append(report, title="Net Additions Report")
 
-    report = reporting.DetailReport(accounts[0], periods)
+    report = reporting.DetailReport(accounts[0], periods, cube=cube)
     ascii.append(report, title=report.name)